@@ -1 +1,1066 @@
-"""Colection of functions for clustering tasks."""
+"""Colection of functions for clustering tasks.
+
+Points are municipios (or populated centers) given by latitude and longitude
+in degrees. Distances are great circle distances in kilometers, computed on
+radians with a haversine ``BallTree`` so that neighborhoods are found
+without comparing every pair of points.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+
+import numpy as np
+from scipy import sparse
+from scipy.cluster.hierarchy import cut_tree, linkage
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.spatial.distance import squareform
+from scipy.sparse.csgraph import connected_components
+from scipy.stats import norm
+from sklearn.cluster import HDBSCAN, OPTICS, AgglomerativeClustering, KMeans
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, pairwise_distances
+from sklearn.neighbors import BallTree
+
+from ..parallel import limit_threads
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class HaversineNeighbors:
+    """Neighborhoods of points on the Earth, cached across queries.
+
+    The index is built once. The first radius query keeps every pair within
+    that radius, so any smaller radius (e.g. a sweep of ``eps`` values) is a
+    filter of the cached pairs instead of a new query.
+
+    Parameters
+    ----------
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    leaf_size : int
+        Leaf size of the ``BallTree``.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, leaf_size: int = 40):
+        self.coordinates = np.radians(np.column_stack([lat, lon]))
+        self.tree = BallTree(self.coordinates, leaf_size=leaf_size, metric="haversine")
+        self._radius = 0.0
+        self._pairs = (np.array([], dtype=int), np.array([], dtype=int), np.array([]))
+        self._kneighbors = {}
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def _query(self, radius_km: float):
+        """Cache every pair within ``radius_km`` if not cached yet."""
+        if radius_km <= self._radius:
+            return
+        indices, distances = self.tree.query_radius(
+            self.coordinates, radius_km / EARTH_RADIUS_KM, return_distance=True
+        )
+        rows = np.repeat(np.arange(len(self)), [len(i) for i in indices])
+        self._pairs = (rows, np.concatenate(indices), np.concatenate(distances) * EARTH_RADIUS_KM)
+        self._radius = radius_km
+
+    def radius_graph(self, radius_km: float, k: int = 0) -> sparse.csr_matrix:
+        """Sparse matrix of the distances (km) of the pairs within ``radius_km``.
+
+        Every point is stored as its own neighbor at distance zero, as the
+        estimators of ``sklearn`` expect from a precomputed sparse graph.
+        With ``k`` the ``k`` nearest neighbors of every point (and the points
+        it is a nearest neighbor of, to keep the matrix symmetric) are added
+        even if farther, so that no point is left with fewer neighbors.
+        """
+        self._query(radius_km)
+        rows, columns, distances = self._pairs
+        within = distances <= radius_km
+        rows, columns, distances = rows[within], columns[within], distances[within]
+        if k:
+            knn_distances, knn_indices = self.kneighbors(k)
+            beyond = knn_distances > radius_km
+            rows = np.concatenate([rows, np.nonzero(beyond)[0]])
+            columns = np.concatenate([columns, knn_indices[beyond]])
+            distances = np.concatenate([distances, knn_distances[beyond]])
+        graph = sparse.csr_matrix((distances, (rows, columns)), shape=(len(self), len(self)))
+        return graph.maximum(graph.T).tocsr() if k else graph
+
+    def kneighbors(self, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Distances (km) and indices of the ``k`` nearest neighbors of every point.
+
+        The point itself is the first neighbor.
+        """
+        if k not in self._kneighbors:
+            distances, indices = self.tree.query(self.coordinates, k=k)
+            self._kneighbors[k] = (distances * EARTH_RADIUS_KM, indices)
+        return self._kneighbors[k]
+
+
+def _dbscan(graph: sparse.csr_matrix, min_samples: int) -> np.ndarray:
+    """DBSCAN from a radius graph in a few vectorized steps.
+
+    Core points have at least ``min_samples`` neighbors (themselves
+    included), clusters are the connected components of the core points and
+    every border point joins the cluster of its nearest core neighbor.
+    """
+    n = graph.shape[0]
+    core = np.diff(graph.indptr) >= min_samples
+    graph = graph.tocoo()
+    rows, columns, distances = graph.row, graph.col, graph.data
+    linked = core[rows] & core[columns]
+    _, components = connected_components(
+        sparse.csr_matrix((np.ones(linked.sum()), (rows[linked], columns[linked])), shape=(n, n)),
+        directed=False,
+    )
+    labels = np.full(n, -1)
+    labels[core] = np.unique(components[core], return_inverse=True)[1]
+    border = ~core[rows] & core[columns]
+    rows, columns = rows[border], columns[border]
+    nearest = np.lexsort((distances[border], rows))
+    rows, first = np.unique(rows[nearest], return_index=True)
+    labels[rows] = labels[columns[nearest][first]]
+    return labels
+
+
+def density_clustering(
+    neighbors: HaversineNeighbors,
+    eps_km: float,
+    min_samples: int = 5,
+    method: str = "dbscan",
+) -> np.ndarray:
+    """Density clustering over the haversine neighborhoods.
+
+    Parameters
+    ----------
+    neighbors : HaversineNeighbors
+        Index of the points, reused between calls.
+    eps_km : float
+        Neighborhood radius in kilometers. For ``"optics"`` and ``"hdbscan"``
+        it is the largest distance considered, but the ``min_samples``
+        nearest neighbors of every point are always kept.
+    min_samples : int
+        Points (itself included) a core point needs within ``eps_km``, the
+        minimum cluster size for ``"hdbscan"``.
+    method : str
+        ``"dbscan"`` (vectorized over the cached pairs), ``"optics"`` or
+        ``"hdbscan"`` (``sklearn`` on the precomputed sparse graph).
+
+    Returns
+    -------
+    np.ndarray
+        Cluster of every point, ``-1`` for noise, shape (n,).
+    """
+    if method == "dbscan":
+        return _dbscan(neighbors.radius_graph(eps_km), min_samples)
+    if method == "optics":
+        model = OPTICS(min_samples=min_samples, max_eps=eps_km, metric="precomputed")
+        return model.fit(neighbors.radius_graph(eps_km, k=min_samples)).labels_
+    # the distance to the point itself does not count as a neighbor
+    graph = neighbors.radius_graph(eps_km, k=min_samples + 1)
+    n_components, components = connected_components(graph, directed=False)
+    if n_components > 1:
+        # the tree needs a connected graph, groups farther apart than eps_km
+        # are joined at half the circumference of the Earth, its root
+        first = np.unique(components, return_index=True)[1]
+        bridges = sparse.csr_matrix(
+            (np.full(n_components - 1, np.pi * EARTH_RADIUS_KM), (first[:-1], first[1:])),
+            shape=graph.shape,
+        )
+        graph = (graph + bridges + bridges.T).tocsr()
+    model = HDBSCAN(min_cluster_size=min_samples, metric="precomputed", copy=True)
+    return model.fit(graph).labels_
+
+
+def dbscan_sweep(
+    neighbors: HaversineNeighbors,
+    eps_values: list[float],
+    min_samples: int = 5,
+) -> dict[float, np.ndarray]:
+    """DBSCAN for several radii with a single neighborhood query.
+
+    Parameters
+    ----------
+    neighbors : HaversineNeighbors
+        Index of the points.
+    eps_values : list[float]
+        Radii in kilometers.
+    min_samples : int
+        Points a core point needs within the radius.
+
+    Returns
+    -------
+    dict[float, np.ndarray]
+        Labels of every radius.
+    """
+    # the largest radius first, every other one is a filter of its pairs
+    neighbors.radius_graph(max(eps_values))
+    return {eps: density_clustering(neighbors, eps, min_samples) for eps in eps_values}
+
+
+class HaversineDBSCAN:
+    """DBSCAN of (lat, lon) points in degrees with the radius in kilometers.
+
+    The estimator interface (``fit``, ``labels_``, ``fit_predict``) over
+    ``density_clustering``, so it can replace ``sklearn.cluster.DBSCAN``,
+    whose ``eps`` on raw coordinates is in degrees and stretches with the
+    latitude.
+
+    Parameters
+    ----------
+    eps_km : float
+        Neighborhood radius in kilometers.
+    min_samples : int
+        Points (itself included) a core point needs within ``eps_km``.
+    neighbors : HaversineNeighbors, optional
+        Index of the points to fit, reused instead of building a new one
+        (e.g. by several radii of a sweep).
+    """
+
+    def __init__(
+        self,
+        eps_km: float = 50.0,
+        min_samples: int = 5,
+        neighbors: HaversineNeighbors | None = None,
+    ):
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.neighbors = neighbors
+
+    def fit(self, X: np.ndarray, y=None) -> "HaversineDBSCAN":
+        """Cluster the points ``X``, latitude and longitude columns."""
+        neighbors = self.neighbors
+        if neighbors is None:
+            X = np.asarray(X, dtype=float)
+            neighbors = HaversineNeighbors(X[:, 0], X[:, 1])
+        self.labels_ = density_clustering(neighbors, self.eps_km, self.min_samples)
+        return self
+
+    def fit_predict(self, X: np.ndarray, y=None) -> np.ndarray:
+        """Cluster the points ``X`` and return their labels."""
+        return self.fit(X).labels_
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere, shape (n, 3)."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _balanced_assignment(
+    cost: np.ndarray,
+    min_size: int,
+    max_size: int,
+    surplus: np.ndarray | None,
+    time_limit: float,
+) -> tuple[np.ndarray | None, int]:
+    """Cheapest assignment of the points to the clusters within the sizes.
+
+    Without ``surplus`` it is a transportation problem, whose LP relaxation
+    is already integral. The rows ``sum_j surplus[j] x[j, k] >= 0`` keep
+    every cluster with at least as much capacity as demand. Returns the
+    assignment, ``None`` without one, and the ``milp`` status (``1`` for
+    the time limit, ``2`` for an infeasible problem).
+    """
+    n, K = cost.shape
+    constraints = [
+        # every point in one cluster
+        LinearConstraint(sparse.kron(sparse.eye(n), np.ones((1, K))), 1, 1),
+        # sizes of the clusters
+        LinearConstraint(
+            sparse.kron(np.ones((1, n)), sparse.eye(K)), min_size, max_size
+        ),
+    ]
+    if surplus is not None:
+        constraints.append(
+            LinearConstraint(sparse.kron(surplus[None, :], sparse.eye(K)), 0, np.inf)
+        )
+    result = milp(
+        cost.ravel(),
+        constraints=constraints,
+        integrality=np.ones(n * K),
+        bounds=Bounds(0, 1),
+        options={"time_limit": time_limit},
+    )
+    if result.x is None:
+        return None, result.status
+    return result.x.reshape(n, K).argmax(axis=1), result.status
+
+
+def merge_small_groups(
+    labels: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    demand: np.ndarray | None = None,
+    capacity: np.ndarray | None = None,
+    min_size: int = 1,
+) -> np.ndarray:
+    """Merge the groups too small to stand alone into their neighbors.
+
+    A group is too small with fewer than ``min_size`` points or, given
+    ``demand`` and ``capacity``, less capacity than demand. The group with
+    the largest deficit (then the smallest) goes first and joins the group
+    of the closest point outside of it, e.g. the neighboring department,
+    until every group stands alone or only one is left.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        Group of every point (e.g. its department), any values, shape (n,).
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    demand, capacity : np.ndarray, optional
+        Demand and capacity of every point, shape (n,).
+    min_size : int
+        Fewest points of a group.
+
+    Returns
+    -------
+    np.ndarray
+        Group of every point numbered from zero, shape (n,). The points of
+        a group keep the same group after the merges.
+    """
+    _, labels = np.unique(labels, return_inverse=True)
+    points = _unit_vectors(lat, lon)
+    surplus = np.zeros(len(labels))
+    if demand is not None and capacity is not None:
+        surplus = np.asarray(capacity, dtype=float) - np.asarray(demand, dtype=float)
+    while True:
+        groups = np.unique(labels)
+        sizes = np.bincount(labels)[groups]
+        balance = np.bincount(labels, weights=surplus)[groups]
+        small = (sizes < min_size) | (balance < 0)
+        if not small.any() or len(groups) == 1:
+            break
+        group = groups[small][np.lexsort((sizes[small], balance[small]))[0]]
+        members = labels == group
+        # chord distances grow with the great circle distances
+        distances = ((points[members][:, None, :] - points[~members][None, :, :]) ** 2).sum(axis=2)
+        closest = np.unravel_index(distances.argmin(), distances.shape)[1]
+        labels[members] = labels[~members][closest]
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def balanced_clustering(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    n_clusters: int,
+    max_size: int | None = None,
+    min_size: int = 0,
+    demand: np.ndarray | None = None,
+    capacity: np.ndarray | None = None,
+    max_iter: int = 20,
+    time_limit: float = 60,
+    random_state: int = 0,
+) -> np.ndarray:
+    """K-means with bounded cluster sizes and enough capacity in every cluster.
+
+    Lloyd iterations on the points as unit vectors (so squared chord
+    distances, which grow with the great circle distance), where every
+    assignment step is the cheapest assignment with at most ``max_size`` and
+    at least ``min_size`` points per cluster and, given ``demand`` and
+    ``capacity``, at least as much capacity as demand in every cluster.
+    The centers start from ``KMeans``.
+
+    Parameters
+    ----------
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    n_clusters : int
+        Number of clusters.
+    max_size : int, optional
+        Most points per cluster, by default ``ceil(n / n_clusters)``.
+    min_size : int
+        Fewest points per cluster.
+    demand, capacity : np.ndarray, optional
+        Demand and capacity of every point, shape (n,).
+    max_iter : int
+        Most assignment steps, the iterations stop before if the clusters
+        do not change.
+    time_limit : float
+        Seconds given to HiGHS for every assignment step. A step that runs
+        out of time without an assignment ends the iterations with the
+        clusters of the previous step.
+    random_state : int
+        Seed of the initial ``KMeans``.
+
+    Returns
+    -------
+    np.ndarray
+        Cluster of every point, shape (n,). All ``-1`` if no assignment
+        satisfies the sizes and the capacities, all ``-2`` if the first
+        assignment step ran out of time before finding one.
+    """
+    points = _unit_vectors(lat, lon)
+    n = len(points)
+    max_size = max_size or ceil(n / n_clusters)
+    surplus = None
+    if demand is not None and capacity is not None:
+        surplus = np.asarray(capacity, dtype=float) - np.asarray(demand, dtype=float)
+        # in units of the largest surplus, for the tolerances of HiGHS
+        surplus = surplus / max(np.abs(surplus).max(), 1e-12)
+    centers = KMeans(n_clusters, random_state=random_state, n_init=10).fit(points).cluster_centers_
+    labels = np.full(n, -1)
+    for _ in range(max_iter):
+        # squared distances in km^2
+        cost = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2) * EARTH_RADIUS_KM**2
+        new_labels, status = _balanced_assignment(
+            cost, min_size, max_size, surplus, time_limit
+        )
+        if new_labels is None and status == 1 and (labels >= 0).all():
+            # out of time, the clusters of the previous step are feasible
+            break
+        if new_labels is None:
+            return np.full(n, -2 if status == 1 else -1)
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+        centers = np.array(
+            [points[labels == k].mean(axis=0) if (labels == k).any() else centers[k] for k in range(n_clusters)]
+        )
+    return labels
+
+
+class BatchSOM:
+    """Self-organizing map on a rectangular grid trained with the batch rule.
+
+    Every epoch assigns all samples to their best matching unit with one
+    distance matrix and moves every unit to the mean of the samples weighted
+    by the neighborhood of their units,
+
+        w[u] = sum_x h(u, bmu(x)) x / sum_x h(u, bmu(x)),
+        h(u, v) = exp(-|loc(u) - loc(v)|^2 / sigma^2),
+
+    with ``sigma`` shrinking linearly from ``sigma`` to ``sigma_final``, so
+    the last epochs are k-means steps. It has the interface of
+    ``sklearn_som.SOM`` (``fit``, ``predict``, ``fit_predict``, ``transform``).
+
+    Parameters
+    ----------
+    m, n : int
+        Rows and columns of the grid, ``m * n`` clusters.
+    dim : int
+        Features of the samples.
+    sigma : float
+        Initial width of the neighborhood, in grid cells.
+    sigma_final : float
+        Width of the neighborhood in the last epoch.
+    epochs : int
+        Epochs of ``fit`` if not given there.
+    batch_size : int, optional
+        Samples per mini-batch. The sums of an epoch are accumulated batch
+        by batch and the units updated after every batch, so the memory is
+        ``batch_size x m * n`` and the later batches already use the new
+        units. The whole data at once by default.
+    random_state : int, optional
+        Seed of the initial units (samples of the data) and of the order of
+        the mini-batches.
+    """
+
+    def __init__(
+        self,
+        m: int = 3,
+        n: int = 3,
+        dim: int = 3,
+        sigma: float = 1.0,
+        sigma_final: float = 0.1,
+        epochs: int = 20,
+        batch_size: int | None = None,
+        random_state: int | None = None,
+    ):
+        self.m, self.n, self.dim = m, n, dim
+        self.shape = (m, n)
+        self.sigma, self.sigma_final = sigma, sigma_final
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.random_state = random_state
+        locations = np.argwhere(np.ones((m, n))).astype(float)
+        self._grid_distances = ((locations[:, None, :] - locations[None, :, :]) ** 2).sum(axis=2)
+        self.weights = None
+        self.inertia_ = None
+        self.n_iter_ = 0
+
+    @property
+    def cluster_centers_(self) -> np.ndarray:
+        """Units as an (m, n, dim) array."""
+        return self.weights.reshape(self.m, self.n, self.dim)
+
+    def _squared_distances(self, X: np.ndarray) -> np.ndarray:
+        """Squared distances of every sample to every unit, shape (n, m * n)."""
+        distances = (X**2).sum(axis=1)[:, None] - 2 * X @ self.weights.T + (self.weights**2).sum(axis=1)
+        return np.maximum(distances, 0)
+
+    def fit(self, X: np.ndarray, epochs: int | None = None, shuffle: bool = True) -> None:
+        """Train the map.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples, shape (n, dim).
+        epochs : int, optional
+            Passes over the data, ``self.epochs`` by default.
+        shuffle : bool
+            Visit the mini-batches in a new random order every epoch.
+        """
+        X = np.asarray(X, dtype=float)
+        epochs = epochs or self.epochs
+        rng = np.random.default_rng(self.random_state)
+        units = self.m * self.n
+        self.weights = X[rng.choice(len(X), units, replace=len(X) < units)].copy()
+        batch_size = self.batch_size or len(X)
+        for epoch in range(epochs):
+            sigma = self.sigma + (self.sigma_final - self.sigma) * epoch / max(epochs - 1, 1)
+            neighborhood = np.exp(-self._grid_distances / sigma**2)
+            order = rng.permutation(len(X)) if shuffle and batch_size < len(X) else np.arange(len(X))
+            sums, counts = np.zeros((units, self.dim)), np.zeros(units)
+            for start in range(0, len(X), batch_size):
+                batch = X[order[start : start + batch_size]]
+                bmu = self._squared_distances(batch).argmin(axis=1)
+                members = bmu[:, None] == np.arange(units)
+                sums += members.T @ batch
+                counts += members.sum(axis=0)
+                # every unit moves to the neighborhood weighted mean
+                weight = neighborhood @ counts
+                updated = weight > 0
+                self.weights[updated] = (neighborhood @ sums)[updated] / weight[updated, None]
+            self.n_iter_ += 1
+        self.inertia_ = float(self._squared_distances(X).min(axis=1).sum())
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Best matching unit of every sample, shape (n,)."""
+        return self._squared_distances(np.asarray(X, dtype=float)).argmin(axis=1)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Euclidean distance of every sample to every unit, shape (n, m * n)."""
+        return np.sqrt(self._squared_distances(np.asarray(X, dtype=float)))
+
+    def fit_predict(self, X: np.ndarray, **kwargs) -> np.ndarray:
+        """``fit`` followed by ``predict``, with the keyword arguments of ``fit``."""
+        self.fit(X, **kwargs)
+        return self.predict(X)
+
+
+class ClusterMetrics:
+    """Quality metrics of many clusterings of the same points.
+
+    The pairwise distances are computed once (or given, e.g. road
+    distances) and every silhouette reuses them: the distances of every
+    point to every cluster are one product with the one-hot labels. The
+    sampled silhouette only needs the rows of the sampled points, which are
+    cached when the full matrix is not.
+
+    Parameters
+    ----------
+    points : np.ndarray, optional
+        Features of the points, shape (n, d). Needed for the centroid based
+        metrics (Calinski-Harabasz and Davies-Bouldin).
+    distances : np.ndarray, optional
+        Pairwise distances, shape (n, n). Made symmetric with the mean of
+        both directions. Euclidean distances of ``points`` if not given.
+    full_matrix : bool
+        Compute the whole matrix of ``points`` up front. If ``False`` only
+        the rows of the sampled points are computed, for point sets too large
+        for an ``n x n`` matrix.
+    random_state : int, optional
+        Seed of the samples.
+    """
+
+    def __init__(
+        self,
+        points: np.ndarray | None = None,
+        distances: np.ndarray | None = None,
+        full_matrix: bool = True,
+        random_state: int | None = None,
+    ):
+        self.points = (
+            None if points is None else np.asarray(points, dtype=float)
+        )
+        self.distances = None
+        if distances is not None:
+            distances = np.asarray(distances, dtype=float)
+            self.distances = (distances + distances.T) / 2
+        elif full_matrix:
+            self.distances = pairwise_distances(self.points)
+        self.rng = np.random.default_rng(random_state)
+        self._rows = {}
+
+    def __len__(self) -> int:
+        return len(
+            self.distances if self.distances is not None else self.points
+        )
+
+    def _distance_rows(self, indices: np.ndarray) -> np.ndarray:
+        """Distances of the given points to every point."""
+        if self.distances is not None:
+            return self.distances[indices]
+        missing = [i for i in indices if i not in self._rows]
+        if missing:
+            rows = pairwise_distances(self.points[missing], self.points)
+            self._rows.update(zip(missing, rows))
+        return np.array([self._rows[i] for i in indices])
+
+    def silhouette_samples(
+        self, labels: np.ndarray, indices: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Silhouette of the given points (all by default), as ``sklearn``.
+
+        The noise label ``-1`` is one more cluster and the points alone in
+        their cluster score zero.
+        """
+        clusters, labels = np.unique(labels, return_inverse=True)
+        indices = (
+            np.arange(len(labels)) if indices is None else np.asarray(indices)
+        )
+        sizes = np.bincount(labels, minlength=len(clusters)).astype(float)
+        one_hot = labels[:, None] == np.arange(len(clusters))
+        # sum of the distances of every point to every cluster
+        sums = self._distance_rows(indices) @ one_hot
+        own = labels[indices]
+        rows = np.arange(len(indices))
+        a = sums[rows, own] / np.maximum(sizes[own] - 1, 1)
+        mean_other = sums / sizes
+        mean_other[rows, own] = np.inf
+        b = mean_other.min(axis=1)
+        score = (b - a) / np.maximum(np.maximum(a, b), 1e-300)
+        return np.where(sizes[own] > 1, score, 0.0)
+
+    def silhouette(self, labels: np.ndarray) -> float:
+        """Mean silhouette of all points, ``nan`` without two clusters."""
+        if not 1 < len(np.unique(labels)) < len(labels):
+            return np.nan
+        return float(self.silhouette_samples(labels).mean())
+
+    def sampled_silhouette(
+        self,
+        labels: np.ndarray,
+        sample_size: int = 1000,
+        confidence: float = 0.95,
+    ) -> tuple[float, float, float]:
+        """Stratified estimate of the mean silhouette with its interval.
+
+        Every cluster is sampled in proportion to its size (at least two
+        points, or all of them), the silhouette of the sampled points is
+        exact and the mean is the stratified estimator, whose variance
+        ``sum_k w_k^2 s_k^2 / n_k (1 - n_k / N_k)`` gives a normal interval.
+
+        Parameters
+        ----------
+        labels : np.ndarray
+            Cluster of every point, shape (n,).
+        sample_size : int
+            Points to sample, about.
+        confidence : float
+            Confidence level of the interval.
+
+        Returns
+        -------
+        estimate, low, high : float
+            ``nan`` with fewer than two clusters.
+        """
+        labels = np.asarray(labels)
+        if not 1 < len(np.unique(labels)) < len(labels):
+            return np.nan, np.nan, np.nan
+        n = len(labels)
+        strata = [np.flatnonzero(labels == k) for k in np.unique(labels)]
+        sizes = [
+            min(len(members), max(2, round(sample_size * len(members) / n)))
+            for members in strata
+        ]
+        samples = [
+            self.rng.choice(members, size, replace=False)
+            for members, size in zip(strata, sizes)
+        ]
+        scores = self.silhouette_samples(labels, np.concatenate(samples))
+        estimate, variance, start = 0.0, 0.0, 0
+        for members, sample in zip(strata, samples):
+            stratum = scores[start : start + len(sample)]
+            start += len(sample)
+            weight = len(members) / n
+            estimate += weight * stratum.mean()
+            if 1 < len(sample) < len(members):
+                variance += (
+                    weight**2
+                    * stratum.var(ddof=1)
+                    / len(sample)
+                    * (1 - len(sample) / len(members))
+                )
+        margin = norm.ppf((1 + confidence) / 2) * np.sqrt(variance)
+        return (
+            float(estimate),
+            float(estimate - margin),
+            float(estimate + margin),
+        )
+
+    def calinski_harabasz(self, labels: np.ndarray) -> float:
+        """Calinski-Harabasz index on ``points``, linear in the points."""
+        if self.points is None or not 1 < len(np.unique(labels)) < len(labels):
+            return np.nan
+        return float(calinski_harabasz_score(self.points, labels))
+
+    def davies_bouldin(self, labels: np.ndarray) -> float:
+        """Davies-Bouldin index on ``points``, linear in the points."""
+        if self.points is None or not 1 < len(np.unique(labels)) < len(labels):
+            return np.nan
+        return float(davies_bouldin_score(self.points, labels))
+
+
+# Models of ``clustering_grid`` by name, built with the parameters of the grid
+CLUSTERING_MODELS = {
+    "kmeans": KMeans,
+    "som": BatchSOM,
+    "agglomerative": AgglomerativeClustering,
+    "dbscan": HaversineDBSCAN,
+}
+
+# Datasets available to every process of the grid, sent only once
+_grid_data = {}
+
+
+def _init_grid(datasets, sample_size, random_state, threads):
+    """Limit the threads of a pool process and store the datasets."""
+    limit_threads(threads)
+    _grid_data.update(
+        datasets=datasets,
+        sample_size=sample_size,
+        random_state=random_state,
+        metrics={},
+    )
+
+
+def _fit_configuration(dataset, model, params, data=None, neighbors=None):
+    """Fit one configuration and score its partition."""
+    data = data or _grid_data
+    points = data["datasets"][dataset]
+    if dataset not in data["metrics"]:
+        # the distances of a dataset are computed once per process
+        data["metrics"][dataset] = ClusterMetrics(
+            points,
+            full_matrix=data["sample_size"] is None,
+            random_state=data["random_state"],
+        )
+    metrics = data["metrics"][dataset]
+    start = time.time()
+    estimator = CLUSTERING_MODELS[model](**params)
+    if model == "dbscan" and neighbors is not None:
+        estimator.neighbors = neighbors
+    if model == "som":
+        labels = estimator.fit_predict(points)
+    else:
+        labels = estimator.fit(points).labels_
+    seconds = time.time() - start
+    if data["sample_size"] is None:
+        silhouette = metrics.silhouette(labels)
+    else:
+        silhouette = metrics.sampled_silhouette(labels, data["sample_size"])[0]
+    record = {
+        "dataset": dataset,
+        "model": model,
+        "params": params,
+        "n_clusters": len(np.unique(labels[labels >= 0])),
+        "noise": float((labels < 0).mean()),
+        "silhouette": silhouette,
+        "calinski_harabasz": metrics.calinski_harabasz(labels),
+        "davies_bouldin": metrics.davies_bouldin(labels),
+        "seconds": seconds,
+    }
+    return record, labels.astype(np.int16)
+
+
+def _fit_configurations(dataset, configurations, data=None):
+    """Fit several configurations of a dataset, sharing one DBSCAN index.
+
+    The haversine index is built once and queried once with the largest
+    ``eps_km``; every other radius filters the cached pairs.
+    """
+    data = data or _grid_data
+    neighbors = None
+    radii = [
+        params["eps_km"]
+        for model, params in configurations
+        if model == "dbscan"
+    ]
+    if radii:
+        points = data["datasets"][dataset]
+        neighbors = HaversineNeighbors(points[:, 0], points[:, 1])
+        neighbors.radius_graph(max(radii))
+    return [
+        _fit_configuration(dataset, model, params, data, neighbors)
+        for model, params in configurations
+    ]
+
+
+def clustering_grid(
+    datasets: dict[str, np.ndarray],
+    grid: list[tuple[str, dict]],
+    n_workers: int | None = None,
+    sample_size: int | None = None,
+    random_state: int | None = None,
+) -> tuple[list[dict], dict[str, np.ndarray]]:
+    """Fit and score every model configuration on every dataset in parallel.
+
+    The datasets are sent once to every process of the pool, which keeps
+    the ``ClusterMetrics`` of every dataset for all the configurations it
+    fits. The DBSCAN configurations of a dataset are a single task that
+    builds one haversine index for the whole ``eps_km`` sweep. With as many
+    processes as tasks the grid takes about as long as its slowest task.
+
+    Parameters
+    ----------
+    datasets : dict[str, np.ndarray]
+        Points of every dataset, shape (n, d). DBSCAN reads the first two
+        columns as latitude and longitude in degrees.
+    grid : list[tuple[str, dict]]
+        Name in ``CLUSTERING_MODELS`` and parameters of every configuration,
+        ``eps_km`` and ``min_samples`` for ``"dbscan"``.
+    n_workers : int, optional
+        Processes of the pool, by default one per CPU.
+    sample_size : int, optional
+        Estimate the silhouette with a sample of this size
+        (``ClusterMetrics.sampled_silhouette``) instead of all the points.
+    random_state : int, optional
+        Seed of the samples.
+
+    Returns
+    -------
+    records : list[dict]
+        Dataset, model, parameters, clusters, share of noise, silhouette,
+        Calinski-Harabasz and Davies-Bouldin scores and fit seconds of every
+        configuration (without the shared index for DBSCAN), plus
+        ``"column"``, its row in ``labels``.
+    labels : dict[str, np.ndarray]
+        Partitions of every dataset as ``int16``, one row per configuration
+        in the order of ``grid``, shape (len(grid), n).
+    """
+    sweep = [k for k, (model, _) in enumerate(grid) if model == "dbscan"]
+    groups = [[k] for k in range(len(grid)) if k not in sweep]
+    groups += [sweep] if sweep else []
+    tasks = [
+        (dataset, [grid[k] for k in group])
+        for dataset in datasets
+        for group in groups
+    ]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // n_workers)
+    initargs = (datasets, sample_size, random_state, threads)
+    if n_workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_grid, initargs=initargs
+        ) as executor:
+            results = list(executor.map(_fit_configurations, *zip(*tasks)))
+    else:
+        data = {
+            "datasets": datasets,
+            "sample_size": sample_size,
+            "random_state": random_state,
+            "metrics": {},
+        }
+        results = [_fit_configurations(*task, data=data) for task in tasks]
+    records, labels = [], {}
+    for d, dataset in enumerate(datasets):
+        # back to the order of the grid
+        rows = [None] * len(grid)
+        for group, fitted in zip(groups, results[d * len(groups) :]):
+            for k, row in zip(group, fitted):
+                rows[k] = row
+        for column, (record, _) in enumerate(rows):
+            records.append({**record, "column": column})
+        labels[dataset] = np.vstack([partition for _, partition in rows])
+    return records, labels
+
+
+def best_partitions(
+    records: list[dict], metric: str = "silhouette"
+) -> dict[str, dict]:
+    """Best configuration of every dataset by the given metric.
+
+    Parameters
+    ----------
+    records : list[dict]
+        As returned by ``clustering_grid``.
+    metric : str
+        ``"silhouette"`` or ``"calinski_harabasz"`` (the higher the better)
+        or ``"davies_bouldin"`` (the lower the better). Configurations with
+        an undefined metric (a single cluster) are skipped.
+
+    Returns
+    -------
+    dict[str, dict]
+        Record of the best configuration of every dataset.
+    """
+    sign = 1 if metric == "davies_bouldin" else -1
+    best = {}
+    for record in records:
+        value = record[metric]
+        if np.isnan(value):
+            continue
+        current = best.get(record["dataset"])
+        if current is None or sign * value < sign * current[metric]:
+            best[record["dataset"]] = record
+    return best
+
+
+class RoadLinkage:
+    """Agglomerative clustering on a precomputed (e.g. road) distance matrix.
+
+    The linkage tree is computed once with ``scipy.cluster.hierarchy`` and
+    every cut of it is cached, so any number of clusters costs a pass over
+    the tree. The tree can be saved and passed back as ``tree``.
+
+    Parameters
+    ----------
+    distances : np.ndarray, optional
+        Pairwise distances, shape (n, n), not needed if ``tree`` is given.
+    method : str
+        Linkage of ``scipy.cluster.hierarchy.linkage``. Only ``"single"``,
+        ``"complete"``, ``"average"`` and ``"weighted"`` are meaningful for
+        distances that are not Euclidean.
+    symmetrize : str
+        How the two directions of an asymmetric matrix are combined:
+        ``"mean"``, ``"min"`` or ``"max"``.
+    tree : np.ndarray, optional
+        Linkage matrix computed before, shape (n - 1, 4).
+    """
+
+    def __init__(
+        self,
+        distances: np.ndarray | None = None,
+        method: str = "complete",
+        symmetrize: str = "mean",
+        tree: np.ndarray | None = None,
+    ):
+        self.method = method
+        if tree is None:
+            distances = np.asarray(distances, dtype=float)
+            if symmetrize == "mean":
+                symmetric = (distances + distances.T) / 2
+            else:
+                symmetric = {"min": np.minimum, "max": np.maximum}[symmetrize](distances, distances.T)
+            np.fill_diagonal(symmetric, 0)
+            tree = linkage(squareform(symmetric, checks=False), method=method)
+        self.tree = tree
+        self._cuts = {}
+
+    def __len__(self) -> int:
+        return len(self.tree) + 1
+
+    def cut(self, n_clusters: int) -> np.ndarray:
+        """Partition with exactly ``n_clusters`` clusters, shape (n,)."""
+        if n_clusters not in self._cuts:
+            self.cut_many([n_clusters])
+        return self._cuts[n_clusters]
+
+    def cut_many(self, n_clusters: list[int]) -> dict[int, np.ndarray]:
+        """Partitions for several numbers of clusters in a single pass."""
+        missing = [k for k in n_clusters if k not in self._cuts]
+        if missing:
+            labels = cut_tree(self.tree, n_clusters=missing)
+            for column, k in enumerate(missing):
+                self._cuts[k] = labels[:, column].astype(np.int16)
+        return {k: self._cuts[k] for k in n_clusters}
+
+
+class OnlineClustering:
+    """Clusters of a fitted model updated as new points arrive.
+
+    New points go to the nearest centroid. With ``update_centers`` every
+    centroid then moves as in mini-batch k-means, to the mean of its old and
+    new members, with a step of ``1 / count`` that starts from the size of
+    the cluster, so the clusters already fitted are not forgotten. For
+    models without centroids (SOM, agglomerative, DBSCAN) the centroids are
+    the means of their clusters and may be left fixed. The noise of DBSCAN
+    (``-1``) has no centroid, so new points always join a cluster.
+
+    The clusters that gain or lose members are kept in ``changed`` until
+    ``pop_changed``, so only their CFLP subproblems need to be solved again.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Points already clustered, shape (n, d).
+    labels : np.ndarray
+        Cluster of every point, shape (n,).
+    update_centers : bool
+        Move the centroids with the new members.
+    reassign : bool
+        After moving the centroids, move the points already clustered whose
+        nearest centroid changed. Only with ``update_centers``.
+    """
+
+    def __init__(
+        self,
+        points: np.ndarray,
+        labels: np.ndarray,
+        update_centers: bool = True,
+        reassign: bool = False,
+    ):
+        self.points = np.asarray(points, dtype=float)
+        self.labels = np.asarray(labels).copy()
+        self.update_centers = update_centers
+        self.reassign = reassign and update_centers
+        self.clusters = np.unique(self.labels[self.labels >= 0])
+        self._fit_centers()
+        self.changed = set()
+
+    def _fit_centers(self):
+        """Sizes and centroids of the clusters from the current labels."""
+        members = self.labels[:, None] == self.clusters
+        self.counts = members.sum(axis=0).astype(float)
+        sums = members.T @ self.points
+        self.centers = sums / np.maximum(self.counts, 1)[:, None]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Cluster of the nearest centroid of every point, shape (n,)."""
+        X = np.asarray(X, dtype=float)
+        distances = (
+            (X**2).sum(axis=1)[:, None]
+            - 2 * X @ self.centers.T
+            + (self.centers**2).sum(axis=1)
+        )
+        return self.clusters[distances.argmin(axis=1)]
+
+    def partial_fit(self, X: np.ndarray) -> np.ndarray:
+        """Add a batch of points.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            New points, shape (k, d).
+
+        Returns
+        -------
+        np.ndarray
+            Cluster of every new point, shape (k,).
+        """
+        X = np.asarray(X, dtype=float)
+        labels = self.predict(X)
+        self.changed.update(labels.tolist())
+        if self.update_centers:
+            members = labels[:, None] == self.clusters
+            sums = members.T @ X
+            added = members.sum(axis=0)
+            self.counts += added
+            # mini-batch k-means step, learning rate added / count
+            moved = added > 0
+            step = sums[moved] - added[moved, None] * self.centers[moved]
+            self.centers[moved] += step / self.counts[moved, None]
+        self.points = np.vstack([self.points, X])
+        self.labels = np.concatenate([self.labels, labels])
+        if self.reassign:
+            self._reassign()
+        return labels
+
+    def _reassign(self):
+        """Move the clustered points to their nearest centroid if it changed."""
+        clustered = np.flatnonzero(self.labels >= 0)
+        nearest = self.predict(self.points[clustered])
+        moved = clustered[nearest != self.labels[clustered]]
+        if not len(moved):
+            return
+        self.changed.update(self.labels[moved].tolist())
+        self.changed.update(nearest[nearest != self.labels[clustered]].tolist())
+        self.labels[moved] = nearest[nearest != self.labels[clustered]]
+        self._fit_centers()
+
+    def pop_changed(self) -> list:
+        """Clusters whose members changed since the last call."""
+        changed, self.changed = sorted(self.changed), set()
+        return changed
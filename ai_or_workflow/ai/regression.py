@@ -1 +1,955 @@
-"""Colection of functions for regression tasks."""
+"""Colection of functions for regression tasks.
+
+Batched models work on a matrix of series, one row per series and one column
+per period (e.g. municipios x years), where missing periods are NaN.
+"""
+
+import copy
+
+import numpy as np
+from scipy import sparse
+from sklearn.model_selection import train_test_split
+from sklearn.neural_network import MLPRegressor
+
+
+class _RowSubsetMixin:
+    """Restriction of a fitted batched model to some of its rows."""
+
+    _row_attributes: tuple[str, ...] = ()
+    # rows are fitted independently, so several copies of a matrix with
+    # different masks can be stacked and fitted at once
+    row_independent = True
+
+    def take(self, rows):
+        """Copy of the fitted model that only predicts the given rows.
+
+        Parameters
+        ----------
+        rows : array-like
+            Positions of the rows to keep.
+
+        Returns
+        -------
+        Fitted model of the same class with ``len(rows)`` rows.
+        """
+        subset = copy.copy(self)
+        for name in self._row_attributes:
+            value = getattr(self, name)
+            if isinstance(value, np.ndarray):
+                setattr(subset, name, value[rows])
+            else:
+                setattr(subset, name, value.take(rows))
+        return subset
+
+
+class BatchedMean(_RowSubsetMixin):
+    """Mean of the fitted periods of every row, predicted for any period."""
+
+    _row_attributes = ("mean_",)
+
+    def fit(self, periods: np.ndarray, Y: np.ndarray, mask: np.ndarray | None = None):
+        """Average the observed (and masked) cells of every row of ``Y``."""
+        Y = np.asarray(Y, dtype=float)
+        observed = ~np.isnan(Y)
+        if mask is not None:
+            observed &= mask
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean_ = np.where(observed, Y, 0.0).sum(axis=1) / observed.sum(axis=1)
+        return self
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Repeat the mean of every row, shape (n, H)."""
+        return np.repeat(self.mean_[:, None], len(np.atleast_1d(periods)), axis=1)
+
+
+class BatchedLinearRegression(_RowSubsetMixin):
+    """Ordinary least squares fitted independently for every row of a matrix.
+
+    Solves the masked normal equations of all rows at once, which gives the
+    same coefficients as fitting ``sklearn.linear_model.LinearRegression`` on
+    the observed periods of each row, but without a Python loop.
+
+    Parameters
+    ----------
+    degree : int
+        Degree of the polynomial on the period (1 is a straight line).
+    """
+
+    _row_attributes = ("coef_", "intercept_", "n_obs_")
+
+    def __init__(self, degree: int = 1):
+        self.degree = degree
+
+    def _features(self, periods: np.ndarray) -> np.ndarray:
+        """Polynomial features of the periods without the intercept column."""
+        t = np.asarray(periods, dtype=float) - self.origin_
+        return np.stack([t**k for k in range(1, self.degree + 1)], axis=1)
+
+    def fit(self, periods: np.ndarray, Y: np.ndarray, mask: np.ndarray | None = None):
+        """Fit one regression per row of ``Y``.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Period of each column of ``Y``, shape (T,).
+        Y : np.ndarray
+            Observed values, shape (n, T). NaN marks a missing period.
+        mask : np.ndarray, optional
+            Boolean (n, T) matrix with the cells used for fitting, intersected
+            with the non NaN cells of ``Y``.
+
+        Returns
+        -------
+        self : BatchedLinearRegression
+        """
+        Y = np.asarray(Y, dtype=float)
+        periods = np.asarray(periods, dtype=float)
+        observed = ~np.isnan(Y)
+        if mask is not None:
+            observed &= mask
+        W = observed.astype(float)
+        Y0 = np.where(observed, Y, 0.0)
+
+        self.origin_ = periods.mean()
+        X = self._features(periods)
+        n_obs = W.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = (W @ X) / n_obs[:, None]
+            y_mean = Y0.sum(axis=1) / n_obs
+        # center every row on its own observed mean, as LinearRegression does
+        Xc = X[None, :, :] - np.nan_to_num(x_mean)[:, None, :]
+        Yc = np.where(observed, Y0 - np.nan_to_num(y_mean)[:, None], 0.0)
+        gram = np.einsum("nt,ntp,ntq->npq", W, Xc, Xc)
+        moment = np.einsum("nt,ntp,nt->np", W, Xc, Yc)
+        coef = np.einsum("npq,nq->np", np.linalg.pinv(gram), moment)
+
+        self.coef_ = coef
+        self.intercept_ = y_mean - (np.nan_to_num(x_mean) * coef).sum(axis=1)
+        self.n_obs_ = n_obs.astype(int)
+        return self
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Predict every row at the given periods.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Periods to predict, shape (H,).
+
+        Returns
+        -------
+        np.ndarray
+            Predictions, shape (n, H). Rows fitted without observations are NaN.
+        """
+        X = self._features(np.atleast_1d(periods))
+        return self.intercept_[:, None] + self.coef_ @ X.T
+
+
+class PanelPopulationRegressor:
+    """One neural network trained over every row of a population matrix.
+
+    Instead of one small model per series, a single ``MLPRegressor`` learns
+    the yearly log growth ``log(y_t / y_{t-1})`` of all series at once from:
+
+    - the normalized year,
+    - the lagged values of the series, as ``log(y_{t-k} / mean(y))``,
+    - a one-hot encoding of the series and, optionally, of its group
+      (e.g. municipio and departamento).
+
+    All (series, year) samples are stacked in a single sparse matrix and the
+    network is trained with mini-batches over it. Forecasts roll forward one
+    year at a time, each step being one batched prediction for every series.
+
+    With ``warm_start`` a fitted model keeps its network and feature scaling
+    and continues training for ``warm_start_epochs`` on the new samples, which
+    is how successive cross-validation folds reuse the previous fold.
+
+    The columns of the matrix must be consecutive periods (e.g. years).
+
+    Parameters
+    ----------
+    n_lags : int
+        Number of lagged values used as features.
+    hidden_layer_sizes : tuple[int, ...]
+        Hidden layers of the network.
+    batch_size : int
+        Mini-batch size.
+    n_epochs : int
+        Passes over the stacked samples.
+    learning_rate_init : float
+        Initial learning rate of adam.
+    alpha : float
+        L2 penalty of the network.
+    random_state : int, optional
+        Seed of the network initialization and mini-batch shuffling.
+    warm_start : bool
+        Continue training the fitted network on the next call to ``fit``.
+    warm_start_epochs : int
+        Passes over the samples when continuing a fitted network.
+    """
+
+    row_independent = False
+
+    def __init__(
+        self,
+        n_lags: int = 3,
+        hidden_layer_sizes: tuple[int, ...] = (32, 32),
+        batch_size: int = 256,
+        n_epochs: int = 50,
+        learning_rate_init: float = 1e-3,
+        alpha: float = 1e-4,
+        random_state: int | None = None,
+        warm_start: bool = False,
+        warm_start_epochs: int = 10,
+    ):
+        self.n_lags = n_lags
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.batch_size = batch_size
+        self.n_epochs = n_epochs
+        self.learning_rate_init = learning_rate_init
+        self.alpha = alpha
+        self.random_state = random_state
+        self.warm_start = warm_start
+        self.warm_start_epochs = warm_start_epochs
+
+    def _log_levels(self, Y: np.ndarray) -> np.ndarray:
+        """Log of the series normalized by their mean, NaN where not positive."""
+        Y = np.where(Y > 0, Y, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.log(Y) - self.log_scale_[:, None]
+
+    def _features(self, periods: np.ndarray, lags: np.ndarray, rows: np.ndarray):
+        """Stacked sparse design matrix for (row, period) samples.
+
+        ``lags`` has shape (samples, n_lags), the most recent lag first.
+        """
+        dense = np.column_stack([periods, lags])
+        dense = (dense - self.feature_mean_) / self.feature_scale_
+        blocks = [sparse.csr_matrix(dense)]
+        n_samples = len(rows)
+        ones = np.ones(n_samples)
+        blocks.append(
+            sparse.csr_matrix(
+                (ones, (np.arange(n_samples), rows)),
+                shape=(n_samples, len(self.log_scale_)),
+            )
+        )
+        if self.group_codes_ is not None:
+            blocks.append(
+                sparse.csr_matrix(
+                    (ones, (np.arange(n_samples), self.group_codes_[rows])),
+                    shape=(n_samples, self.n_groups_),
+                )
+            )
+        return sparse.hstack(blocks, format="csr")
+
+    def _windows(self, L: np.ndarray) -> np.ndarray:
+        """Lag windows of every cell from ``n_lags`` on, shape (n, T - n_lags, n_lags)."""
+        T = L.shape[1]
+        return np.stack(
+            [L[:, self.n_lags - k : T - k] for k in range(1, self.n_lags + 1)],
+            axis=-1,
+        )
+
+    def fit(
+        self,
+        periods: np.ndarray,
+        Y: np.ndarray,
+        mask: np.ndarray | None = None,
+        groups: np.ndarray | None = None,
+    ):
+        """Train the panel model.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Consecutive periods of the columns of ``Y``, shape (T,).
+        Y : np.ndarray
+            Observed values, shape (n, T). NaN or non positive cells are missing.
+        mask : np.ndarray, optional
+            Boolean (n, T) matrix of the training cells. The other cells are
+            held out: they are neither targets nor lags, and ``predict``
+            forecasts them recursively from the training cells.
+        groups : np.ndarray, optional
+            Group label of every row, shape (n,), one-hot encoded as a feature.
+
+        Returns
+        -------
+        self : PanelPopulationRegressor
+        """
+        Y = np.asarray(Y, dtype=float)
+        if mask is not None:
+            Y = np.where(np.asarray(mask, dtype=bool), Y, np.nan)
+        self.periods_ = np.asarray(periods, dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            positive = np.where(Y > 0, Y, np.nan)
+            self.log_scale_ = np.log(np.nanmean(positive, axis=1))
+        self.group_codes_ = None
+        if groups is not None:
+            _, self.group_codes_ = np.unique(np.asarray(groups), return_inverse=True)
+            self.n_groups_ = self.group_codes_.max() + 1
+
+        L = self._log_levels(Y)
+        lags = self._windows(L)
+        target = L[:, self.n_lags :] - L[:, self.n_lags - 1 : -1]
+        valid = np.isfinite(lags).all(axis=-1) & np.isfinite(target)
+        rows, cols = np.nonzero(valid)
+        sample_periods = self.periods_[self.n_lags :][cols]
+        sample_lags = lags[rows, cols]
+        y = target[rows, cols]
+
+        if self.warm_start and hasattr(self, "estimator_"):
+            self.estimator_.set_params(warm_start=True, max_iter=self.warm_start_epochs)
+        else:
+            dense = np.column_stack([sample_periods, sample_lags])
+            self.feature_mean_ = dense.mean(axis=0)
+            self.feature_scale_ = dense.std(axis=0)
+            self.feature_scale_[self.feature_scale_ == 0] = 1.0
+            self.target_mean_ = y.mean()
+            self.target_scale_ = y.std() or 1.0
+            self.estimator_ = MLPRegressor(
+                hidden_layer_sizes=self.hidden_layer_sizes,
+                solver="adam",
+                batch_size=self.batch_size,
+                learning_rate_init=self.learning_rate_init,
+                alpha=self.alpha,
+                max_iter=self.n_epochs,
+                shuffle=True,
+                random_state=self.random_state,
+            )
+        self.estimator_.fit(
+            self._features(sample_periods, sample_lags, rows),
+            (y - self.target_mean_) / self.target_scale_,
+        )
+        self.log_levels_ = L
+        return self
+
+    def _predict_growth(self, periods, lags, rows) -> np.ndarray:
+        growth = self.estimator_.predict(self._features(periods, lags, rows))
+        return growth * self.target_scale_ + self.target_mean_
+
+    def _one_step(self, L: np.ndarray) -> np.ndarray:
+        """One step ahead log levels of every cell with all its lags observed."""
+        n, T = L.shape
+        in_sample = np.full((n, T), np.nan)
+        lags = self._windows(L)
+        valid = np.isfinite(lags).all(axis=-1)
+        rows, cols = np.nonzero(valid)
+        if len(rows):
+            sample_periods = self.periods_[self.n_lags :][cols]
+            growth = self._predict_growth(sample_periods, lags[rows, cols], rows)
+            in_sample[rows, cols + self.n_lags] = L[rows, cols + self.n_lags - 1] + growth
+        return in_sample
+
+    def predict_ahead(self, Y: np.ndarray, fill: np.ndarray) -> np.ndarray:
+        """Recursively predict the ``fill`` cells of ``Y`` inside the training range.
+
+        Each step predicts the cells whose lags are available and uses those
+        predictions as lags of the next step, so a gap of several periods is
+        forecast as it would be from its start.
+
+        Parameters
+        ----------
+        Y : np.ndarray
+            Values known to the forecast, shape (n, T) like the training matrix.
+        fill : np.ndarray
+            Boolean (n, T) matrix of the cells to predict.
+
+        Returns
+        -------
+        np.ndarray
+            Predictions on the ``fill`` cells, NaN elsewhere.
+        """
+        fill = np.asarray(fill, dtype=bool)
+        L = self._log_levels(np.where(fill, np.nan, np.asarray(Y, dtype=float)))
+        pending = fill.copy()
+        while pending.any():
+            step = self._one_step(L)
+            ready = pending & np.isfinite(step)
+            if not ready.any():
+                break
+            L = np.where(ready, step, L)
+            pending &= ~ready
+        with np.errstate(invalid="ignore"):
+            return np.where(fill, np.exp(L + self.log_scale_[:, None]), np.nan)
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Predict every row at the given periods.
+
+        Periods inside the training range are one step ahead predictions from
+        the observed lags, except for the cells without a training value
+        (e.g. held out by the ``mask`` of ``fit``), which are forecast
+        recursively with ``predict_ahead`` so no held-out value is used.
+        Periods after it are forecast recursively from the last observed
+        values, one batched prediction per period.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Periods to predict, shape (H,).
+
+        Returns
+        -------
+        np.ndarray
+            Predictions, shape (n, H). NaN where the lags are not available.
+        """
+        periods = np.atleast_1d(np.asarray(periods, dtype=float))
+        L = self.log_levels_
+        n, T = L.shape
+        all_rows = np.arange(n)
+
+        # one step ahead inside the training range
+        in_sample = self._one_step(L)
+        missing = ~np.isfinite(L)
+        if missing.any():
+            ahead = self.predict_ahead(np.exp(L + self.log_scale_[:, None]), missing)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ahead = np.log(ahead) - self.log_scale_[:, None]
+            in_sample = np.where(missing, ahead, in_sample)
+
+        # recursive forecast after the training range, from the last values
+        last_period = self.periods_[-1]
+        horizon = int(max(0, periods.max() - last_period))
+        forecast = np.full((n, horizon), np.nan)
+        if horizon:
+            observed = np.isfinite(L)
+            last = np.maximum.accumulate(np.where(observed, np.arange(T), 0), axis=1)
+            filled = np.where(observed.any(axis=1)[:, None], L[all_rows[:, None], last], np.nan)
+            state = filled[:, ::-1][:, : self.n_lags]
+            for h in range(horizon):
+                step = np.full(n, last_period + h + 1)
+                growth = self._predict_growth(step, state, all_rows)
+                level = state[:, 0] + growth
+                forecast[:, h] = level
+                state = np.column_stack([level, state[:, :-1]])
+
+        prediction = np.full((n, len(periods)), np.nan)
+        for j, period in enumerate(periods):
+            if period > last_period:
+                prediction[:, j] = forecast[:, int(period - last_period) - 1]
+            else:
+                idx = np.flatnonzero(self.periods_ == period)
+                if len(idx):
+                    prediction[:, j] = in_sample[:, idx[0]]
+        with np.errstate(invalid="ignore"):
+            return np.exp(prediction + self.log_scale_[:, None])
+
+
+class BatchedHoltLinearTrend(_RowSubsetMixin):
+    """Holt's linear trend exponential smoothing for every row of a matrix.
+
+    The smoothing recursion runs one period at a time over all rows and all
+    candidate ``(alpha, beta)`` pairs at once. Each row keeps the pair with
+    the lowest one step ahead squared error on its fitted cells. Missing
+    periods advance the level by the trend without updating it.
+
+    The columns of the matrix must be consecutive periods (e.g. years).
+
+    Parameters
+    ----------
+    alphas : tuple[float, ...]
+        Candidate smoothing factors of the level.
+    betas : tuple[float, ...]
+        Candidate smoothing factors of the trend.
+    """
+
+    _row_attributes = ("alpha_", "beta_", "level_", "trend_", "fitted_")
+
+    def __init__(
+        self,
+        alphas: tuple[float, ...] = (0.2, 0.4, 0.6, 0.8, 1.0),
+        betas: tuple[float, ...] = (0.0, 0.1, 0.2, 0.4, 0.6),
+    ):
+        self.alphas = alphas
+        self.betas = betas
+
+    def fit(self, periods: np.ndarray, Y: np.ndarray, mask: np.ndarray | None = None):
+        """Run the smoothing recursion of every row of ``Y``.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Consecutive periods of the columns of ``Y``, shape (T,).
+        Y : np.ndarray
+            Observed values, shape (n, T). NaN marks a missing period.
+        mask : np.ndarray, optional
+            Boolean (n, T) matrix with the cells used for fitting, intersected
+            with the non NaN cells of ``Y``.
+
+        Returns
+        -------
+        self : BatchedHoltLinearTrend
+        """
+        Y = np.asarray(Y, dtype=float)
+        self.periods_ = np.asarray(periods, dtype=float)
+        observed = ~np.isnan(Y)
+        if mask is not None:
+            observed &= mask
+        n, T = Y.shape
+        alpha, beta = np.meshgrid(self.alphas, self.betas, indexing="ij")
+        alpha = alpha.reshape(-1, 1)
+        beta = beta.reshape(-1, 1)
+
+        # states of every (alpha, beta) pair and row, shape (G, n)
+        level = np.zeros((len(alpha), n))
+        trend = np.zeros((len(alpha), n))
+        count = np.zeros(n, dtype=int)
+        last = np.zeros(n)
+        fitted = np.full((len(alpha), n, T), np.nan)
+        sse = np.zeros((len(alpha), n))
+        for t in range(T):
+            y = np.where(observed[:, t], Y[:, t], 0.0)
+            forecast = level + trend
+            ready = count >= 2
+            fitted[:, ready, t] = forecast[:, ready]
+
+            update = observed[:, t] & ready
+            sse += np.where(update, (y - forecast) ** 2, 0.0)
+            new_level = alpha * y + (1 - alpha) * forecast
+            new_trend = beta * (new_level - level) + (1 - beta) * trend
+            level = np.where(update, new_level, forecast)
+            trend = np.where(update, new_trend, trend)
+
+            # the first observation sets the level, the second one the trend
+            second = observed[:, t] & (count == 1)
+            trend = np.where(second, (y - level) / np.maximum(t - last, 1), trend)
+            level = np.where(second | (observed[:, t] & (count == 0)), y, level)
+            last = np.where(observed[:, t], t, last)
+            count += observed[:, t]
+
+        best = np.argmin(sse, axis=0)
+        rows = np.arange(n)
+        self.alpha_ = alpha[best, 0]
+        self.beta_ = beta[best, 0]
+        self.level_ = np.where(count > 0, level[best, rows], np.nan)
+        self.trend_ = trend[best, rows]
+        self.fitted_ = fitted[best, rows]
+        return self
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Predict every row at the given periods.
+
+        Periods inside the training range are the one step ahead values of
+        the recursion. Periods after it extrapolate the last level and trend.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Periods to predict, shape (H,).
+
+        Returns
+        -------
+        np.ndarray
+            Predictions, shape (n, H). NaN before the trend is available.
+        """
+        periods = np.atleast_1d(np.asarray(periods, dtype=float))
+        last_period = self.periods_[-1]
+        prediction = np.full((len(self.level_), len(periods)), np.nan)
+        for j, period in enumerate(periods):
+            if period > last_period:
+                steps = period - last_period
+                prediction[:, j] = self.level_ + steps * self.trend_
+            else:
+                idx = np.flatnonzero(self.periods_ == period)
+                if len(idx):
+                    prediction[:, j] = self.fitted_[:, idx[0]]
+        return prediction
+
+
+class BatchedGeometricGrowth(_RowSubsetMixin):
+    """Constant rate growth ``y = y0 * (1 + r) ** t`` for every row of a matrix.
+
+    Fitted as a batched straight line on the log of the observed values, so
+    non positive cells are treated as missing.
+    """
+
+    _row_attributes = ("log_model_",)
+
+    def fit(self, periods: np.ndarray, Y: np.ndarray, mask: np.ndarray | None = None):
+        """Fit one growth rate per row of ``Y``.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Period of each column of ``Y``, shape (T,).
+        Y : np.ndarray
+            Observed values, shape (n, T). NaN marks a missing period.
+        mask : np.ndarray, optional
+            Boolean (n, T) matrix with the cells used for fitting.
+
+        Returns
+        -------
+        self : BatchedGeometricGrowth
+        """
+        Y = np.asarray(Y, dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_Y = np.log(np.where(Y > 0, Y, np.nan))
+        self.log_model_ = BatchedLinearRegression().fit(periods, log_Y, mask=mask)
+        return self
+
+    @property
+    def rate_(self) -> np.ndarray:
+        """Yearly growth rate ``r`` of every row."""
+        return np.expm1(self.log_model_.coef_[:, 0])
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Predict every row at the given periods, shape (n, H)."""
+        with np.errstate(over="ignore"):
+            return np.exp(self.log_model_.predict(periods))
+
+
+class BatchedLogisticGrowth(_RowSubsetMixin):
+    """Logistic growth ``y = K / (1 + exp(-r (t - t0)))`` for every row.
+
+    For a fixed capacity ``K`` the curve is a straight line on
+    ``log(K / y - 1)``, so every candidate capacity of every row is fitted in
+    a single batched regression. Each row keeps the capacity with the lowest
+    squared error on the original scale. Capacities are multiples of the
+    largest fitted value of the row, and a negative rate gives a decreasing
+    population.
+
+    Parameters
+    ----------
+    capacity_factors : tuple[float, ...]
+        Candidate capacities as multiples of the row maximum, all above 1.
+    """
+
+    _row_attributes = ("capacity_", "logit_model_")
+
+    def __init__(
+        self, capacity_factors: tuple[float, ...] = (1.05, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0)
+    ):
+        self.capacity_factors = capacity_factors
+
+    def fit(self, periods: np.ndarray, Y: np.ndarray, mask: np.ndarray | None = None):
+        """Fit one logistic curve per row of ``Y``.
+
+        Parameters
+        ----------
+        periods : np.ndarray
+            Period of each column of ``Y``, shape (T,).
+        Y : np.ndarray
+            Observed values, shape (n, T). NaN marks a missing period.
+        mask : np.ndarray, optional
+            Boolean (n, T) matrix with the cells used for fitting.
+
+        Returns
+        -------
+        self : BatchedLogisticGrowth
+        """
+        Y = np.asarray(Y, dtype=float)
+        observed = ~np.isnan(Y) & (np.nan_to_num(Y) > 0)
+        if mask is not None:
+            observed &= mask
+        Y = np.where(observed, Y, np.nan)
+        n = len(Y)
+        factors = np.asarray(self.capacity_factors, dtype=float)
+        with np.errstate(invalid="ignore"):
+            peak = np.nanmax(np.where(observed, Y, -np.inf), axis=1)
+        peak = np.where(np.isfinite(peak), peak, np.nan)
+
+        # every candidate capacity stacked as extra rows, shape (C * n, T)
+        capacity = (factors[:, None] * peak[None, :]).reshape(-1)
+        stacked = np.tile(Y, (len(factors), 1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            logit = np.log(capacity[:, None] / stacked - 1)
+        model = BatchedLinearRegression().fit(periods, logit)
+        with np.errstate(over="ignore"):
+            fitted = capacity[:, None] / (1 + np.exp(model.predict(periods)))
+        sse = np.nansum((fitted - stacked) ** 2, axis=1).reshape(len(factors), n)
+
+        best = np.argmin(sse, axis=0) * n + np.arange(n)
+        self.capacity_ = capacity[best]
+        self.logit_model_ = model.take(best)
+        return self
+
+    def predict(self, periods: np.ndarray) -> np.ndarray:
+        """Predict every row at the given periods, shape (n, H)."""
+        with np.errstate(over="ignore"):
+            return self.capacity_[:, None] / (1 + np.exp(self.logit_model_.predict(periods)))
+
+
+def batched_train_test_split(
+    observed: np.ndarray, test_size: float = 0.2, random_state: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Split the observed cells of every row into train and test masks.
+
+    The split of a row only depends on how many observations it has, so
+    ``sklearn.model_selection.train_test_split`` is called once per distinct
+    count and the positions are scattered to every row with that count. Each
+    row gets the same split it would get from calling ``train_test_split`` on
+    its observed periods alone.
+
+    Parameters
+    ----------
+    observed : np.ndarray
+        Boolean (n, T) matrix of observed cells.
+    test_size : float
+        Fraction of the observed cells of each row used for testing.
+    random_state : int, optional
+        Seed passed to ``train_test_split``.
+
+    Returns
+    -------
+    train, test : tuple[np.ndarray, np.ndarray]
+        Boolean (n, T) masks.
+    """
+    observed = np.asarray(observed, dtype=bool)
+    train = np.zeros_like(observed)
+    test = np.zeros_like(observed)
+    n_obs = observed.sum(axis=1)
+    # rank of each observed cell inside its row: 0, 1, ..., n_obs - 1
+    rank = np.cumsum(observed, axis=1) - 1
+    for count in np.unique(n_obs):
+        rows = n_obs == count
+        if count < 2:
+            train[rows] = observed[rows]
+            continue
+        idx_train, idx_test = train_test_split(
+            np.arange(count), test_size=test_size, random_state=random_state
+        )
+        in_train = np.zeros(count, dtype=bool)
+        in_train[idx_train] = True
+        in_test = np.zeros(count, dtype=bool)
+        in_test[idx_test] = True
+        sub_rank = np.where(observed[rows], rank[rows], 0)
+        train[rows] = observed[rows] & in_train[sub_rank]
+        test[rows] = observed[rows] & in_test[sub_rank]
+    return train, test
+
+
+def rolling_origin_split(
+    observed: np.ndarray, n_folds: int = 3, horizon: int = 3, min_train: int = 5
+) -> tuple[np.ndarray, np.ndarray]:
+    """Expanding window folds over the observed cells of every row.
+
+    Fold ``k`` of a row trains on its observations before the origin
+    ``n_obs - horizon * (n_folds - k)`` and tests on the next ``horizon``
+    observations, so the test cells of the folds do not overlap and never
+    precede the training cells. Folds with less than ``min_train`` training
+    observations are left empty.
+
+    Parameters
+    ----------
+    observed : np.ndarray
+        Boolean (n, T) matrix of observed cells.
+    n_folds : int
+        Number of origins.
+    horizon : int
+        Observations tested after each origin.
+    min_train : int
+        Minimum training observations of a fold.
+
+    Returns
+    -------
+    train, test : tuple[np.ndarray, np.ndarray]
+        Boolean (n_folds, n, T) masks.
+    """
+    observed = np.asarray(observed, dtype=bool)
+    rank = np.cumsum(observed, axis=1) - 1
+    n_obs = observed.sum(axis=1)
+    origins = n_obs[None, :] - horizon * (n_folds - np.arange(n_folds))[:, None]
+    origins = np.where(origins >= min_train, origins, -1)[:, :, None]
+    valid = observed[None] & (origins >= 0)
+    train = valid & (rank[None] < origins)
+    test = valid & (rank[None] >= origins) & (rank[None] < origins + horizon)
+    return train, test
+
+
+def cross_validate_batched(
+    model,
+    periods: np.ndarray,
+    Y: np.ndarray,
+    train: np.ndarray,
+    test: np.ndarray,
+    y_true: np.ndarray | None = None,
+    transform=None,
+    **fit_params,
+) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """Score a batched model on every fold of every row.
+
+    Models with independent rows are fitted once on the folds stacked as
+    extra rows, shape (F * n, T), each copy masked by its training cells.
+    Other models (the panel network) are fitted fold by fold in the given
+    order; with ``warm_start`` every fold continues from the previous one.
+    Their test cells are forecast recursively with ``predict_ahead`` when
+    available, so no test value is used as a lag.
+
+    Parameters
+    ----------
+    model
+        Batched model with ``fit(periods, Y, mask)`` and ``predict(periods)``.
+    periods : np.ndarray
+        Period of each column of ``Y``, shape (T,).
+    Y : np.ndarray
+        Values the model is fitted on, shape (n, T).
+    train, test : np.ndarray
+        Boolean (F, n, T) fold masks, e.g. from ``rolling_origin_split``.
+    y_true : np.ndarray, optional
+        Values the predictions are scored against (default ``Y``).
+    transform : callable, optional
+        Applied to the predictions before scoring, e.g. to change their scale.
+    **fit_params
+        Extra arguments of ``fit``.
+
+    Returns
+    -------
+    scores : dict[str, np.ndarray]
+        Metric tensors of shape (F, n) keyed as ``batched_regression_metrics``.
+    out_of_fold : np.ndarray
+        (n, T) matrix with the prediction of every test cell, NaN elsewhere.
+    """
+    Y = np.asarray(Y, dtype=float)
+    y_true = Y if y_true is None else np.asarray(y_true, dtype=float)
+    n_folds, n, T = train.shape
+    if getattr(model, "row_independent", False):
+        model.fit(
+            periods,
+            np.tile(Y, (n_folds, 1)),
+            mask=train.reshape(-1, T),
+            **fit_params,
+        )
+        predictions = model.predict(periods).reshape(n_folds, n, T)
+    else:
+        predictions = np.full((n_folds, n, T), np.nan)
+        for k in range(n_folds):
+            Y_fold = np.where(train[k], Y, np.nan)
+            model.fit(periods, Y_fold, **fit_params)
+            if hasattr(model, "predict_ahead"):
+                predictions[k] = model.predict_ahead(Y_fold, test[k])
+            else:
+                predictions[k] = model.predict(periods)
+    if transform is not None:
+        predictions = transform(predictions)
+    predictions = np.where(test, predictions, np.nan)
+
+    scores = batched_regression_metrics(
+        np.tile(y_true, (n_folds, 1)),
+        predictions.reshape(-1, T),
+        mask=test.reshape(-1, T),
+    )
+    scores = {name: value.reshape(n_folds, n) for name, value in scores.items()}
+    # test cells of different folds do not overlap
+    fold = test.argmax(axis=0)[None]
+    out_of_fold = np.take_along_axis(predictions, fold, axis=0)[0]
+    out_of_fold = np.where(test.any(axis=0), out_of_fold, np.nan)
+    return scores, out_of_fold
+
+
+def fold_forecast_steps(train: np.ndarray, test: np.ndarray) -> np.ndarray:
+    """Observations between every test cell and the last training cell before it.
+
+    Parameters
+    ----------
+    train, test : np.ndarray
+        Boolean (F, n, T) fold masks.
+
+    Returns
+    -------
+    np.ndarray
+        (n, T) matrix with the forecast step of every test cell (1 for the
+        first observation after the training ones), NaN elsewhere. Test cells
+        without training cells before them are NaN.
+    """
+    rank = np.cumsum(train | test, axis=-1) - 1
+    last_train = np.maximum.accumulate(np.where(train, rank, -1), axis=-1)
+    steps = np.where(test & (last_train >= 0), rank - last_train, 0).sum(axis=0)
+    return np.where(steps > 0, steps, np.nan)
+
+
+def residual_bootstrap(
+    point: np.ndarray,
+    residuals: np.ndarray,
+    steps: np.ndarray,
+    target_steps: np.ndarray,
+    n_scenarios: int = 1000,
+    random_state: int | None = None,
+) -> np.ndarray:
+    """Scenarios of point forecasts from the relative residuals of every row.
+
+    Each scenario multiplies the point forecast of a row by ``exp(e)``, with
+    ``e`` drawn with replacement from that row's log residuals. A residual
+    made ``steps`` ahead is rescaled to ``target_steps`` ahead assuming the
+    error grows like a random walk, ``e * sqrt(target_steps / steps)``. The
+    rescaled residuals of a row are centred on their mean before drawing, so
+    the scenarios spread around the point forecast instead of repeating the
+    bias of a handful of residuals, and the point forecast stays inside its
+    own band. All draws are a single (n_scenarios, n) operation.
+
+    Parameters
+    ----------
+    point : np.ndarray
+        Point forecasts, shape (n,).
+    residuals : np.ndarray
+        Log relative residuals ``log(y / y_pred)``, shape (n, R), NaN padded.
+    steps : np.ndarray
+        Forecast step of every residual, shape (n, R).
+    target_steps : np.ndarray
+        Steps between the last observation and the forecast, shape (n,).
+    n_scenarios : int
+        Number of scenarios.
+    random_state : int, optional
+        Seed of the draws.
+
+    Returns
+    -------
+    np.ndarray
+        float32 scenarios, shape (n_scenarios, n). Rows without residuals
+        repeat their point forecast.
+    """
+    rng = np.random.default_rng(random_state)
+    point = np.asarray(point, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        target = np.asarray(target_steps, dtype=float)[:, None]
+        scaled = residuals * np.sqrt(target / steps)
+    valid = np.isfinite(scaled)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bias = np.where(valid, scaled, 0.0).sum(axis=1) / count
+    scaled = scaled - bias[:, None]
+    # valid residuals first in every row, NaN at the end
+    pool = np.sort(np.where(valid, scaled, np.nan), axis=1)
+    draw = (rng.random((n_scenarios, len(point))) * count).astype(int)
+    draws = pool[np.arange(len(point)), np.minimum(draw, pool.shape[1] - 1)]
+    draws = np.where(count > 0, draws, 0.0)
+    return (point * np.exp(draws)).astype(np.float32)
+
+
+def batched_regression_metrics(
+    y_true: np.ndarray, y_pred: np.ndarray, mask: np.ndarray | None = None
+) -> dict[str, np.ndarray]:
+    """R2, MAE, MSE and RMSE of every row over its masked cells.
+
+    Matches ``sklearn.metrics`` row by row: R2 is NaN with less than two
+    samples, and a constant row scores 1.0 when predicted exactly, else 0.0.
+
+    Parameters
+    ----------
+    y_true, y_pred : np.ndarray
+        Matrices of shape (n, T). NaN cells in either of them are ignored.
+    mask : np.ndarray, optional
+        Boolean (n, T) matrix with the cells to score.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Arrays of shape (n,) keyed by ``"R2"``, ``"MAE"``, ``"MSE"``, ``"RMSE"``.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    valid = ~np.isnan(y_true) & ~np.isnan(y_pred)
+    if mask is not None:
+        valid &= mask
+    count = valid.sum(axis=1)
+    error = np.where(valid, y_true - y_pred, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mae = np.abs(error).sum(axis=1) / count
+        mse = (error**2).sum(axis=1) / count
+        y_mean = np.where(valid, y_true, 0.0).sum(axis=1) / count
+        total = np.where(valid, y_true - y_mean[:, None], 0.0) ** 2
+        total = total.sum(axis=1)
+        residual = (error**2).sum(axis=1)
+        r2 = np.where(
+            total > 0, 1 - residual / total, np.where(residual == 0, 1.0, 0.0)
+        )
+    r2 = np.where(count < 2, np.nan, r2)
+    return {"R2": r2, "MAE": mae, "MSE": mse, "RMSE": np.sqrt(mse)}
@@ -0,0 +1,266 @@
+"""Demand Aggregation Module.
+
+Nearby demand points are merged into the point of the group with the largest
+demand, the CFLP is solved over the representatives and the flows are split
+back among the members in proportion to their demand.
+
+Splitting the flows keeps every plan feasible, so the disaggregated cost is
+an exact upper bound. For the lower bound, any solution of the original
+problem sent to the representatives costs at most
+
+    E = sum_j b[j] max_i (c[i, rep(j)] - c[i, j])^+
+
+more, so the optimum of the original problem is at least the bound of the
+aggregated one minus ``E``. That a priori bound is loose when the costs are
+not close to a metric, so the Lagrangian bound of the original problem,
+started from the duals of the flows of the disaggregated plan, is used when
+it is better.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from ...ai.clustering import EARTH_RADIUS_KM
+from .cflp import lagrangian_bound, solve_cflp, transportation
+
+
+@dataclass
+class AggregatedCFLPSolution:
+    """Solution of a CFLP solved over aggregated demand points.
+
+    Attributes
+    ----------
+    objective : float
+        Cost of the disaggregated solution in the original problem.
+    Y : np.ndarray
+        Opening decision, shape (m,).
+    X : np.ndarray
+        Disaggregated flows, shape (m, n).
+    aggregated_objective : float
+        Objective of the aggregated problem.
+    bound : float
+        Lower bound on the optimum of the original problem.
+    aggregation_error : float
+        ``E``, the a priori bound on how much the aggregation overestimates
+        costs.
+    labels : np.ndarray
+        Group of every demand point, shape (n,).
+    representatives : np.ndarray
+        Demand point that represents every group, shape (K,).
+    status : str
+        Status reported by the solver of the aggregated problem.
+    runtime : float
+        Seconds spent solving.
+    """
+
+    objective: float
+    Y: np.ndarray
+    X: np.ndarray
+    aggregated_objective: float
+    bound: float
+    aggregation_error: float
+    labels: np.ndarray
+    representatives: np.ndarray
+    status: str
+    runtime: float
+
+    @property
+    def gap(self) -> float:
+        """Relative gap between the objective and the bound."""
+        if not np.isfinite(self.objective) or self.objective == 0:
+            return np.inf
+        return max(self.objective - self.bound, 0.0) / abs(self.objective)
+
+    @property
+    def error_bound(self) -> float:
+        """Most the objective can exceed the optimum of the original problem."""
+        return max(self.objective - self.bound, 0.0)
+
+
+def _greedy_groups(
+    tree: BallTree, coordinates: np.ndarray, order: np.ndarray, radius: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Groups of the points within ``radius`` of the next ungrouped point."""
+    labels = np.full(len(coordinates), -1)
+    representatives = []
+    for point in order:
+        if labels[point] >= 0:
+            continue
+        # only the representatives are queried, so large radii stay cheap
+        members = tree.query_radius(coordinates[point : point + 1], radius)[0]
+        members = members[labels[members] < 0]
+        labels[members] = len(representatives)
+        representatives.append(point)
+    return labels, np.array(representatives)
+
+
+def aggregate_demand(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    b: np.ndarray,
+    radius: float | None = None,
+    n_points: int | None = None,
+    tolerance: float = 0.01,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Merge the demand points within a radius of each other.
+
+    The points are visited from the largest demand down, every point not yet
+    grouped becomes a representative and takes all ungrouped points within
+    ``radius`` kilometers, found with a haversine ``BallTree``. Given
+    ``n_points`` instead, the smallest radius that gives at most that many
+    groups is found by bisection.
+
+    Parameters
+    ----------
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    b : np.ndarray
+        Demands, shape (n,).
+    radius : float, optional
+        Radius of the groups in kilometers.
+    n_points : int, optional
+        Maximum number of groups, used if ``radius`` is not given.
+    tolerance : float
+        Kilometers at which the bisection over the radius stops.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Group of every point, shape (n,).
+    representatives : np.ndarray
+        Index of the representative of every group, shape (K,).
+    """
+    coordinates = np.radians(np.column_stack([lat, lon]))
+    tree = BallTree(coordinates, metric="haversine")
+    order = np.argsort(-np.asarray(b, dtype=float), kind="stable")
+    if radius is not None or n_points is None or n_points >= len(coordinates):
+        return _greedy_groups(tree, coordinates, order, (radius or 0.0) / EARTH_RADIUS_KM)
+    # half the circumference of the Earth puts every point in one group
+    low, high = 0.0, np.pi
+    groups = _greedy_groups(tree, coordinates, order, high)
+    while (high - low) * EARTH_RADIUS_KM > tolerance:
+        middle = (low + high) / 2
+        candidate = _greedy_groups(tree, coordinates, order, middle)
+        if len(candidate[1]) <= n_points:
+            high, groups = middle, candidate
+        else:
+            low = middle
+    return groups
+
+
+def aggregation_error(
+    c: np.ndarray,
+    b: np.ndarray,
+    labels: np.ndarray,
+    representatives: np.ndarray,
+    chunk_size: int = 2048,
+) -> float:
+    """Largest overestimation of the costs caused by the aggregation.
+
+    Parameters
+    ----------
+    c : np.ndarray
+        Unit transport costs to the original points, shape (m, n).
+    b : np.ndarray
+        Demands, shape (n,).
+    labels, representatives : np.ndarray
+        Groups, as returned by ``aggregate_demand``.
+    chunk_size : int
+        Demand points processed at a time, so that only ``m x chunk_size``
+        differences are kept in memory.
+
+    Returns
+    -------
+    float
+        ``sum_j b[j] max_i (c[i, rep(j)] - c[i, j])^+``.
+    """
+    b = np.asarray(b, dtype=float)
+    rep = np.asarray(representatives)[labels]
+    error = 0.0
+    for start in range(0, len(b), chunk_size):
+        columns = slice(start, start + chunk_size)
+        excess = (c[:, rep[columns]] - c[:, columns]).max(axis=0)
+        error += b[columns] @ np.maximum(excess, 0)
+    return error
+
+
+def solve_aggregated_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    radius: float | None = None,
+    n_points: int | None = None,
+    time_limit: float = 60,
+    mip_rel_gap: float = 1e-4,
+    reoptimize: bool = True,
+    lagrangian_iterations: int = 300,
+) -> AggregatedCFLPSolution:
+    """Solve a CFLP over aggregated demand points and disaggregate it.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs to the original points, shape (m, n).
+    lat, lon : np.ndarray
+        Coordinates of the demand points in degrees, shape (n,).
+    radius, n_points
+        Aggregation level, as in ``aggregate_demand``.
+    time_limit : float
+        Seconds given to HiGHS for the aggregated problem.
+    mip_rel_gap : float
+        Relative gap at which the aggregated problem stops.
+    reoptimize : bool
+        Replace the proportional split by the cheapest flows of the plan in
+        the original problem, an LP over the open facilities.
+    lagrangian_iterations : int
+        Subgradient steps of the Lagrangian bound of the original problem,
+        zero to keep only the a priori bound.
+
+    Returns
+    -------
+    AggregatedCFLPSolution
+        The gap covers both the aggregation and the solver gap.
+    """
+    start = time.time()
+    f, a, b = (np.asarray(v, dtype=float) for v in (f, a, b))
+    labels, representatives = aggregate_demand(lat, lon, b, radius, n_points)
+    grouped = np.bincount(labels, weights=b, minlength=len(representatives))
+    reduced = solve_cflp(
+        f, a, grouped, np.asarray(c[:, representatives], dtype=float), time_limit, mip_rel_gap
+    )
+    error = aggregation_error(c, b, labels, representatives)
+    m, n = len(f), len(b)
+    if reduced.X is None:
+        return AggregatedCFLPSolution(
+            np.inf, np.zeros(m), np.zeros((m, n)), reduced.objective, reduced.bound - error,
+            error, labels, representatives, reduced.status, time.time() - start,
+        )
+    # every member takes the flows of its group in proportion to its demand
+    share = np.divide(b, grouped[labels], out=np.zeros(n), where=grouped[labels] > 0)
+    X = reduced.X[:, labels] * share
+    objective = f @ reduced.Y + sum(c[i] @ X[i] for i in np.flatnonzero(reduced.Y))
+    bound = reduced.bound - error
+    v = None
+    if reoptimize:
+        cost, X_plan, v = transportation(reduced.Y, a, b, c)
+        if f @ reduced.Y + cost < objective:
+            objective, X = f @ reduced.Y + cost, X_plan
+    if lagrangian_iterations > 0:
+        lagrangian = lagrangian_bound(
+            f, a, b, c, lagrangian_iterations, objective, prices=v
+        )[0]
+        bound = max(bound, lagrangian)
+    return AggregatedCFLPSolution(
+        objective, reduced.Y, X, reduced.objective, bound, error,
+        labels, representatives, reduced.status, time.time() - start,
+    )
@@ -1,10 +1,648 @@
-"""Capacitated Facility Location Problem (CFLP) Module."""
+"""Capacitated Facility Location Problem (CFLP) Module.
 
+Every candidate facility ``i`` has a fixed opening cost ``f[i]`` and a
+capacity ``a[i]``, every customer ``j`` a demand ``b[j]`` and ``c[i, j]`` is the
+cost of sending one unit from ``i`` to ``j``:
 
-# PuLP
+    min  sum_i f[i] Y[i] + sum_ij c[i, j] X[i, j]
+    s.t. sum_i X[i, j] >= b[j]          for all j
+         sum_j X[i, j] <= a[i] Y[i]     for all i
+         X >= 0, Y in {0, 1}
 
-# OR-Tools
+The models are built as sparse matrices and solved with HiGHS through
+``scipy.optimize``.
+"""
 
-# ScyPy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 
-# Pyomo
\ No newline at end of file
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+
+from ...parallel import limit_threads
+
+
+@dataclass
+class CFLPSolution:
+    """Solution of a CFLP.
+
+    Attributes
+    ----------
+    objective : float
+        Total cost (fixed plus transport, plus unmet demand penalty if any).
+    Y : np.ndarray
+        Opening decision of every facility, shape (m,).
+    X : np.ndarray | None
+        Flows, shape (m, n).
+    status : str
+        Status reported by the solver.
+    bound : float
+        Lower bound on the optimal objective.
+    runtime : float
+        Seconds spent solving.
+    """
+
+    objective: float
+    Y: np.ndarray
+    X: np.ndarray | None
+    status: str
+    bound: float
+    runtime: float
+
+    @property
+    def gap(self) -> float:
+        """Relative gap between the objective and the bound."""
+        if not np.isfinite(self.objective) or self.objective == 0:
+            return np.inf
+        return max(self.objective - self.bound, 0.0) / abs(self.objective)
+
+
+def cflp_constraints(
+    a: np.ndarray, b: np.ndarray, strong: bool = False
+) -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """Sparse constraint matrix of the CFLP over ``[Y, X.ravel()]``.
+
+    Parameters
+    ----------
+    a : np.ndarray
+        Capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    strong : bool
+        Add ``X[i, j] <= b[j] Y[i]``, redundant for the MIP but they lift the
+        LP relaxation to the bound of ``lagrangian_bound``.
+
+    Returns
+    -------
+    A, lower, upper : tuple
+        ``lower <= A @ [Y, X.ravel()] <= upper`` with the demand rows first.
+    """
+    m, n = len(a), len(b)
+    # demand: sum_i X[i, j] >= b[j]
+    demand = sparse.hstack(
+        [sparse.csr_matrix((n, m)), sparse.hstack([sparse.eye(n)] * m)]
+    )
+    # capacity: sum_j X[i, j] - a[i] Y[i] <= 0
+    capacity = sparse.hstack(
+        [sparse.diags(-np.asarray(a, dtype=float)), sparse.kron(sparse.eye(m), np.ones((1, n)))]
+    )
+    A = sparse.vstack([demand, capacity], format="csr")
+    lower = np.concatenate([b, np.full(m, -np.inf)])
+    upper = np.concatenate([np.full(n, np.inf), np.zeros(m)])
+    if strong:
+        # X[i, j] - b[j] Y[i] <= 0
+        linking = sparse.hstack(
+            [-sparse.kron(sparse.eye(m), np.asarray(b, dtype=float)[:, None]), sparse.eye(m * n)]
+        )
+        A = sparse.vstack([A, linking], format="csr")
+        lower = np.concatenate([lower, np.full(m * n, -np.inf)])
+        upper = np.concatenate([upper, np.zeros(m * n)])
+    return A, lower, upper
+
+
+def solve_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    time_limit: float = 60,
+    mip_rel_gap: float = 1e-4,
+    relax: bool = False,
+    fixed: dict[int, int] | None = None,
+    disp: bool = False,
+    strong: bool = False,
+) -> CFLPSolution:
+    """Solve a CFLP with HiGHS.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    time_limit : float
+        Seconds given to HiGHS.
+    mip_rel_gap : float
+        Relative gap at which the search stops.
+    relax : bool
+        Solve the LP relaxation (``0 <= Y <= 1``) instead of the MIP.
+    fixed : dict[int, int], optional
+        Facilities whose ``Y`` is fixed to the given value.
+    disp : bool
+        Print the HiGHS log.
+    strong : bool
+        Use the strong formulation of ``cflp_constraints``.
+
+    Returns
+    -------
+    CFLPSolution
+    """
+    tiempo_inicial = time.time()
+    f, a, b, c = (np.asarray(v, dtype=float) for v in (f, a, b, c))
+    m, n = c.shape
+    A, lower, upper = cflp_constraints(a, b, strong)
+    y_lower, y_upper = np.zeros(m), np.ones(m)
+    for i, value in (fixed or {}).items():
+        y_lower[i] = y_upper[i] = value
+    result = milp(
+        np.concatenate([f, c.ravel()]),
+        constraints=LinearConstraint(A, lower, upper),
+        integrality=np.concatenate([np.full(m, 0 if relax else 1), np.zeros(m * n)]),
+        bounds=Bounds(
+            np.concatenate([y_lower, np.zeros(m * n)]),
+            np.concatenate([y_upper, np.full(m * n, np.inf)]),
+        ),
+        options={"time_limit": time_limit, "mip_rel_gap": mip_rel_gap, "disp": disp},
+    )
+    runtime = time.time() - tiempo_inicial
+    if result.x is None:
+        return CFLPSolution(np.inf, np.zeros(m), None, result.message, -np.inf, runtime)
+    bound = getattr(result, "mip_dual_bound", None)
+    bound = result.fun if relax or bound is None else bound
+    return CFLPSolution(
+        result.fun,
+        result.x[:m] if relax else np.round(result.x[:m]),
+        result.x[m:].reshape(m, n),
+        result.message,
+        bound,
+        runtime,
+    )
+
+
+def transportation(
+    Y: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    penalty: float | None = None,
+) -> tuple[float, np.ndarray, np.ndarray]:
+    """Cheapest flows from the open facilities, the recourse of a CFLP.
+
+    Only the open facilities enter the LP, each with capacity ``a[i] Y[i]``.
+    With ``penalty`` every unit of unmet demand costs ``penalty``, so the
+    problem is always feasible.
+
+    Parameters
+    ----------
+    Y : np.ndarray
+        Open facilities, shape (m,), fractional values scale the capacity.
+    a : np.ndarray
+        Capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    penalty : float, optional
+        Cost of every unit of unmet demand.
+
+    Returns
+    -------
+    cost : float
+        Transport cost (plus penalties), ``inf`` if infeasible.
+    X : np.ndarray
+        Flows, shape (m, n).
+    v : np.ndarray
+        Duals of the demand constraints, shape (n,), NaN if infeasible.
+    """
+    a, b, c = (np.asarray(v, dtype=float) for v in (a, b, c))
+    m, n = c.shape
+    Y = np.asarray(Y, dtype=float)
+    open_ = np.flatnonzero(Y > 1e-9)
+    k = len(open_)
+    slack = penalty is not None
+    cost = np.concatenate([c[open_].ravel(), np.full(n if slack else 0, penalty or 0.0)])
+    # demand as -sum_i X[i, j] - u[j] <= -b[j], capacity as sum_j X[i, j] <= a[i]
+    demand = sparse.hstack([sparse.eye(n)] * k + ([sparse.eye(n)] if slack else []))
+    capacity = sparse.hstack(
+        [sparse.kron(sparse.eye(k), np.ones((1, n)))]
+        + ([sparse.csr_matrix((k, n))] if slack else [])
+    )
+    result = linprog(
+        cost,
+        A_ub=sparse.vstack([-demand, capacity], format="csr"),
+        b_ub=np.concatenate([-b, a[open_] * Y[open_]]),
+        bounds=(0, None),
+        method="highs",
+    )
+    X = np.zeros((m, n))
+    if result.status != 0:
+        return np.inf, X, np.full(n, np.nan)
+    X[open_] = result.x[: k * n].reshape(k, n)
+    return result.fun, X, -result.ineqlin.marginals[:n]
+
+
+def _continuous_knapsacks(
+    v: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Most profitable flows of every facility when customer ``j`` pays ``v[j]``.
+
+    Every facility fills its capacity with the customers of largest savings
+    ``v[j] - c[i, j]``, taking up to ``b[j]`` of each one.
+
+    Returns
+    -------
+    g : np.ndarray
+        Savings of every facility, shape (m,).
+    X : np.ndarray
+        Flows of every facility, shape (m, n).
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    savings = np.maximum(v[None, :] - c, 0.0)
+    order = np.argsort(-savings, axis=1)
+    s = np.take_along_axis(savings, order, axis=1)
+    d = b[order]
+    # capacity used by the customers ranked before every position
+    before = np.cumsum(d, axis=1) - d
+    fits = np.clip(a[:, None] - before, 0.0, d) * (s > 0)
+    X = np.zeros_like(savings)
+    np.put_along_axis(X, order, fits, axis=1)
+    return (fits * s).sum(axis=1), X
+
+
+def benders_cut(
+    v: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray
+) -> tuple[float, np.ndarray]:
+    """Optimality cut of the transport cost from the demand duals ``v``.
+
+    Any ``v >= 0`` gives a valid cut. With the linking ``X[i, j] <= b[j] Y[i]``
+    implied by every binary ``Y``, each facility gets its own capacity
+    multiplier chosen to give the strongest coefficient, which has the closed
+    form
+
+        g[i] = min_{w >= 0} a[i] w + sum_j b[j] max(0, v[j] - c[i, j] - w)
+
+    so that ``cost(Y) >= sum_j b[j] v[j] - sum_i g[i] Y[i]`` for every ``Y``.
+    By duality ``g[i]`` is the savings of the continuous knapsack of facility
+    ``i`` at prices ``v``.
+
+    Parameters
+    ----------
+    v : np.ndarray
+        Duals of the demand constraints, shape (n,).
+    a : np.ndarray
+        Capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+
+    Returns
+    -------
+    constant : float
+        ``sum_j b[j] v[j]``.
+    g : np.ndarray
+        Savings of opening every facility, shape (m,).
+    """
+    g, _ = _continuous_knapsacks(v, a, b, c)
+    return float(b @ v), g
+
+
+def lagrangian_bound(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    iterations: int = 300,
+    upper_bound: float | None = None,
+    keep: int = 10,
+    prices: np.ndarray | None = None,
+) -> tuple[float, np.ndarray, np.ndarray, list[np.ndarray]]:
+    """Lagrangian bound of the CFLP relaxing the demand constraints.
+
+    For prices ``v`` every facility is opened if the savings of its
+    continuous knapsack pay its fixed cost, which gives
+
+        L(v) = sum_j b[j] v[j] + sum_i min(0, f[i] - g[i](v))
+
+    a lower bound equal to the LP relaxation with ``X[i, j] <= b[j] Y[i]``. It
+    is maximized with subgradient steps (Polyak step towards
+    ``upper_bound``), every step costs one sort of ``c``.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    iterations : int
+        Subgradient steps.
+    upper_bound : float, optional
+        Cost of a known solution, by default the cost of opening all.
+    keep : int
+        Number of improving prices returned, spread over the iterations.
+    prices : np.ndarray, optional
+        Starting prices (e.g. those of a similar demand), shape (n,).
+
+    Returns
+    -------
+    bound : float
+        Best Lagrangian bound.
+    v : np.ndarray
+        Prices of the best bound, shape (n,).
+    Y : np.ndarray
+        Facilities open at the best bound, shape (m,).
+    history : list[np.ndarray]
+        Improving prices found along the way (the last is ``v``).
+    """
+    f, a, b, c = (np.asarray(x, dtype=float) for x in (f, a, b, c))
+    if upper_bound is None:
+        upper_bound = evaluate_plan(np.ones(len(f)), f, a, b, c).objective
+    # every customer pays the cheapest cost of serving it from a full facility
+    v = (c + (f / a)[:, None]).min(axis=0) if prices is None else np.asarray(prices)
+    best, best_v, best_Y, history = -np.inf, v, np.ones(len(f)), []
+    scale, stalled = 2.0, 0
+    for k in range(iterations):
+        g, X = _continuous_knapsacks(v, a, b, c)
+        open_ = g > f
+        value = b @ v + np.minimum(0, f - g).sum()
+        if value > best:
+            best, best_v, best_Y, stalled = value, v, open_.astype(float), 0
+            if not history or k >= len(history) * iterations / keep:
+                history.append(v)
+        else:
+            stalled += 1
+            if stalled >= 20:
+                scale, stalled = scale / 2, 0
+        subgradient = b - X[open_].sum(axis=0)
+        norm = subgradient @ subgradient
+        if norm == 0:
+            break
+        v = np.maximum(0.0, v + scale * (upper_bound - value) / norm * subgradient)
+    if history[-1] is not best_v:
+        history.append(best_v)
+    return best, best_v, best_Y, history
+
+
+def evaluate_plan(
+    Y: np.ndarray,
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    penalty: float | None = None,
+) -> CFLPSolution:
+    """Cost of a fixed opening plan with its optimal flows."""
+    tiempo_inicial = time.time()
+    Y = (np.asarray(Y) > 0.5).astype(float)
+    cost, X, _ = transportation(Y, a, b, c, penalty)
+    objective = float(np.asarray(f) @ Y) + cost
+    return CFLPSolution(
+        objective,
+        Y,
+        X,
+        "Optimal" if np.isfinite(cost) else "Infeasible",
+        -np.inf,
+        time.time() - tiempo_inicial,
+    )
+
+
+def nearest_open(
+    Y: np.ndarray,
+    c: np.ndarray,
+    order: np.ndarray | None = None,
+    few_open: int = 32,
+    dense_share: float = 0.05,
+) -> np.ndarray:
+    """Nearest open facility of every customer under many plans at once.
+
+    Plans that open at most ``few_open`` facilities take the masked argmin
+    over their rows of ``c``. For the rest the argmin is taken rank by rank
+    over the facilities sorted by cost for every customer: at rank ``r`` the
+    customers whose ``r``-th cheapest facility is open leave the search, so
+    with ``p`` of ``m`` facilities open a customer is assigned after about
+    ``m / p`` ranks instead of the ``m`` a dense argmin reads. The first
+    ranks run over whole (customer, plan) matrices, once few customers are
+    left only those are followed.
+
+    Parameters
+    ----------
+    Y : np.ndarray
+        Open facilities of every plan, boolean, shape (K, m).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    order : np.ndarray, optional
+        ``np.argsort(c, axis=0)``, computed if not given.
+    few_open : int
+        Open facilities up to which a plan takes the masked argmin.
+    dense_share : float
+        Share of pending customers below which only those are followed.
+
+    Returns
+    -------
+    np.ndarray
+        Facility of every customer under every plan, ``-1`` if the plan opens
+        none, shape (K, n).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=bool))
+    m, n = c.shape
+    if order is None:
+        order = np.argsort(c, axis=0).astype(np.int16 if m < 2**15 else np.int32)
+    assigned = np.full((len(Y), n), -1, dtype=order.dtype)
+    few = Y.sum(axis=1) <= few_open
+    for k in np.flatnonzero(few):
+        open_ = np.flatnonzero(Y[k])
+        if len(open_):
+            assigned[k] = open_[c[open_].argmin(axis=0)]
+    many = np.flatnonzero(~few)
+    if len(many) == 0:
+        return assigned
+    # plans as columns, so that a rank gathers whole rows of Y
+    Y = np.ascontiguousarray(Y[many].T)
+    pending = np.ones((n, len(many)), dtype=bool)
+    # rank of the nearest open facility, counted as the ranks found closed
+    rank = np.zeros(pending.shape, dtype=order.dtype)
+    r = 0
+    while r < m and (r % 8 or np.count_nonzero(pending) > dense_share * pending.size):
+        np.greater(pending, Y[order[r]], out=pending)
+        rank += pending
+        r += 1
+    customers, plans = np.nonzero(pending)
+    while r < m and len(customers):
+        hit = Y[order[r, customers], plans]
+        rank[customers[hit], plans[hit]] = r
+        customers, plans = customers[~hit], plans[~hit]
+        r += 1
+    assigned[many] = order[rank, np.arange(n)[:, None]].T
+    return assigned
+
+
+def evaluate_plans(
+    Y: np.ndarray,
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    chunk_size: int = 256,
+    order: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Score many opening plans when every customer uses its nearest open facility.
+
+    Capacities are not enforced by the assignment (the uncapacitated rule),
+    they are reported as the violation of every plan instead.
+
+    Parameters
+    ----------
+    Y : np.ndarray
+        Open facilities of every plan, boolean, shape (K, m).
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    chunk_size : int
+        Plans assigned at a time, memory grows with ``chunk_size x n``.
+    order : np.ndarray, optional
+        ``np.argsort(c, axis=0)``, computed if not given. Pass it when the
+        same instance is scored many times.
+
+    Returns
+    -------
+    fixed : np.ndarray
+        Fixed cost of every plan, shape (K,).
+    assignment : np.ndarray
+        Transport cost of every plan, ``inf`` if it opens nothing, shape (K,).
+    violation : np.ndarray
+        Demand assigned over the capacity of the open facilities, summed
+        over the facilities, shape (K,).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=bool))
+    f, a, b, c = (np.asarray(x, dtype=float) for x in (f, a, b, c))
+    m, n = c.shape
+    if order is None:
+        order = np.argsort(c, axis=0).astype(np.int16 if m < 2**15 else np.int32)
+    K = len(Y)
+    assignment, violation = np.empty(K), np.empty(K)
+    c_t = np.ascontiguousarray(c.T)
+    for start in range(0, K, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        # customers as rows, the layout nearest_open works in
+        assigned = nearest_open(Y[chunk], c, order).T
+        served = assigned >= 0
+        facility = np.where(served, assigned, 0)
+        cost = np.where(served, np.take_along_axis(c_t, facility, axis=1), np.inf)
+        assignment[chunk] = b @ cost
+        # demand of every facility, plans stacked as rows of length m
+        rows = np.arange(assigned.shape[1]) * m + facility
+        load = np.bincount(
+            rows[served], weights=np.broadcast_to(b[:, None], assigned.shape)[served],
+            minlength=assigned.shape[1] * m,
+        ).reshape(-1, m)
+        violation[chunk] = np.maximum(load - a, 0).sum(axis=1)
+    return Y @ f, assignment, violation
+
+
+def _cover(Y, f, a, cover):
+    """Open the cheapest facilities per unit of capacity until ``cover`` fits."""
+    Y = (np.asarray(Y) > 0.5).astype(float)
+    missing = cover - a @ Y
+    if missing > 0:
+        closed = np.flatnonzero(Y == 0)
+        closed = closed[np.argsort(f[closed] / a[closed])]
+        needed = np.searchsorted(np.cumsum(a[closed]), missing) + 1
+        Y[closed[:needed]] = 1
+    return Y
+
+
+# Instance available to every process of the rounding pool, sent only once
+_rounding_data = {}
+
+
+def _init_rounding(f, a, b, c, threads):
+    """Limit the threads of a pool process and store the instance."""
+    limit_threads(threads)
+    _rounding_data.update(f=f, a=a, b=b, c=c)
+
+
+def _repair(Y, data=None):
+    """Cost of a rounded plan once it covers the demand and flows are optimal.
+
+    Missing capacity is opened by ``_cover`` and the facilities left without
+    flow by the transportation problem are closed.
+    """
+    data = data or _rounding_data
+    f, a, b, c = data["f"], data["a"], data["b"], data["c"]
+    Y = _cover(Y, f, a, b.sum())
+    cost, X, _ = transportation(Y, a, b, c)
+    Y = Y * (X.sum(axis=1) > 1e-9)
+    return f @ Y + cost, Y, X
+
+
+def solve_cflp_fast(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    trials: int = 16,
+    n_workers: int | None = None,
+    seed: int = 0,
+    time_limit: float = 60,
+) -> CFLPSolution:
+    """Good CFLP solution in seconds by rounding the LP relaxation.
+
+    The strong LP relaxation is solved with HiGHS and its ``Y`` rounded both
+    deterministically (opening ``Y >= t`` for a few thresholds) and at random
+    (opening ``i`` with probability ``Y[i]``). Every rounded plan is repaired
+    by ``_repair``, in parallel, and the best one is returned with the LP
+    bound, so ``gap`` is known before any exact solve starts.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    trials : int
+        Randomized roundings.
+    n_workers : int, optional
+        Processes that repair the plans, by default one per CPU.
+    seed : int
+        Seed of the randomized roundings.
+    time_limit : float
+        Seconds given to HiGHS for the LP relaxation.
+
+    Returns
+    -------
+    CFLPSolution
+        With the LP relaxation as ``bound``.
+    """
+    tiempo_inicial = time.time()
+    f, a, b, c = (np.asarray(v, dtype=float) for v in (f, a, b, c))
+    relaxation = solve_cflp(f, a, b, c, time_limit, relax=True, strong=True)
+    if relaxation.X is None:
+        return relaxation
+    Y = relaxation.Y
+    rng = np.random.default_rng(seed)
+    plans = [Y >= t for t in (1 - 1e-6, 0.5, 1e-6)]
+    plans += list(rng.random((trials, len(f))) < Y)
+    # the same plan is repaired only once
+    plans = list({plan.tobytes(): plan.astype(float) for plan in plans}.values())
+    n_workers = min(n_workers or os.cpu_count() or 1, len(plans))
+    if n_workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_rounding,
+            initargs=(f, a, b, c, max(1, (os.cpu_count() or 1) // n_workers)),
+        ) as executor:
+            results = list(executor.map(_repair, plans))
+    else:
+        data = {"f": f, "a": a, "b": b, "c": c}
+        results = [_repair(plan, data) for plan in plans]
+    objective, Y, X = min(results, key=lambda result: result[0])
+    return CFLPSolution(
+        objective,
+        Y,
+        X,
+        f"Rounded LP relaxation, best of {len(plans)} plans",
+        relaxation.objective,
+        time.time() - tiempo_inicial,
+    )
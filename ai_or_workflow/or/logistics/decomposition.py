@@ -0,0 +1,321 @@
+"""Hierarchical Decomposition Module.
+
+The municipios are split in two again and again (``balanced_clustering``
+with two clusters, so both halves have enough capacity for their demand)
+until the estimated solve time of every region is under a budget. The
+estimate is a power law in the size of the region, fitted on the times of
+past solves.
+
+The leaves are solved in a pool of processes, the longest first, and merged
+bottom-up: every region keeps the facilities opened by its children and
+re-optimizes the flows over all its municipios, so a municipio can be served
+across the border of its leaf and the cost only goes down on the way up.
+"""
+
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from ...ai.clustering import balanced_clustering
+from ...parallel import limit_threads
+from .cflp import _cover, solve_cflp, transportation
+
+
+@dataclass
+class RuntimeModel:
+    """Estimate of the seconds to solve a CFLP over ``n`` municipios.
+
+    ``seconds = coefficient * n ** exponent``. The default is only a rough
+    guess, use ``fit`` with the times of past solves.
+    """
+
+    coefficient: float = 1e-4
+    exponent: float = 2.0
+
+    def __call__(self, n):
+        return self.coefficient * np.asarray(n, dtype=float) ** self.exponent
+
+    @classmethod
+    def fit(cls, sizes: np.ndarray, seconds: np.ndarray) -> "RuntimeModel":
+        """Least squares fit of the power law in log-log scale.
+
+        Parameters
+        ----------
+        sizes : np.ndarray
+            Municipios of every past solve.
+        seconds : np.ndarray
+            Seconds of every past solve.
+
+        Returns
+        -------
+        RuntimeModel
+            The default model if there are not two different sizes.
+        """
+        sizes, seconds = np.asarray(sizes, dtype=float), np.asarray(seconds, dtype=float)
+        valid = (sizes > 0) & (seconds > 0)
+        if len(np.unique(sizes[valid])) < 2:
+            return cls()
+        exponent, intercept = np.polyfit(np.log(sizes[valid]), np.log(seconds[valid]), 1)
+        return cls(float(np.exp(intercept)), float(exponent))
+
+
+@dataclass
+class Region:
+    """Node of the decomposition tree.
+
+    Attributes
+    ----------
+    indices : np.ndarray
+        Municipios of the region, indices into the whole instance.
+    estimated_runtime : float
+        Seconds the ``RuntimeModel`` expects to solve the region.
+    children : list[Region]
+        The two halves, empty for a leaf.
+    """
+
+    indices: np.ndarray
+    estimated_runtime: float
+    children: list["Region"] = field(default_factory=list)
+
+    def leaves(self) -> list["Region"]:
+        """Leaves under the region, from left to right."""
+        if not self.children:
+            return [self]
+        return [leaf for child in self.children for leaf in child.leaves()]
+
+    @property
+    def depth(self) -> int:
+        """Levels of the tree under the region, zero for a leaf."""
+        return 1 + max(child.depth for child in self.children) if self.children else 0
+
+
+def bisect_regions(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    b: np.ndarray,
+    a: np.ndarray,
+    budget: float,
+    model: RuntimeModel | None = None,
+    min_size: int = 2,
+    indices: np.ndarray | None = None,
+) -> Region:
+    """Split the municipios in two until every region fits the budget.
+
+    Parameters
+    ----------
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    b : np.ndarray
+        Demands, shape (n,).
+    a : np.ndarray
+        Capacities, shape (n,).
+    budget : float
+        Most estimated seconds of a leaf.
+    model : RuntimeModel, optional
+        Estimate of the solve time, the default ``RuntimeModel`` if not given.
+    min_size : int
+        Fewest municipios of a leaf.
+    indices : np.ndarray, optional
+        Municipios to split, all of them by default.
+
+    Returns
+    -------
+    Region
+        Root of the tree. A region that cannot be split in two halves with
+        enough capacity is a leaf even if over the budget.
+    """
+    model = model or RuntimeModel()
+    indices = np.arange(len(lat)) if indices is None else indices
+    region = Region(indices, float(model(len(indices))))
+    if region.estimated_runtime <= budget or len(indices) < 2 * min_size:
+        return region
+    labels = balanced_clustering(
+        lat[indices], lon[indices], 2, demand=b[indices], capacity=a[indices]
+    )
+    if (labels < 0).any():
+        return region
+    region.children = [
+        bisect_regions(lat, lon, b, a, budget, model, min_size, indices[labels == k])
+        for k in range(2)
+    ]
+    return region
+
+
+def schedule_leaves(runtimes: np.ndarray, n_workers: int) -> tuple[np.ndarray, np.ndarray, float]:
+    """Longest processing time first schedule of the leaves.
+
+    Parameters
+    ----------
+    runtimes : np.ndarray
+        Estimated seconds of every leaf.
+    n_workers : int
+        Processes available.
+
+    Returns
+    -------
+    order : np.ndarray
+        Leaves from the longest to the shortest, the order to submit them.
+    workers : np.ndarray
+        Worker every leaf goes to when it takes the estimated time.
+    makespan : float
+        Estimated seconds until the last leaf finishes.
+    """
+    runtimes = np.asarray(runtimes, dtype=float)
+    order = np.argsort(-runtimes, kind="stable")
+    workers = np.zeros(len(runtimes), dtype=int)
+    loads = [(0.0, worker) for worker in range(n_workers)]
+    for leaf in order:
+        load, worker = heapq.heappop(loads)
+        workers[leaf] = worker
+        heapq.heappush(loads, (load + runtimes[leaf], worker))
+    return order, workers, max(load for load, _ in loads)
+
+
+@dataclass
+class DecomposedCFLPSolution:
+    """Solution of a CFLP solved by hierarchical decomposition.
+
+    Attributes
+    ----------
+    objective : float
+        Cost of the merged solution.
+    Y : np.ndarray
+        Opening decision, shape (m,).
+    X : np.ndarray
+        Flows re-optimized at the root, shape (m, n).
+    root : Region
+        Decomposition tree.
+    leaf_sizes, leaf_runtimes : np.ndarray
+        Municipios and seconds of every leaf solve, to refit the
+        ``RuntimeModel``.
+    statuses : list[str]
+        Status of every leaf solve.
+    makespan : float
+        Estimated seconds of the schedule of the leaves.
+    runtime : float
+        Seconds spent.
+    """
+
+    objective: float
+    Y: np.ndarray
+    X: np.ndarray
+    root: Region
+    leaf_sizes: np.ndarray
+    leaf_runtimes: np.ndarray
+    statuses: list[str]
+    makespan: float
+    runtime: float
+
+
+def _solve_leaf(f, a, b, c, time_limit, mip_rel_gap):
+    """Solve a leaf, opening the cheapest capacity if no solution is found."""
+    solution = solve_cflp(f, a, b, c, time_limit, mip_rel_gap)
+    if solution.X is not None:
+        return solution.Y, solution.X, solution.status, solution.runtime
+    Y = _cover(np.zeros(len(f)), f, a, b.sum())
+    _, X, _ = transportation(Y, a, b, c)
+    return Y, X, solution.status, solution.runtime
+
+
+def _merge(region, Y, X, a, b, c):
+    """Re-optimize the flows of every region over its children's facilities."""
+    if not region.children:
+        return
+    for child in region.children:
+        _merge(child, Y, X, a, b, c)
+    block = np.ix_(region.indices, region.indices)
+    cost, flows, _ = transportation(Y[region.indices], a[region.indices], b[region.indices], c[block])
+    if cost <= (c[block] * X[block]).sum():
+        X[block] = flows
+
+
+def solve_decomposed_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    budget: float = 300,
+    model: RuntimeModel | None = None,
+    time_limit: float = 3600,
+    mip_rel_gap: float = 1e-4,
+    min_size: int = 2,
+    n_workers: int | None = None,
+) -> DecomposedCFLPSolution:
+    """Solve a CFLP whose candidates are its municipios by decomposition.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities of the municipios, shape (n,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs between the municipios, shape (n, n).
+    lat, lon : np.ndarray
+        Coordinates in degrees, shape (n,).
+    budget : float
+        Most estimated seconds of a leaf, as in ``bisect_regions``.
+    model : RuntimeModel, optional
+        Estimate of the solve time.
+    time_limit : float
+        Seconds given to HiGHS for every leaf, whatever its estimate.
+    mip_rel_gap : float
+        Relative gap at which every leaf stops.
+    min_size : int
+        Fewest municipios of a leaf.
+    n_workers : int, optional
+        Processes that solve the leaves, by default one per CPU.
+
+    Returns
+    -------
+    DecomposedCFLPSolution
+    """
+    start = time.time()
+    f, a, b, c = (np.asarray(v, dtype=float) for v in (f, a, b, c))
+    root = bisect_regions(np.asarray(lat), np.asarray(lon), b, a, budget, model, min_size)
+    leaves = root.leaves()
+    n_workers = min(n_workers or os.cpu_count() or 1, len(leaves))
+    order, _, makespan = schedule_leaves([leaf.estimated_runtime for leaf in leaves], n_workers)
+    tasks = [
+        (f[leaf.indices], a[leaf.indices], b[leaf.indices], c[np.ix_(leaf.indices, leaf.indices)],
+         time_limit, mip_rel_gap)
+        for leaf in leaves
+    ]
+    results = [None] * len(leaves)
+    if n_workers > 1:
+        # the longest leaves first, so the last ones to finish are short
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=limit_threads,
+            initargs=(max(1, (os.cpu_count() or 1) // n_workers),),
+        ) as executor:
+            futures = {k: executor.submit(_solve_leaf, *tasks[k]) for k in order}
+            for k, future in futures.items():
+                results[k] = future.result()
+    else:
+        for k in order:
+            results[k] = _solve_leaf(*tasks[k])
+
+    n = len(b)
+    Y, X = np.zeros(n), np.zeros((n, n))
+    for leaf, (Y_leaf, X_leaf, _, _) in zip(leaves, results):
+        Y[leaf.indices] = Y_leaf
+        X[np.ix_(leaf.indices, leaf.indices)] = X_leaf
+    _merge(root, Y, X, a, b, c)
+    return DecomposedCFLPSolution(
+        f @ Y + (c * X).sum(),
+        Y,
+        X,
+        root,
+        np.array([len(leaf.indices) for leaf in leaves]),
+        np.array([result[3] for result in results]),
+        [result[2] for result in results],
+        makespan,
+        time.time() - start,
+    )
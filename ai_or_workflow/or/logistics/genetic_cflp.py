@@ -0,0 +1,279 @@
+"""Genetic Algorithm for the CFLP Module.
+
+Island model over the opening bitstrings ``Y``: every island evolves its own
+population in a separate process and, every ``migration_interval``
+generations, sends copies of its best plans to the next island of a ring.
+
+The fitness of a whole population is one call to ``cflp.evaluate_plans``:
+every customer goes to its nearest open facility and the demand over the
+capacity of a facility costs ``penalty`` per unit, the price of sending it
+elsewhere. Plans without enough capacity for the demand are repaired first
+by ``cflp._cover``. The seeds are priced with the transportation problem
+before the search and the best plans after it, so the returned objective is
+that of a capacity feasible solution and never worse than the seeds.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ...parallel import limit_threads
+from .cflp import CFLPSolution, _cover, evaluate_plan, evaluate_plans
+
+# Instance available to every island process, sent only once
+_island_data = {}
+
+
+def _instance(f, a, b, c, penalty):
+    """Instance with the costs sorted once for ``evaluate_plans``."""
+    dtype = np.int16 if len(f) < 2**15 else np.int32
+    order = np.argsort(c, axis=0).astype(dtype)
+    return {"f": f, "a": a, "b": b, "c": c, "order": order, "penalty": penalty}
+
+
+def _init_island(f, a, b, c, penalty, threads):
+    """Limit the threads of an island process and store the instance."""
+    limit_threads(threads)
+    _island_data.update(_instance(f, a, b, c, penalty))
+
+
+def _fitness(population, data):
+    """Repair in place the plans without enough capacity and score them all."""
+    f, a, b = data["f"], data["a"], data["b"]
+    for k in np.flatnonzero(population @ a < b.sum()):
+        population[k] = _cover(population[k], f, a, b.sum()) > 0.5
+    fixed, assignment, violation = evaluate_plans(
+        population, f, a, b, data["c"], order=data["order"]
+    )
+    return fixed + assignment + data["penalty"] * violation
+
+
+def _evolve(
+    population,
+    fitness,
+    generations,
+    seed,
+    elite=2,
+    tournament=3,
+    data=None,
+    deadline=np.inf,
+):
+    """Run up to ``generations`` of an island, stopping at ``deadline``.
+
+    Parents are picked by tournament, children take every bit from either
+    parent (uniform crossover) and flip each bit with probability ``1 / m``.
+    The ``elite`` best plans survive unchanged. ``deadline`` is a
+    ``time.time()`` value checked between generations; the generations run
+    are returned along with the population.
+    """
+    data = data or _island_data
+    rng = np.random.default_rng(seed)
+    P, m = population.shape
+    done = 0
+    while done < generations and time.time() < deadline:
+        done += 1
+        ranking = np.argsort(fitness)
+        contenders = rng.integers(P, size=(2, P - elite, tournament))
+        # the contender with the lowest fitness wins every tournament
+        winners = np.take_along_axis(
+            contenders, fitness[contenders].argmin(axis=2)[..., None], axis=2
+        )[..., 0]
+        mothers, fathers = population[winners[0]], population[winners[1]]
+        children = np.where(rng.random((P - elite, m)) < 0.5, mothers, fathers)
+        children ^= rng.random(children.shape) < 1 / m
+        children_fitness = _fitness(children, data)
+        population = np.vstack([population[ranking[:elite]], children])
+        fitness = np.concatenate([fitness[ranking[:elite]], children_fitness])
+    return population, fitness, done
+
+
+def _initial_population(seeds, size, m, rng):
+    """Seeds, mutations of the seeds and random plans of the same density."""
+    seeds = [np.asarray(Y) > 0.5 for Y in seeds]
+    density = np.mean([Y.mean() for Y in seeds]) if seeds else 0.5
+    population = list(seeds[:size])
+    while seeds and len(population) < size // 2:
+        parent = seeds[rng.integers(len(seeds))]
+        population.append(parent ^ (rng.random(m) < 5 / m))
+    population += list(rng.random((size - len(population), m)) < density)
+    return np.array(population, dtype=bool)
+
+
+def solve_cflp_genetic(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    time_limit: float = 300,
+    seeds: list[np.ndarray] | None = None,
+    n_islands: int = 4,
+    population_size: int = 100,
+    migration_interval: int = 20,
+    migrants: int = 2,
+    penalty: float | None = None,
+    finalists: int = 10,
+    n_workers: int | None = None,
+    random_seed: int = 42,
+    disp: bool = False,
+) -> CFLPSolution:
+    """Solve a CFLP heuristically with an island-model genetic algorithm.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    time_limit : float
+        Seconds for the whole solve. The islands check it between
+        generations, and the search stops early enough to price the
+        finalists, keeping at most half of the time for them; fewer
+        finalists are priced when they do not fit. The seeds are always
+        priced, so a long list of seeds can exceed it.
+    seeds : list[np.ndarray], optional
+        Plans to start from (e.g. clustered solutions), shared by the islands.
+    n_islands : int
+        Populations evolved apart.
+    population_size : int
+        Plans per island.
+    migration_interval : int
+        Generations between migrations.
+    migrants : int
+        Best plans of every island copied over the worst of the next one.
+    penalty : float, optional
+        Cost of every unit over capacity, by default the median of ``c``.
+    finalists : int
+        Largest number of best distinct plans priced with the
+        transportation problem at the end. The seeds are priced before the
+        search.
+    n_workers : int, optional
+        Processes that evolve the islands, by default one per CPU.
+    random_seed : int
+        Seed of the search.
+    disp : bool
+        Print the best fitness at every migration.
+
+    Returns
+    -------
+    CFLPSolution
+        The best plan with its optimal flows, without a lower bound.
+    """
+    start = time.time()
+    f, a, b, c = (np.asarray(x, dtype=float) for x in (f, a, b, c))
+    m = len(f)
+    penalty = float(np.median(c)) if penalty is None else penalty
+    rng = np.random.default_rng(random_seed)
+    data = _instance(f, a, b, c, penalty)
+    islands = []
+    for _ in range(n_islands):
+        population = _initial_population(seeds or [], population_size, m, rng)
+        islands.append([population, _fitness(population, data)])
+
+    # the seeds (or the best initial plan) are priced first, which also
+    # measures how long the pricing of every finalist takes
+    priced = {}
+    population, fitness = islands[0]
+    plans = [np.asarray(Y) > 0.5 for Y in seeds or []]
+    for Y in plans or [population[fitness.argmin()]]:
+        priced.setdefault(Y.tobytes(), Y)
+    pricing_start = time.time()
+    solutions = [evaluate_plan(Y, f, a, b, c) for Y in priced.values()]
+    pricing_time = (time.time() - pricing_start) / len(priced)
+    deadline = start + time_limit
+    # at most half of the remaining time is kept for the finalists
+    reserve = min(finalists * pricing_time, (deadline - time.time()) / 2)
+    search_deadline = deadline - reserve
+
+    n_workers = min(n_workers or os.cpu_count() or 1, n_islands)
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_island,
+            initargs=(
+                f, a, b, c, penalty, max(1, (os.cpu_count() or 1) // n_workers)
+            ),
+        )
+    generations = 0
+    try:
+        while time.time() < search_deadline:
+            rng_seeds = rng.integers(2**32, size=n_islands)
+            if executor:
+                futures = [
+                    executor.submit(
+                        _evolve,
+                        population,
+                        fitness,
+                        migration_interval,
+                        seed,
+                        deadline=search_deadline,
+                    )
+                    for (population, fitness), seed in zip(islands, rng_seeds)
+                ]
+                evolved = [future.result() for future in futures]
+            else:
+                evolved = [
+                    _evolve(
+                        population,
+                        fitness,
+                        migration_interval,
+                        seed,
+                        data=data,
+                        deadline=search_deadline,
+                    )
+                    for (population, fitness), seed in zip(islands, rng_seeds)
+                ]
+            islands = [
+                [population, fitness] for population, fitness, _ in evolved
+            ]
+            generations += max(done for _, _, done in evolved)
+            # ring migration: the best of every island replace the worst of the
+            # next one
+            best = [np.argsort(fitness)[:migrants] for _, fitness in islands]
+            outgoing = [
+                (population[k].copy(), fitness[k].copy())
+                for (population, fitness), k in zip(islands, best)
+            ]
+            for i, (population, fitness) in enumerate(islands):
+                worst = np.argsort(fitness)[-migrants:]
+                population[worst], fitness[worst] = outgoing[i - 1]
+            if disp:
+                print(
+                    f"{generations:>5} generations: best fitness "
+                    f"{min(fitness.min() for _, fitness in islands):,.0f}, "
+                    f"{time.time() - start:.0f} s"
+                )
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # the fitness only approximates the capacitated cost, so the best distinct
+    # plans of all islands are priced with their optimal flows while time is
+    # left, the best one at least
+    population = np.vstack([population for population, _ in islands])
+    fitness = np.concatenate([fitness for _, fitness in islands])
+    candidates = 0
+    for k in np.argsort(fitness):
+        if candidates == finalists:
+            break
+        if candidates and time.time() + pricing_time > deadline:
+            break
+        key = population[k].tobytes()
+        if key in priced:
+            continue
+        priced[key] = population[k]
+        solutions.append(evaluate_plan(population[k], f, a, b, c))
+        candidates += 1
+    solution = min(solutions, key=lambda solution: solution.objective)
+    return CFLPSolution(
+        solution.objective,
+        solution.Y,
+        solution.X,
+        f"Genetic algorithm, {generations} generations",
+        -np.inf,
+        time.time() - start,
+    )
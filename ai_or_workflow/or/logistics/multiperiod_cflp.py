@@ -0,0 +1,325 @@
+"""Multi-period CFLP Module.
+
+The demand ``B[t]`` changes over the periods ``t = 0, ..., T - 1`` and a
+facility, once opened, stays open:
+
+    min  sum_t d[t] (sum_i f[i] (Y[t, i] - Y[t - 1, i]) + Q(Y[t], B[t]))
+    s.t. Y[t] >= Y[t - 1]
+
+where ``d[t]`` is the discount factor of period ``t`` and ``Q`` the
+transportation problem of ``cflp.transportation``. The full model has ``T``
+copies of the flows, so it is solved with a rolling horizon: a window of a
+few periods is optimized, the decisions of its first periods are fixed and
+the window moves forward. Every window is solved as in
+``stochastic_cflp``, with a master over the openings of the window seeded
+with the cuts of its Lagrangian bound and one transportation LP per period,
+and starts from the work of the previous one: the cuts of the periods they
+share, their Lagrangian prices and its plan.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from .cflp import _continuous_knapsacks, _cover, benders_cut
+from .stochastic_cflp import _init_worker, _scenario_cut
+
+
+@dataclass
+class MultiPeriodCFLPSolution:
+    """Solution of a multi-period CFLP.
+
+    Attributes
+    ----------
+    objective : float
+        Discounted opening plus transport cost.
+    Y : np.ndarray
+        Open facilities in every period, shape (T, m).
+    transport : np.ndarray
+        Transport cost of every period (not discounted), shape (T,).
+    window_runtimes : list[float]
+        Seconds spent in every window.
+    runtime : float
+        Seconds spent solving.
+    """
+
+    objective: float
+    Y: np.ndarray
+    transport: np.ndarray
+    window_runtimes: list[float]
+    runtime: float
+
+    @property
+    def opening(self) -> np.ndarray:
+        """Period in which every facility opens, -1 if it never does."""
+        return np.where(self.Y.any(axis=0), self.Y.argmax(axis=0), -1)
+
+
+def _window_master(f, a, covers, weights, previous, cuts, time_limit, mip_rel_gap):
+    """Solve the master over ``[Y[0], ..., Y[W - 1], theta]`` of a window.
+
+    Opening ``i`` in period ``t`` of the window costs ``d[t] f[i]``, written
+    over the cumulative ``Y`` as the coefficient ``(d[t] - d[t + 1]) f[i]``.
+    """
+    m, W = len(f), len(weights)
+    scale = np.abs(f).max() or 1.0
+    following = np.append(weights[1:], 0)
+    objective = np.concatenate([np.outer(weights - following, f).ravel() / scale, weights])
+    rows, lower = [], []
+    # theta[t] + sum_i g[i] Y[t, i] >= constant
+    for t, period_cuts in enumerate(cuts):
+        if not period_cuts:
+            continue
+        g = np.array([g for _, g in period_cuts]) / scale
+        g[np.abs(g) < 1e-9 * np.abs(g).max(initial=1)] = 0
+        block = np.zeros((len(period_cuts), W))
+        block[:, t] = 1
+        rows.append(
+            sparse.hstack(
+                [sparse.csr_matrix((len(g), t * m)), sparse.csr_matrix(g),
+                 sparse.csr_matrix((len(g), (W - t - 1) * m)), sparse.csr_matrix(block)]
+            )
+        )
+        lower.append(np.array([k for k, _ in period_cuts]) / scale)
+    # enough capacity in every period
+    rows.append(
+        sparse.hstack([sparse.kron(sparse.eye(W), a[None, :]), sparse.csr_matrix((W, W))])
+    )
+    lower.append(covers)
+    # open facilities stay open: Y[t] - Y[t - 1] >= 0
+    if W > 1:
+        difference = sparse.eye(W - 1, W, 1) - sparse.eye(W - 1, W)
+        rows.append(
+            sparse.hstack(
+                [sparse.kron(difference, sparse.eye(m)), sparse.csr_matrix(((W - 1) * m, W))]
+            )
+        )
+        lower.append(np.zeros((W - 1) * m))
+    result = milp(
+        objective,
+        constraints=LinearConstraint(sparse.vstack(rows, format="csr"), np.concatenate(lower), np.inf),
+        integrality=np.concatenate([np.ones(W * m), np.zeros(W)]),
+        bounds=Bounds(
+            np.concatenate([np.tile(previous, W), np.zeros(W)]),
+            np.concatenate([np.ones(W * m), np.full(W, np.inf)]),
+        ),
+        options={"time_limit": max(time_limit, 1), "mip_rel_gap": mip_rel_gap},
+    )
+    if result.x is None:
+        return None, -np.inf
+    bound = getattr(result, "mip_dual_bound", None)
+    bound = result.fun if bound is None else bound
+    # the openings before the window are paid already
+    return np.round(result.x[: W * m]).reshape(W, m), bound * scale - weights[0] * f @ previous
+
+
+def _monotone(plan, previous, f, a, covers):
+    """Make a plan feasible: open facilities stay open and cover the demand."""
+    plan = np.maximum.accumulate(np.maximum(plan, previous), axis=0)
+    for t, cover in enumerate(covers):
+        plan[t:] = np.maximum(plan[t:], _cover(plan[t], f, a, cover))
+    return plan
+
+
+def _window_lagrangian(f, a, B, c, weights, previous, prices, upper_bound, iterations, keep=10):
+    """Lagrangian bound of a window relaxing the demand of every period.
+
+    For prices ``v[t]`` every facility saves ``g[t, i]`` per period (its
+    continuous knapsack, as in ``cflp.lagrangian_bound``) and opens in the
+    period ``o`` that minimizes ``d[o] f[i] - sum_{t >= o} d[t] g[t, i]``, or
+    never if that is positive. Facilities opened before the window stay open
+    at no cost. The prices are improved with subgradient steps.
+
+    Returns the best bound, the plan at the best bound and improving prices
+    found along the way (the last are the best).
+    """
+    W = len(B)
+    before = previous > 0.5
+    v = np.array(prices, dtype=float)
+    best, best_Y, history = -np.inf, None, []
+    scale, stalled = 2.0, 0
+    for k in range(iterations):
+        knapsacks = [_continuous_knapsacks(v[t], a, B[t], c) for t in range(W)]
+        savings = np.array([g for g, _ in knapsacks]) * weights[:, None]
+        # savings from period o to the end of the window
+        savings = np.cumsum(savings[::-1], axis=0)[::-1]
+        opening = weights[:, None] * f - savings
+        period = opening.argmin(axis=0)
+        gain = np.minimum(opening.min(axis=0), 0)
+        gain[before] = -savings[0, before]
+        period[before] = 0
+        Y = (np.arange(W)[:, None] >= period) & ((gain < 0) | before)
+        value = weights @ (B * v).sum(axis=1) + gain.sum()
+        if value > best:
+            best, best_Y, stalled = value, Y.astype(float), 0
+            if not history or k >= len(history) * iterations / keep:
+                history.append(v)
+            best_v = v
+        else:
+            stalled += 1
+            if stalled >= 20:
+                scale, stalled = scale / 2, 0
+        flows = np.array([X[Y[t]].sum(axis=0) for t, (_, X) in enumerate(knapsacks)])
+        subgradient = weights[:, None] * (B - flows)
+        norm = (subgradient**2).sum()
+        if norm == 0:
+            break
+        v = np.maximum(0.0, v + scale * (upper_bound - value) / norm * subgradient)
+    if history[-1] is not best_v:
+        history.append(best_v)
+    return best, best_Y, history
+
+
+def solve_multiperiod_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    B: np.ndarray,
+    c: np.ndarray,
+    window: int = 3,
+    step: int = 1,
+    discount: float = 0.0,
+    time_limit: float = 300,
+    gap: float = 1e-3,
+    n_workers: int | None = None,
+    lagrangian_iterations: int = 1000,
+    disp: bool = True,
+) -> MultiPeriodCFLPSolution:
+    """Solve a multi-period CFLP with a rolling horizon.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Opening costs and capacities, shape (m,).
+    B : np.ndarray
+        Demands of every period, shape (T, n).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    window : int
+        Periods optimized together.
+    step : int
+        Periods fixed after every window.
+    discount : float
+        Discount rate per period of the costs.
+    time_limit : float
+        Seconds for every window, so the runtime grows linearly with ``T``.
+    gap : float
+        Relative gap at which a window stops.
+    n_workers : int, optional
+        Processes solving the transportation problems of the periods.
+    lagrangian_iterations : int
+        Subgradient steps of the Lagrangian bound of every window, started
+        from the prices of the window before.
+    disp : bool
+        Print the progress of every window.
+
+    Returns
+    -------
+    MultiPeriodCFLPSolution
+    """
+    start = time.time()
+    f, a, B, c = (np.asarray(v, dtype=float) for v in (f, a, B, c))
+    T, m = len(B), len(f)
+    weights = (1 + discount) ** -np.arange(T, dtype=float)
+    covers = B.sum(axis=1)
+    window, step = min(window, T), max(1, min(step, window))
+    n_workers = min(n_workers or os.cpu_count() or 1, window)
+
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(a, B, c, max(1, (os.cpu_count() or 1) // n_workers)),
+        )
+    data = None if executor else {"a": a, "B": B, "c": c}
+
+    # cuts of every period, valid in any window
+    cuts = [[] for _ in range(T)]
+    prices = {}
+    Y = np.zeros((T, m))
+    transport = np.zeros(T)
+    window_runtimes = []
+
+    def evaluate(periods, plan):
+        """Transport costs of the plan in every period, adding their cuts."""
+        if executor:
+            results = list(executor.map(_scenario_cut, periods, plan))
+        else:
+            results = [_scenario_cut(t, y, data) for t, y in zip(periods, plan)]
+        for t, (_, constant, g) in zip(periods, results):
+            cuts[t].append((constant, g))
+        return np.array([cost for cost, _, _ in results])
+
+    try:
+        first, previous, plan = 0, np.zeros(m), {}
+        while first < T:
+            window_start = time.time()
+            periods = list(range(first, min(first + window, T)))
+            w = weights[periods]
+
+            def cost(candidate, recourse):
+                openings = np.diff(candidate, axis=0, prepend=previous[None, :])
+                return w @ (openings @ f) + w @ recourse
+
+            # the plan of the previous window, its last period repeated in the
+            # new ones (everything open in the first window)
+            candidate = np.array([plan.get(t, plan[max(plan)] if plan else np.ones(m)) for t in periods])
+            candidate = _monotone(candidate, previous, f, a, covers[periods])
+            recourse = evaluate(periods, candidate)
+            best = (cost(candidate, recourse), candidate, recourse)
+            # Lagrangian of the window from the prices of the previous one
+            last = prices[max(prices)] if prices else (c + (f / a)[:, None]).min(axis=0)
+            bound, candidate, history = _window_lagrangian(
+                f, a, B[periods], c, w, previous,
+                [prices.get(t, last) for t in periods], best[0], lagrangian_iterations,
+            )
+            for k, t in enumerate(periods):
+                cuts[t].extend(benders_cut(v[k], a, B[t], c) for v in history)
+            prices.update(zip(periods, history[-1]))
+            candidate = _monotone(candidate, previous, f, a, covers[periods])
+            recourse = evaluate(periods, candidate)
+            if cost(candidate, recourse) < best[0]:
+                best = (cost(candidate, recourse), candidate, recourse)
+            visited = set()
+            while best[0] - bound > gap * abs(best[0]):
+                remaining = time_limit - (time.time() - window_start)
+                if remaining <= 0:
+                    break
+                candidate, new_bound = _window_master(
+                    f, a, covers[periods], w, previous, [cuts[t] for t in periods], remaining, gap / 2
+                )
+                if candidate is None:
+                    break
+                bound = max(bound, new_bound)
+                key = np.flatnonzero(candidate).tobytes()
+                if key in visited:
+                    break
+                visited.add(key)
+                recourse = evaluate(periods, candidate)
+                if cost(candidate, recourse) < best[0]:
+                    best = (cost(candidate, recourse), candidate, recourse)
+            _, candidate, recourse = best
+            fixed = periods[:step] if periods[-1] < T - 1 else periods
+            Y[fixed] = candidate[: len(fixed)]
+            transport[fixed] = recourse[: len(fixed)]
+            plan = dict(zip(periods, candidate))
+            previous = Y[fixed[-1]]
+            window_runtimes.append(time.time() - window_start)
+            if disp:
+                print(
+                    f"periods {periods[0]}-{periods[-1]}: best {best[0]:,.0f}, "
+                    f"lower bound {bound:,.0f}, {window_runtimes[-1]:.0f} s"
+                )
+            first = fixed[-1] + 1
+    finally:
+        if executor:
+            executor.shutdown()
+
+    openings = np.diff(Y, axis=0, prepend=np.zeros((1, m)))
+    objective = weights @ (openings @ f) + weights @ transport
+    return MultiPeriodCFLPSolution(objective, Y, transport, window_runtimes, time.time() - start)
@@ -0,0 +1,173 @@
+"""CFLP Presolve Module.
+
+Shrinks the set of candidate facilities before the CFLP reaches a solver:
+
+- Dominance: a candidate ``i`` is dropped when another candidate ``k`` costs
+  no more to open, has at least the same capacity and ships to every
+  customer at no more than ``c[i, j] + tolerance``. With zero tolerance a
+  solution that opens ``i`` and not ``k`` is never worse with ``k`` instead,
+  so only the plans that need both for their capacity can be lost. A
+  candidate is only dropped while the rest keep enough capacity for the
+  demand, so a feasible instance stays feasible.
+- Bound fixing: for the prices ``v`` of the Lagrangian bound ``L`` (equal to
+  the LP bound with ``X[i, j] <= b[j] Y[i]``) every facility adds
+  ``min(0, f[i] - g[i])`` independently. Forcing the other value of ``Y[i]``
+  raises the bound by ``|f[i] - g[i]|``, so if that passes the cost of a
+  known solution every optimal solution opens (or closes) ``i``.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cflp import _continuous_knapsacks, _cover, evaluate_plan, lagrangian_bound
+
+
+@dataclass
+class PresolveResult:
+    """Reduction of the candidate facilities of a CFLP.
+
+    Attributes
+    ----------
+    candidates : np.ndarray
+        Facilities kept, indices into the original instance.
+    fixed : dict[int, int]
+        Kept facilities that must be open, indices into ``candidates`` as
+        ``solve_cflp`` expects them.
+    dominated : np.ndarray
+        Facilities dropped by dominance.
+    closed : np.ndarray
+        Facilities dropped because no optimal solution opens them.
+    bound, upper_bound : float
+        Lagrangian bound and cost of the solution used for the fixing.
+    runtime : float
+        Seconds spent.
+    """
+
+    candidates: np.ndarray
+    fixed: dict[int, int]
+    dominated: np.ndarray
+    closed: np.ndarray
+    bound: float
+    upper_bound: float
+    runtime: float
+
+    @property
+    def reduction(self) -> float:
+        """Share of the original candidates dropped or fixed."""
+        total = len(self.candidates) + len(self.dominated) + len(self.closed)
+        return 1 - (len(self.candidates) - len(self.fixed)) / total
+
+    def expand(self, Y: np.ndarray) -> np.ndarray:
+        """Opening decision of the original candidates from the reduced one."""
+        total = len(self.candidates) + len(self.dominated) + len(self.closed)
+        full = np.zeros(total)
+        full[self.candidates] = Y
+        return full
+
+
+def dominated_candidates(
+    f: np.ndarray, a: np.ndarray, c: np.ndarray, tolerance: float = 0.0, demand: float = 0.0
+) -> np.ndarray:
+    """Candidates dominated by a cheaper, larger and closer one.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    tolerance : float
+        Unit cost a dominating candidate may exceed ``c[i, j]`` by.
+    demand : float
+        Total demand, a candidate is kept if without it the others would
+        not have the capacity to serve it.
+
+    Returns
+    -------
+    np.ndarray
+        Indices of the dominated candidates. Of two equal candidates only
+        one is dropped.
+    """
+    f, a, c = (np.asarray(x, dtype=float) for x in (f, a, c))
+    removed = np.zeros(len(f), dtype=bool)
+    capacity = a.sum()
+    # the most expensive first, so that they are compared against all others
+    for i in np.argsort(-f, kind="stable"):
+        if capacity - a[i] < demand:
+            continue
+        others = np.flatnonzero((f <= f[i]) & (a >= a[i]) & ~removed)
+        others = others[others != i]
+        if len(others) and (c[others] <= c[i] + tolerance).all(axis=1).any():
+            removed[i] = True
+            capacity -= a[i]
+    return np.flatnonzero(removed)
+
+
+def presolve_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    tolerance: float = 0.0,
+    upper_bound: float | None = None,
+    lagrangian_iterations: int = 300,
+) -> PresolveResult:
+    """Drop dominated candidates and fix facilities with the Lagrangian bound.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    tolerance : float
+        Tolerance of the dominance, as in ``dominated_candidates``.
+    upper_bound : float, optional
+        Cost of a known solution, by default the cost of the plan of the
+        Lagrangian bound completed to cover the demand.
+    lagrangian_iterations : int
+        Subgradient steps of the Lagrangian bound, zero to skip the fixing.
+
+    Returns
+    -------
+    PresolveResult
+        Nothing is dropped or fixed if the instance has not enough capacity
+        for the demand or no finite bound and solution are found.
+    """
+    start = time.time()
+    f, a, b, c = (np.asarray(x, dtype=float) for x in (f, a, b, c))
+    m = len(f)
+    empty = np.array([], dtype=int)
+    unreduced = PresolveResult(np.arange(m), {}, empty, empty, -np.inf, np.inf, 0.0)
+    if a.sum() < b.sum():
+        unreduced.runtime = time.time() - start
+        return unreduced
+    dominated = dominated_candidates(f, a, c, tolerance, b.sum())
+    kept = np.setdiff1d(np.arange(m), dominated)
+    if lagrangian_iterations <= 0:
+        return PresolveResult(kept, {}, dominated, empty, -np.inf, np.inf, time.time() - start)
+    f, a, c = f[kept], a[kept], c[kept]
+    bound, v, Y, _ = lagrangian_bound(f, a, b, c, lagrangian_iterations, upper_bound)
+    if upper_bound is None:
+        upper_bound = evaluate_plan(_cover(Y, f, a, b.sum()), f, a, b, c).objective
+    if not (np.isfinite(bound) and np.isfinite(upper_bound)):
+        unreduced.runtime = time.time() - start
+        return unreduced
+    g, _ = _continuous_knapsacks(v, a, b, c)
+    # the margin keeps the solutions that tie with the upper bound
+    forced = bound + np.abs(f - g) > upper_bound * (1 + 1e-9)
+    closed = forced & (g <= f)
+    fixed_open = np.flatnonzero((forced & (g > f))[~closed])
+    return PresolveResult(
+        kept[~closed],
+        {int(i): 1 for i in fixed_open},
+        dominated,
+        kept[closed],
+        bound,
+        upper_bound,
+        time.time() - start,
+    )
@@ -0,0 +1,305 @@
+"""Two-stage stochastic CFLP Module.
+
+The facilities ``Y`` are opened before the demand is known. Once scenario
+``s`` (with probability ``p[s]`` and demands ``B[s]``) is revealed the flows
+are chosen to serve it:
+
+    min  sum_i f[i] Y[i] + sum_s p[s] Q(Y, B[s])
+
+where ``Q`` is the transportation problem solved by ``cflp.transportation``.
+Every scenario is a separate LP once ``Y`` is fixed, so the model is solved
+with a multi-cut L-shaped method (Benders decomposition): a master problem
+over ``Y`` and one cost variable per scenario, and scenario subproblems
+solved in parallel in a process pool that return the cut of each scenario.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from ...parallel import limit_threads
+from .cflp import _cover, benders_cut, lagrangian_bound, transportation
+
+
+@dataclass
+class StochasticCFLPSolution:
+    """Solution of a two-stage stochastic CFLP.
+
+    Attributes
+    ----------
+    objective : float
+        Expected total cost of ``Y``.
+    Y : np.ndarray
+        Opening decision, shape (m,).
+    recourse : np.ndarray
+        Transport cost of ``Y`` in every scenario, shape (S,).
+    bound : float
+        Lower bound on the optimal expected cost.
+    iterations : int
+        Master problems solved.
+    status : str
+        ``"Optimal"`` if the gap was closed, ``"Stalled"`` if the master
+        proposed a plan it had already priced before closing it (its cuts
+        cannot tighten further within the MIP gap), ``"Time limit reached"``
+        otherwise.
+    runtime : float
+        Seconds spent solving.
+    """
+
+    objective: float
+    Y: np.ndarray
+    recourse: np.ndarray
+    bound: float
+    iterations: int
+    status: str
+    runtime: float
+
+    @property
+    def gap(self) -> float:
+        """Relative gap between the objective and the bound."""
+        if not np.isfinite(self.objective) or self.objective == 0:
+            return np.inf
+        return max(self.objective - self.bound, 0.0) / abs(self.objective)
+
+
+# Data available to every process of the pool, sent only once
+_worker_data = {}
+
+
+def _init_worker(a, B, c, threads):
+    """Limit the BLAS threads of a pool process and store the instance."""
+    limit_threads(threads)
+    _worker_data.update(a=a, B=B, c=c)
+
+
+def _scenario_cut(s, Y, data=None):
+    """Recourse cost of scenario ``s`` under ``Y`` and its optimality cut."""
+    data = data or _worker_data
+    a, b, c = data["a"], data["B"][s], data["c"]
+    cost, _, v = transportation(Y, a, b, c)
+    constant, g = benders_cut(v, a, b, c)
+    return cost, constant, g
+
+
+def _shared_cuts(s, prices, data=None):
+    """Cuts of scenario ``s`` from prices found for another demand."""
+    data = data or _worker_data
+    return [benders_cut(v, data["a"], data["B"][s], data["c"]) for v in prices]
+
+
+def _master(f, a, p, cover, cuts, relax, time_limit, mip_rel_gap):
+    """Solve the master problem over ``[Y, theta]`` with the cuts found.
+
+    Costs are divided by the largest fixed cost, with coefficients of 1e8
+    and constants of 1e9 HiGHS runs into numerical trouble.
+    """
+    m, S = len(f), len(p)
+    scale = np.abs(f).max() or 1.0
+    scenarios = np.array([s for s, _, _ in cuts])
+    g = np.array([g for _, _, g in cuts]) / scale
+    g[np.abs(g) < 1e-9 * np.abs(g).max(initial=1)] = 0
+    # theta[s] + sum_i g[i] Y[i] >= constant
+    rows = sparse.hstack(
+        [
+            sparse.csr_matrix(g),
+            sparse.csr_matrix(
+                (np.ones(len(cuts)), (np.arange(len(cuts)), scenarios)), shape=(len(cuts), S)
+            ),
+        ]
+    )
+    constraints = [
+        LinearConstraint(rows, np.array([k for _, k, _ in cuts]) / scale, np.inf),
+        # enough capacity for the largest scenario
+        LinearConstraint(np.concatenate([a, np.zeros(S)])[None, :], cover, np.inf),
+    ]
+    result = milp(
+        np.concatenate([f / scale, p]),
+        constraints=constraints,
+        integrality=np.concatenate([np.full(m, 0 if relax else 1), np.zeros(S)]),
+        bounds=Bounds(np.zeros(m + S), np.concatenate([np.ones(m), np.full(S, np.inf)])),
+        options={"time_limit": max(time_limit, 1), "mip_rel_gap": mip_rel_gap},
+    )
+    if result.x is None:
+        return None, -np.inf
+    bound = getattr(result, "mip_dual_bound", None)
+    bound = result.fun if relax or bound is None else bound
+    Y = result.x[:m] if relax else np.round(result.x[:m])
+    return Y, bound * scale
+
+
+def solve_stochastic_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    B: np.ndarray,
+    c: np.ndarray,
+    probabilities: np.ndarray | None = None,
+    time_limit: float = 3600,
+    gap: float = 1e-3,
+    n_workers: int | None = None,
+    lagrangian_iterations: int = 1000,
+    lp_iterations: int = 100,
+    stabilization: float = 0.2,
+    initial_plans: list[np.ndarray] | None = None,
+    disp: bool = True,
+) -> StochasticCFLPSolution:
+    """Solve a two-stage stochastic CFLP by scenario decomposition.
+
+    The master starts with the cuts given by the prices of the Lagrangian
+    bound of the mean scenario (any prices give a valid cut for every
+    scenario). Its LP relaxation is solved next to collect cuts cheaply, then
+    the master is solved as a MIP until the gap between the best evaluated
+    ``Y`` and the master bound closes, the master repeats a plan or time runs
+    out. In every iteration the ``S`` scenario subproblems are solved in
+    parallel.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities, shape (m,).
+    B : np.ndarray
+        Demands of every scenario, shape (S, n).
+    c : np.ndarray
+        Unit transport costs, shape (m, n).
+    probabilities : np.ndarray, optional
+        Probability of every scenario, uniform by default.
+    time_limit : float
+        Seconds for the whole method.
+    gap : float
+        Relative gap at which the method stops.
+    n_workers : int, optional
+        Processes solving the scenario subproblems, all the cores by default.
+    lagrangian_iterations : int
+        Subgradient steps of the Lagrangian bound of the mean scenario, its
+        prices seed the cuts of every scenario and its open facilities the
+        first incumbent.
+    lp_iterations : int
+        Maximum iterations with the relaxed master.
+    stabilization : float
+        Weight of the master solution in the point where the cuts of the
+        relaxed master are separated, 1 disables the stabilization.
+    initial_plans : list[np.ndarray], optional
+        Opening plans (e.g. deterministic solutions) evaluated first, they
+        give the first incumbent and cuts around it.
+    disp : bool
+        Print the progress of the bounds.
+
+    Returns
+    -------
+    StochasticCFLPSolution
+    """
+    start = time.time()
+    f, a, B, c = (np.asarray(v, dtype=float) for v in (f, a, B, c))
+    S, m = len(B), len(f)
+    p = np.full(S, 1 / S) if probabilities is None else np.asarray(probabilities, dtype=float)
+    cover = B.sum(axis=1).max()
+    n_workers = min(n_workers or os.cpu_count() or 1, S)
+
+    cuts = []
+    best = (np.inf, np.ones(m), np.full(S, np.inf))
+    bound, iterations = -np.inf, 0
+
+    def report(phase):
+        if disp:
+            print(
+                f"{phase} {iterations:>3}: lower bound {bound:,.0f}, "
+                f"best {best[0]:,.0f}, {time.time() - start:.0f} s"
+            )
+
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(a, B, c, max(1, (os.cpu_count() or 1) // n_workers)),
+        )
+    data = None if executor else {"a": a, "B": B, "c": c}
+
+    def evaluate(Y, integer):
+        """Solve the scenarios under ``Y``, add their cuts and the incumbent."""
+        nonlocal best
+        if executor:
+            results = list(executor.map(_scenario_cut, range(S), repeat(Y)))
+        else:
+            results = [_scenario_cut(s, Y, data) for s in range(S)]
+        recourse = np.array([cost for cost, _, _ in results])
+        cuts.extend((s, constant, g) for s, (_, constant, g) in enumerate(results))
+        if integer:
+            objective = f @ Y + p @ recourse
+            if objective < best[0]:
+                best = (objective, Y.copy(), recourse)
+
+    try:
+        # prices of the mean scenario, the Lagrangian already closes most of
+        # the gap that plain cutting planes close slowly
+        _, _, Y, prices = lagrangian_bound(f, a, p @ B, c, lagrangian_iterations)
+        if executor:
+            shared = list(executor.map(_shared_cuts, range(S), repeat(prices)))
+        else:
+            shared = [_shared_cuts(s, prices, data) for s in range(S)]
+        cuts.extend((s, constant, g) for s in range(S) for constant, g in shared[s])
+        core = _cover(Y, f, a, cover)
+        for Y in [core] + list(initial_plans or []):
+            evaluate(_cover(Y, f, a, cover), True)
+        # relaxed master: cheap cuts that tighten the bound. The cuts are
+        # separated between the master solution and a core point that moves
+        # towards it (in-out stabilization), plain cutting planes zig-zag
+        core, weight, stalled = (core + 1) / 2, stabilization, 0
+        for _ in range(lp_iterations):
+            remaining = time_limit - (time.time() - start)
+            if remaining <= 0:
+                break
+            Y, new_bound = _master(f, a, p, cover, cuts, True, remaining, 0)
+            iterations += 1
+            if Y is None:
+                break
+            stalled = stalled + 1 if new_bound - bound <= 1e-4 * abs(new_bound) else 0
+            bound = max(bound, new_bound)
+            report("LP ")
+            if best[0] - bound <= gap * abs(best[0]):
+                break
+            if stalled >= 3:
+                if weight == 1:
+                    break
+                weight, stalled = 1, 0
+            core = (core + Y) / 2
+            evaluate(weight * Y + (1 - weight) * core, False)
+        # integer master: every solution is a candidate plan
+        visited, repeated = set(), False
+        while (best[0] - bound) > gap * abs(best[0]):
+            remaining = time_limit - (time.time() - start)
+            if remaining <= 0:
+                break
+            Y, new_bound = _master(f, a, p, cover, cuts, False, remaining, gap / 2)
+            iterations += 1
+            if Y is None:
+                break
+            bound = max(bound, new_bound)
+            key = np.flatnonzero(Y).tobytes()
+            if key in visited:
+                # the master cannot improve on a plan it already priced
+                report("MIP")
+                repeated = True
+                break
+            visited.add(key)
+            evaluate(Y, True)
+            report("MIP")
+    finally:
+        if executor:
+            executor.shutdown()
+
+    objective, Y, recourse = best
+    if (objective - bound) <= gap * abs(objective):
+        status = "Optimal"
+    elif repeated:
+        status = "Stalled"
+    else:
+        status = "Time limit reached"
+    return StochasticCFLPSolution(
+        objective, Y, recourse, bound, iterations, status, time.time() - start
+    )
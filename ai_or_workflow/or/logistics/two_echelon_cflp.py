@@ -0,0 +1,285 @@
+"""Two-echelon CFLP Module.
+
+Food leaves the origins ``o`` (producing municipios with supply ``s[o]`` and
+ports with unlimited supply), goes through the open distribution centers
+``i`` and reaches the municipios ``j``:
+
+    min  sum_i f[i] Y[i] + sum_oi e[o, i] Z[o, i] + sum_ij c[i, j] X[i, j]
+    s.t. sum_i X[i, j] >= b[j]                      for all j
+         sum_j X[i, j] <= a[i] Y[i]                 for all i
+         sum_o Z[o, i] >= sum_j X[i, j]             for all i
+         sum_i Z[o, i] <= s[o]                      for all o
+         X, Z >= 0, Y in {0, 1}
+
+Pricing the supply of the origins with ``pi >= 0`` every unit that enters
+``i`` costs ``min_o e[o, i] + pi[o]``, which turns the model into a single
+echelon CFLP with costs ``c[i, j]`` plus that inbound cost. So the model is
+solved by alternating a location master over ``Y`` with the flow problem of
+the open centers, whose duals give the prices and the cut of ``cflp``.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from .cflp import _cover, benders_cut, lagrangian_bound
+from .stochastic_cflp import _master
+
+
+@dataclass
+class TwoEchelonCFLPSolution:
+    """Solution of a two-echelon CFLP.
+
+    Attributes
+    ----------
+    objective : float
+        Fixed plus inbound plus outbound cost.
+    Y : np.ndarray
+        Opening decision, shape (m,).
+    Z : np.ndarray
+        Flows from the origins with limited supply, shape (O, m).
+    ports : np.ndarray
+        Flows from the cheapest port into every center, shape (m,).
+    X : np.ndarray
+        Flows from the centers to the municipios, shape (m, n).
+    bound : float
+        Lower bound on the optimal objective.
+    iterations : int
+        Master problems solved.
+    status : str
+        ``"Optimal"`` if the gap was closed, ``"Stalled"`` if the master
+        proposed a plan it had already priced before closing it,
+        ``"Infeasible"`` if the supply cannot cover the demand and
+        ``"Time limit reached"`` otherwise.
+    runtime : float
+        Seconds spent solving.
+    """
+
+    objective: float
+    Y: np.ndarray
+    Z: np.ndarray
+    ports: np.ndarray
+    X: np.ndarray
+    bound: float
+    iterations: int
+    status: str
+    runtime: float
+
+    @property
+    def gap(self) -> float:
+        """Relative gap between the objective and the bound."""
+        if not np.isfinite(self.objective) or self.objective == 0:
+            return np.inf
+        return max(self.objective - self.bound, 0.0) / abs(self.objective)
+
+
+def inbound_costs(e: np.ndarray, supply: np.ndarray, prices: np.ndarray | None = None) -> np.ndarray:
+    """Cost of bringing one unit into every center at the given supply prices.
+
+    Parameters
+    ----------
+    e : np.ndarray
+        Unit costs from the origins to the centers, shape (O, m).
+    supply : np.ndarray
+        Supply of every origin, ``np.inf`` for ports, shape (O,).
+    prices : np.ndarray, optional
+        Price of the supply of every origin, zero by default, shape (O,).
+
+    Returns
+    -------
+    np.ndarray
+        ``min_o e[o, i] + prices[o]``, shape (m,).
+    """
+    prices = np.zeros(len(supply)) if prices is None else np.where(np.isinf(supply), 0, prices)
+    return (e + prices[:, None]).min(axis=0)
+
+
+def two_echelon_flows(
+    Y: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    e: np.ndarray,
+    supply: np.ndarray,
+) -> tuple[float, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Cheapest flows through the open centers.
+
+    The ports have unlimited supply, so only the cheapest port of every
+    center matters and they enter the LP as one arc per center.
+
+    Returns
+    -------
+    cost : float
+        Inbound plus outbound cost, ``inf`` if infeasible.
+    Z, ports, X : np.ndarray
+        Flows, as in ``TwoEchelonCFLPSolution``.
+    v : np.ndarray
+        Duals of the demand constraints, shape (n,).
+    pi : np.ndarray
+        Duals of the supply constraints, zero for ports, shape (O,).
+    """
+    a, b, c, e, supply = (np.asarray(x, dtype=float) for x in (a, b, c, e, supply))
+    m, n = c.shape
+    limited = np.flatnonzero(np.isfinite(supply))
+    has_ports = len(limited) < len(supply)
+    port_cost = e[np.isinf(supply)].min(axis=0) if has_ports else np.full(m, np.inf)
+    open_ = np.flatnonzero(np.asarray(Y) > 0.5)
+    k, L = len(open_), len(limited)
+    # variables [X (k x n), Z (L x k), ports (k)]
+    cost = np.concatenate([c[open_].ravel(), e[np.ix_(limited, open_)].ravel(), port_cost[open_]])
+    outflow = sparse.kron(sparse.eye(k), np.ones((1, n)))
+    inflow = sparse.hstack([sparse.hstack([sparse.eye(k)] * L), sparse.eye(k)])
+    rows = sparse.vstack(
+        [
+            # demand: -sum_i X[i, j] <= -b[j]
+            sparse.hstack([-sparse.hstack([sparse.eye(n)] * k), sparse.csr_matrix((n, L * k + k))]),
+            # capacity: sum_j X[i, j] <= a[i]
+            sparse.hstack([outflow, sparse.csr_matrix((k, L * k + k))]),
+            # conservation: sum_j X[i, j] - sum_o Z[o, i] - ports[i] <= 0
+            sparse.hstack([outflow, -inflow]),
+            # supply: sum_i Z[o, i] <= s[o]
+            sparse.hstack(
+                [sparse.csr_matrix((L, k * n)), sparse.kron(sparse.eye(L), np.ones((1, k))),
+                 sparse.csr_matrix((L, k))]
+            ),
+        ],
+        format="csr",
+    )
+    bounds = [(0, None)] * (k * n + L * k) + [(0, None if has_ports else 0)] * k
+    result = linprog(
+        np.nan_to_num(cost, posinf=0),
+        A_ub=rows,
+        b_ub=np.concatenate([-b, a[open_], np.zeros(k), supply[limited]]),
+        bounds=bounds,
+        method="highs",
+    )
+    Z, ports, X = np.zeros((len(supply), m)), np.zeros(m), np.zeros((m, n))
+    if result.status != 0:
+        return np.inf, Z, ports, X, np.full(n, np.nan), np.zeros(len(supply))
+    X[open_] = result.x[: k * n].reshape(k, n)
+    Z[np.ix_(limited, open_)] = result.x[k * n : k * n + L * k].reshape(L, k)
+    ports[open_] = result.x[k * n + L * k :]
+    pi = np.zeros(len(supply))
+    pi[limited] = -result.ineqlin.marginals[n + 2 * k :]
+    return result.fun, Z, ports, X, -result.ineqlin.marginals[:n], pi
+
+
+def solve_two_echelon_cflp(
+    f: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    c: np.ndarray,
+    e: np.ndarray,
+    supply: np.ndarray,
+    time_limit: float = 3600,
+    gap: float = 1e-3,
+    lagrangian_iterations: int = 1000,
+    disp: bool = True,
+) -> TwoEchelonCFLPSolution:
+    """Solve a two-echelon CFLP alternating the location and the flows.
+
+    The master starts with the cuts of the Lagrangian bound with free supply
+    (every center buys from its cheapest origin). Then every master solution
+    ``Y`` is priced by the flow problem, whose demand duals ``v`` and supply
+    duals ``pi`` give the cut
+
+        cost(Y) >= sum_j b[j] v[j] - sum_o s[o] pi[o] - sum_i g[i] Y[i]
+
+    with ``g`` the savings of ``cflp.benders_cut`` under the costs
+    ``c[i, j] + min_o e[o, i] + pi[o]``, until the gap closes.
+
+    Parameters
+    ----------
+    f, a : np.ndarray
+        Fixed costs and capacities of the centers, shape (m,).
+    b : np.ndarray
+        Demands, shape (n,).
+    c : np.ndarray
+        Unit costs from the centers to the municipios, shape (m, n).
+    e : np.ndarray
+        Unit costs from the origins to the centers, shape (O, m).
+    supply : np.ndarray
+        Supply of every origin, ``np.inf`` for ports, shape (O,).
+    time_limit : float
+        Seconds for the whole method.
+    gap : float
+        Relative gap at which the method stops.
+    lagrangian_iterations : int
+        Subgradient steps of the Lagrangian bound that seeds the master.
+    disp : bool
+        Print the progress of the bounds.
+
+    Returns
+    -------
+    TwoEchelonCFLPSolution
+    """
+    start = time.time()
+    f, a, b, c, e, supply = (np.asarray(x, dtype=float) for x in (f, a, b, c, e, supply))
+    m = len(f)
+    limited = np.isfinite(supply)
+    cover, p = b.sum(), np.ones(1)
+
+    # cuts of the Lagrangian bound with free supply, where every center buys
+    # from its cheapest origin
+    free = c + inbound_costs(e, supply)[:, None]
+    _, _, Y_lagrangian, history = lagrangian_bound(f, a, b, free, lagrangian_iterations)
+    cuts = [(0, *benders_cut(v, a, b, free)) for v in history]
+    best = (np.inf, None)
+    iterations = 0
+
+    def evaluate(Y):
+        """Price ``Y`` with the flow problem and add its cut."""
+        nonlocal best
+        flows = two_echelon_flows(Y, a, b, c, e, supply)
+        cost, _, _, _, v, pi = flows
+        if not np.isfinite(cost):
+            return
+        constant, g = benders_cut(v, a, b, c + inbound_costs(e, supply, pi)[:, None])
+        cuts.append((0, constant - pi[limited] @ supply[limited], g))
+        if f @ Y + cost < best[0]:
+            best = (f @ Y + cost, (Y.copy(), *flows[1:4]))
+
+    evaluate(_cover(Y_lagrangian, f, a, cover))
+    bound, visited, repeated = -np.inf, set(), False
+    while best[0] - bound > gap * abs(best[0]):
+        remaining = time_limit - (time.time() - start)
+        if remaining <= 0:
+            break
+        Y, new_bound = _master(f, a, p, cover, cuts, False, remaining, gap / 2)
+        iterations += 1
+        if Y is None:
+            break
+        bound = max(bound, new_bound)
+        key = np.flatnonzero(Y).tobytes()
+        if disp:
+            print(
+                f"{iterations:>3}: lower bound {bound:,.0f}, best {best[0]:,.0f}, "
+                f"{time.time() - start:.0f} s"
+            )
+        if key in visited:
+            # the master cannot improve on a plan it already priced
+            repeated = True
+            break
+        visited.add(key)
+        evaluate(Y)
+
+    if best[1] is None:
+        # not enough supply for the demand
+        n = len(b)
+        return TwoEchelonCFLPSolution(
+            np.inf, np.zeros(m), np.zeros((limited.sum(), m)), np.zeros(m), np.zeros((m, n)),
+            bound, iterations, "Infeasible", time.time() - start,
+        )
+    objective, (Y, Z, ports, X) = best
+    if objective - bound <= gap * abs(objective):
+        status = "Optimal"
+    elif repeated:
+        status = "Stalled"
+    else:
+        status = "Time limit reached"
+    return TwoEchelonCFLPSolution(
+        objective, Y, Z[limited], ports, X, bound, iterations, status, time.time() - start
+    )
@@ -0,0 +1,20 @@
+"""Helpers for the process pools of the solvers and the model grids."""
+
+import os
+
+from threadpoolctl import threadpool_limits
+
+# Environment variables read by OpenMP and the BLAS libraries at start up
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def limit_threads(threads: int) -> None:
+    """Limit the OpenMP and BLAS threads of a pool process.
+
+    The environment variables cover the libraries loaded after the call
+    and ``threadpool_limits`` the ones already loaded, so the processes of
+    a pool do not compete for the cores.
+    """
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    threadpool_limits(limits=threads)
@@ -20,8 +20,9 @@ def cargar_datos():
         Matriz de distancias entre todos los municipios de Colombia por carretera con OpenStreetMap
     municipios : pd.DataFrame
         Información de los municipios de Colombia con historico de población 1985-2023
-    opciones_de_almacenes : dict
-        Opciones de los mejores 21 almacenes por departamento {divipol: pd.DataFrame}
+    opciones_de_almacenes : pd.DataFrame
+        Opciones de los mejores 21 almacenes por departamento en formato largo
+            df.columns = divipol	price	area	location
     """
     # Cargar los datos
     matriz_de_costos = pd.read_csv("data/matriz-de-costos.csv", index_col=0)
@@ -32,12 +33,7 @@ def cargar_datos():
     # Convertir las medidas de metros a kilometros
     matriz_de_distancias = matriz_de_distancias / 1000
     municipios = pd.read_csv("data/municipios.csv", index_col=3)
-    opciones_de_almacenes = {}
-    xls = pd.ExcelFile("data/opciones-de-almacenes.xlsx")
-    for sheet_name in xls.sheet_names:
-        # if the sheet is not empty
-        if not xls.parse(sheet_name).empty:
-            opciones_de_almacenes[sheet_name] = pd.read_excel(xls, sheet_name)
+    opciones_de_almacenes = cargar_opciones_de_almacenes()
     return (
         matriz_de_costos,
         matriz_de_distancias,
@@ -46,6 +42,58 @@ def cargar_datos():
     )
 
 
+def cargar_opciones_de_almacenes(
+    ruta_excel: str = "data/opciones-de-almacenes.xlsx",
+    ruta_cache: str = "data/cache/opciones-de-almacenes.npz",
+) -> pd.DataFrame:
+    """
+    Cargar todas las hojas de opciones de almacenes en una sola tabla larga
+
+    El archivo de excel se lee una única vez (todas las hojas en una sola
+    llamada) y la tabla resultante se guarda por columnas en un archivo .npz,
+    de manera que las siguientes lecturas no vuelven a procesar el excel
+    mientras este no sea modificado.
+
+    Parametros
+    ----------
+    ruta_excel : str
+        Ruta del archivo de excel con una hoja por divipol
+    ruta_cache : str
+        Ruta del archivo .npz en el que se guardan las columnas de la tabla
+
+    Returns
+    -------
+    opciones_de_almacenes : pd.DataFrame
+        Opciones de almacenes de todos los municipios
+            df.columns = divipol	price	area	location
+    """
+    columnas = ["divipol", "price", "area", "location"]
+    if os.path.exists(ruta_cache) and os.path.getmtime(
+        ruta_cache
+    ) >= os.path.getmtime(ruta_excel):
+        with np.load(ruta_cache) as cache:
+            return pd.DataFrame({columna: cache[columna] for columna in columnas})
+
+    hojas = pd.read_excel(ruta_excel, sheet_name=None)
+    # las hojas vacias no aportan opciones
+    hojas = {
+        divipol: opciones for divipol, opciones in hojas.items() if not opciones.empty
+    }
+    tabla = pd.concat(
+        hojas.values(), keys=[int(divipol) for divipol in hojas], names=["divipol"]
+    ).reset_index(level="divipol")
+    # guardar por columnas, el texto como unicode para no depender de pickle
+    arreglos = {
+        "divipol": tabla["divipol"].to_numpy(),
+        "price": tabla["price"].to_numpy(),
+        "area": tabla["area"].to_numpy(),
+        "location": tabla["location"].to_numpy(dtype=str),
+    }
+    os.makedirs(os.path.dirname(ruta_cache), exist_ok=True)
+    np.savez(ruta_cache, **arreglos)
+    return pd.DataFrame(arreglos)
+
+
 def alistar_datos_completos(
     matriz_de_costos,
     matriz_de_distancias,
@@ -66,8 +114,8 @@ def alistar_datos_completos(
         Matriz de distancias entre todos los municipios de Colombia por carretera con OpenStreetMap
     municipios : pd.DataFrame
         Información de los municipios de Colombia con historico de población 1985-2023
-    opciones_de_almacenes : dict
-        Opciones de los mejores 21 almacenes por departamento {divipol: pd.DataFrame}
+    opciones_de_almacenes : pd.DataFrame
+        Opciones de los mejores 21 almacenes por departamento en formato largo
     comida_per_capita : float
         Cantidad de comida necesaria por persona
     densidad_de_alimentos : float
@@ -169,7 +217,7 @@ def alistar_datos_completos(
 
 
 def procesar_opciones_de_almacenes(
-    opciones_de_almacenes: dict,
+    opciones_de_almacenes: pd.DataFrame,
     comida_per_capita: float,
     densidad_de_alimentos: float,
     municipios_final: pd.DataFrame,
@@ -180,9 +228,9 @@ def procesar_opciones_de_almacenes(
 
     Parametros
     ----------
-    opciones_de_almacenes : dict
-        Opciones de los mejores 21 almacenes por departamento {divipol: pd.DataFrame}
-            df.columns = price	area	location	link	image
+    opciones_de_almacenes : pd.DataFrame
+        Opciones de los mejores 21 almacenes por departamento en formato largo
+            df.columns = divipol	price	area	location
     comida_per_capita : float
         Cantidad de comida necesaria por persona
     densidad_de_alimentos : float
@@ -218,57 +266,69 @@ def procesar_opciones_de_almacenes(
         Si no existe una combinación de almacenes que cumpla la demanda,
             no reportar el municipio
 
+        los rankeos y las sumas acumuladas se calculan con groupby sobre la
+        tabla larga, en una sola pasada para todos los municipios.
+
         retornar una lista con los datos [divipol, ubicacion, area, capacidad, precio]
 
     """
-    opciones_de_almacenes_final = {
-        'divipol': [],
-        'ubicacion': [],
-        'area': [],
-        'capacidad': [],
-        'precio': []
-    }
-    for divipol, opciones in opciones_de_almacenes.items():
-        divipol = int(divipol)
-        demanda = pd.to_numeric(municipios_final.loc[divipol, "2023"]) * comida_per_capita * 7 * 1.5
-        opciones['capacidad'] = opciones['area'] * densidad_de_alimentos * 5
-        if any(opciones['capacidad'] >= demanda):
-            opciones = opciones[opciones['capacidad'] >= demanda].copy()
-            opciones['rank_precio'] = opciones['price'].rank(ascending=True)
-            opciones['rank_capacidad'] = opciones['capacidad'].rank(ascending=False)
-            opciones['rank_total'] = (opciones['rank_precio'] * 0.2 +
-                                       opciones['rank_capacidad'] * 0.8)
-            opciones = opciones.sort_values('rank_total', ascending=True)
-            opcion_a_escoger = {
-                'divipol': divipol,
-                'ubicacion': opciones.iloc[0]['location'],
-                'area': opciones.iloc[0]['area'],
-                'capacidad': opciones.iloc[0]['capacidad'],
-                'precio': opciones.iloc[0]['price']
-            }
-        elif opciones['capacidad'].sum() >= demanda:
-            opciones = opciones.sort_values('capacidad', ascending=False)
-            i = 0
-            for i, _ in opciones.iterrows():
-                if opciones['capacidad'].cumsum()[i] >= demanda:
-                    break
-
-            opcion_a_escoger = {
-                'divipol': divipol,
-                'ubicacion': 'combinación de almacenes',
-                'area': opciones['area'].cumsum()[i],
-                'capacidad': opciones['capacidad'].cumsum()[i],
-                'precio': opciones['price'].cumsum()[i]
-            }
-        else:
-            print(f"     No se encontró un almacen que cumpla la demanda para\
-\n {divipol}| demanda: {demanda} | suma de capacidad: {opciones['capacidad'].sum()}")
-            continue
-        for key, value in opcion_a_escoger.items():
-            opciones_de_almacenes_final[key].append(value)
-
-    opciones_de_almacenes_final = pd.DataFrame(opciones_de_almacenes_final)
-    opciones_de_almacenes_final = opciones_de_almacenes_final.set_index('divipol')
+    # demanda de almacenamiento por opción, según el municipio de la hoja
+    opciones = opciones_de_almacenes.copy()
+    poblacion = pd.to_numeric(municipios_final["2023"])
+    opciones["demanda"] = (
+        opciones["divipol"].map(poblacion) * comida_per_capita * 7 * 1.5
+    )
+    opciones = opciones.dropna(subset=["demanda"])
+    opciones["capacidad"] = opciones["area"] * densidad_de_alimentos * 5
+    opciones["cumple"] = opciones["capacidad"] >= opciones["demanda"]
+    por_municipio = opciones.groupby("divipol", sort=False)
+    algun_almacen_cumple = por_municipio["cumple"].transform("any")
+
+    # 1. Municipios con al menos un almacen que cumple la demanda
+    individuales = opciones[algun_almacen_cumple & opciones["cumple"]].copy()
+    por_municipio = individuales.groupby("divipol", sort=False)
+    individuales["rank_total"] = (
+        por_municipio["price"].rank(ascending=True) * 0.2
+        + por_municipio["capacidad"].rank(ascending=False) * 0.8
+    )
+    individuales = individuales.sort_values(
+        ["divipol", "rank_total"], kind="stable"
+    ).drop_duplicates("divipol", keep="first")
+    individuales = individuales.rename(
+        columns={"location": "ubicacion", "price": "precio"}
+    )
+
+    # 2. Municipios en los que se combinan los almacenes de mayor capacidad
+    combinados = opciones[~algun_almacen_cumple].sort_values(
+        ["divipol", "capacidad"], ascending=[True, False], kind="stable"
+    )
+    por_municipio = combinados.groupby("divipol", sort=False)
+    combinados = combinados.assign(
+        area=por_municipio["area"].cumsum(),
+        capacidad=por_municipio["capacidad"].cumsum(),
+        precio=por_municipio["price"].cumsum(),
+        ubicacion="combinación de almacenes",
+    )
+    cubiertos = combinados[combinados["capacidad"] >= combinados["demanda"]]
+    cubiertos = cubiertos.drop_duplicates("divipol", keep="first")
+
+    sin_cobertura = combinados.drop_duplicates("divipol", keep="last")
+    sin_cobertura = sin_cobertura[~sin_cobertura["divipol"].isin(cubiertos["divipol"])]
+    for divipol, demanda, capacidad in sin_cobertura[
+        ["divipol", "demanda", "capacidad"]
+    ].itertuples(index=False):
+        print(f"     No se encontró un almacen que cumpla la demanda para\
+\n {divipol}| demanda: {demanda} | suma de capacidad: {capacidad}")
+
+    # conservar el orden de las hojas del archivo de opciones
+    columnas = ["divipol", "ubicacion", "area", "capacidad", "precio"]
+    opciones_de_almacenes_final = pd.concat(
+        [individuales[columnas], cubiertos[columnas]]
+    ).set_index("divipol")
+    orden = opciones["divipol"].unique()
+    opciones_de_almacenes_final = opciones_de_almacenes_final.reindex(
+        orden[np.isin(orden, opciones_de_almacenes_final.index)]
+    )
     return opciones_de_almacenes_final
 #     opciones_de_almacenes_final = pd.DataFrame(
 #         columns=["divipol", "ubicacion", "area", "capacidad", "precio"]
@@ -13,6 +13,8 @@ import pandas as pd
 import pulp as pl
 from sklearn.preprocessing import MinMaxScaler
 
+from ai_or_workflow.ai.clustering import ClusterMetrics
+from funciones.generacion_de_clusteres import arbol_vial
 
 
 def k_propuesta(
@@ -181,3 +183,50 @@ def cantidad_de_clusteres(RANDOM_SEED, tiempo_maximo=60, rango_de_muestras= np.l
         f"resultados/tablas/cantidad_de_clusteres/{key}.csv", index=False
     )
         print(f"  Terminado para {key}")
+
+
+def cantidad_de_clusteres_vial(valores_de_k=range(2, 31), metodo="complete"):
+    """
+    Propone k cortando un solo árbol de agrupamiento jerárquico sobre las
+    distancias por carretera (arbol_vial) en cada valor de k y eligiendo el
+    de mayor silueta sobre las mismas distancias, calculadas una vez para
+    todos los k.
+
+    Guarda la silueta y los tamaños de cada k en
+    resultados/tablas/cantidad_de_clusteres/{tipo_de_datos}-vial.csv
+
+    Parámetros
+    ----------
+    valores_de_k : iterable
+        Cantidades de clusteres a evaluar.
+    metodo : str
+        Enlace del agrupamiento jerárquico.
+
+    Returns
+    -------
+    k_propuestos : dict
+        k propuesto para cada tipo de datos.
+    """
+    k_propuestos = {}
+    for key in ["datos_completos", "datos_imperfectos"]:
+        print(f"Proponiendo k por distancias viales para {key}")
+        arbol, indice = arbol_vial(key, metodo)
+        distancias = pd.read_csv(f"data/{key}/matriz-de-distancias.csv", index_col=0)
+        distancias.columns = distancias.columns.astype(int)
+        distancias.index = distancias.index.astype(int)
+        metricas = ClusterMetrics(distances=distancias.loc[indice, indice].values)
+        cortes = arbol.cut_many(list(valores_de_k))
+        resultados = {"k": [], "silhouette_score_vial": [], "tamano_maximo": [], "tamano_minimo": []}
+        for k, etiquetas in cortes.items():
+            tamanos = np.bincount(etiquetas)
+            resultados["k"].append(k)
+            resultados["silhouette_score_vial"].append(metricas.silhouette(etiquetas))
+            resultados["tamano_maximo"].append(tamanos.max())
+            resultados["tamano_minimo"].append(tamanos.min())
+        resultados = pd.DataFrame(resultados)
+        resultados.to_csv(
+            f"resultados/tablas/cantidad_de_clusteres/{key}-vial.csv", index=False
+        )
+        k_propuestos[key] = int(resultados.loc[resultados["silhouette_score_vial"].idxmax(), "k"])
+        print(f"  k propuesto: {k_propuestos[key]}")
+    return k_propuestos
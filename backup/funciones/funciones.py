@@ -4,15 +4,33 @@ centros de distribución capacitados para satisfacer la demanda de alimentos
 en los municipios.
 """
 
+import importlib
 import os
 import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
 import pulp as pl
 from scipy import cluster
 
+from ai_or_workflow.ai.clustering import balanced_clustering, merge_small_groups
+from funciones.generacion_de_clusteres import arbol_vial
+from funciones.pronostico_poblacional import cargar_escenarios_de_demanda
+
+# "or" es una palabra reservada de Python, el módulo se importa por su nombre
+cflp = importlib.import_module("ai_or_workflow.or.logistics.cflp")
+stochastic_cflp = importlib.import_module("ai_or_workflow.or.logistics.stochastic_cflp")
+multiperiod_cflp = importlib.import_module("ai_or_workflow.or.logistics.multiperiod_cflp")
+two_echelon_cflp = importlib.import_module("ai_or_workflow.or.logistics.two_echelon_cflp")
+aggregation = importlib.import_module("ai_or_workflow.or.logistics.aggregation")
+presolve = importlib.import_module("ai_or_workflow.or.logistics.presolve")
+genetic_cflp = importlib.import_module("ai_or_workflow.or.logistics.genetic_cflp")
+decomposition = importlib.import_module("ai_or_workflow.or.logistics.decomposition")
+
+TELEMETRIA = "resultados/tablas/solucionar_cflp/metricas/telemetria.csv"
+
 
 def actualizar_resutados_ingenuos(resultados, key, ingenua):
     resultados["tipo_de_datos"].append(key)
@@ -296,10 +314,54 @@ def crear_diccionario_de_resultados():
     return resultados
 
 
-def solucion_cflp_MC(datos, costos, tiempo_limite=60, log_path="logs/cflp.log"):
+def reducir_candidatos(datos, costos, tolerancia=0.0):
+    """
+    Función que reduce los candidatos a centro de distribución antes de
+    resolver el cflp (ai_or_workflow/or/logistics/presolve.py): quita los
+    dominados por uno más barato, más grande y con costos de transporte no
+    peores (más la tolerancia), y fija los que la cota lagrangiana obliga a
+    abrir o a cerrar.
+
+    Parámetros:
+        datos: DataFrame con las columnas "precio", "capacidad" y "demanda"
+        costos: matriz de costos en el mismo orden de los datos
+        tolerancia: costo por tonelada en que un candidato dominante puede
+            superar al dominado
+
+    retorna:
+        candidatos: posiciones de los candidatos que quedan
+        abiertos: posiciones de los candidatos que deben abrirse
+    """
+    reduccion = presolve.presolve_cflp(
+        datos["precio"].values,
+        datos["capacidad"].values,
+        datos["demanda"].values,
+        np.asarray(costos.values, dtype=float),
+        tolerancia,
+    )
+    print(
+        f"        Preproceso: {len(reduccion.dominated)} dominados, "
+        f"{len(reduccion.closed)} cerrados y {len(reduccion.fixed)} abiertos "
+        f"de {len(datos)} ({reduccion.reduction:.1%} de reducción)"
+    )
+    candidatos = list(reduccion.candidates)
+    abiertos = [candidatos[i] for i in reduccion.fixed]
+    return candidatos, abiertos
+
+
+def solucion_cflp_MC(
+    datos,
+    costos,
+    tiempo_limite=60,
+    log_path="logs/cflp.log",
+    preproceso=False,
+    tolerancia=0.0,
+):
     """
     Función que resuelve cflp, crea el archivo de excel con los resultados y
-    retorna los resultados de la solución sin clusterizar.
+    retorna los resultados de la solución sin clusterizar. Con preproceso
+    los candidatos se reducen antes con reducir_candidatos y los quitados
+    quedan con Y = 0.
 
     formulación:
     SETS:
@@ -339,6 +401,9 @@ def solucion_cflp_MC(datos, costos, tiempo_limite=60, log_path="logs/cflp.log"):
     # Sets
     I = range(len(datos))
     J = range(len(datos))
+    abiertos = []
+    if preproceso:
+        I, abiertos = reducir_candidatos(datos, costos, tolerancia)
     # Variables
     Y = pl.LpVariable.dicts("Y", I, 0, 1, cat="Binary")
     X = pl.LpVariable.dicts("X", (I, J), 0, None, cat="Continuous")
@@ -347,6 +412,8 @@ def solucion_cflp_MC(datos, costos, tiempo_limite=60, log_path="logs/cflp.log"):
     f = datos["precio"].values
     a = datos["capacidad"].values
     b = datos["demanda"].values
+    for i in abiertos:
+        Y[i].lowBound = 1
     # Crear el problema
     problema = pl.LpProblem("cflp", pl.LpMinimize)
     # Función objetivo
@@ -370,10 +437,15 @@ def solucion_cflp_MC(datos, costos, tiempo_limite=60, log_path="logs/cflp.log"):
     # resultados
     costo_total = pl.value(problema.objective)
     df_y = pd.DataFrame(
-        [pl.value(Y[i]) for i in I], index=datos.index, columns=["Y"]
+        [pl.value(Y[i]) if i in Y else 0 for i in range(len(datos))],
+        index=datos.index,
+        columns=["Y"],
     )
     df_x = pd.DataFrame(
-        [[pl.value(X[i][j]) for j in J] for i in I],
+        [
+            [pl.value(X[i][j]) if i in X else 0 for j in J]
+            for i in range(len(datos))
+        ],
         index=datos.index,
         columns=datos.index,
     )
@@ -414,11 +486,12 @@ def solucion_cflp_MC(datos, costos, tiempo_limite=60, log_path="logs/cflp.log"):
     )
 
 
-def solucionar_cflp(comida_per_capita, tiempo_maximo=60 * 60):
+def solucionar_cflp(comida_per_capita, tiempo_maximo=60 * 60, preproceso=False):
     """
     Función para solucionar el problema de la facilidad de localización de
     centros de distribución capacitados para satisfacer la demanda de
-    alimentos en los municipios.
+    alimentos en los municipios. Con preproceso los candidatos de cada
+    problema se reducen antes de resolverlo (reducir_candidatos).
 
     Pseudocódigo:
     para cada tipo de datos [datos_completos, datos_imperfectos]
@@ -475,10 +548,14 @@ def solucionar_cflp(comida_per_capita, tiempo_maximo=60 * 60):
             costos,
             tiempo_limite=tiempo_maximo,
             log_path=f"resultados/logs/cflp-{key}-sin-clusterizar.log",
+            preproceso=preproceso,
         )
         resultados = actualizar_resultados_sin_clusterizar(
             resultados, key, value, cluster_id, sin_clusterizar
         )
+        registrar_telemetria(
+            key, "sin clusterizar", len(value), sin_clusterizar[2], "cbc", sin_clusterizar[7]
+        )
         print("    Solución sin clusterizar procesada satisfactoriamente")
 
         ####* Solución clusterizada ####
@@ -491,7 +568,7 @@ def solucionar_cflp(comida_per_capita, tiempo_maximo=60 * 60):
             if modelo == "bdscan" and key == "datos_imperfectos":
                 tiempo_maximo = tiempo_maximo / 20
             resultados_de_cluster, df_y, df_x = solucion_clusterizada(
-                tiempo_maximo, key, value, costos, modelo
+                tiempo_maximo, key, value, costos, modelo, preproceso
             )
             resultados = actualizar_resultados_clusterizados(
                 resultados, key, modelo, resultados_de_cluster, df_y, df_x
@@ -505,23 +582,50 @@ def solucionar_cflp(comida_per_capita, tiempo_maximo=60 * 60):
     )
 
 
-def solucion_clusterizada(tiempo_maximo, key, value, costos, modelo):
+def solucion_clusterizada(
+    tiempo_maximo, key, value, costos, modelo, preproceso=False, n_trabajadores=1
+):
+    """
+    Resuelve el cflp de cada cluster de la columna "modelo" por separado.
+    Con n_trabajadores > 1 los clusteres se resuelven en paralelo en un pool
+    de procesos, los más grandes primero.
+
+    retorna:
+        resultados_de_cluster: resultados de cada cluster, en el orden de
+            value[modelo].unique()
+        df_y: vector Y de todos los municipios con su cluster
+        df_x: matriz X de todos los municipios
+    """
     resultados_de_cluster = crear_diccionario_de_resultados()
     df_y = pd.DataFrame(
         columns=["Y", "cluster", "municipio"], index=value.index
     )
     df_x = pd.DataFrame(columns=value.index, index=value.index)
     lista_de_clusteres = value[modelo].unique()
+    # argumentos de solucion_cflp_MC de cada cluster
+    argumentos = []
     for cluster_id in lista_de_clusteres:
-        print(f"            Procesando cluster {cluster_id}", end="\r")
         cluster_value = value[value[modelo] == cluster_id]
-        cluster_costos = costos.loc[cluster_value.index, cluster_value.index]
-        cluster_solucion = solucion_cflp_MC(
-            cluster_value,
-            cluster_costos,
-            tiempo_limite=tiempo_maximo,
-            log_path=f"resultados/logs/cflp-{key}-{modelo}-{cluster_id}.log",
+        argumentos.append(
+            (
+                cluster_value,
+                costos.loc[cluster_value.index, cluster_value.index],
+                tiempo_maximo,
+                f"resultados/logs/cflp-{key}-{modelo}-{cluster_id}.log",
+                preproceso,
+            )
         )
+    soluciones = {}
+    if n_trabajadores > 1:
+        print(f"            Procesando {len(argumentos)} clusteres en paralelo", end="\r")
+        orden = sorted(range(len(argumentos)), key=lambda k: -len(argumentos[k][0]))
+        with ProcessPoolExecutor(max_workers=n_trabajadores) as executor:
+            futuros = {k: executor.submit(solucion_cflp_MC, *argumentos[k]) for k in orden}
+            soluciones = {k: futuro.result() for k, futuro in futuros.items()}
+    for k, cluster_id in enumerate(lista_de_clusteres):
+        print(f"            Procesando cluster {cluster_id}", end="\r")
+        cluster_value = argumentos[k][0]
+        cluster_solucion = soluciones.get(k) or solucion_cflp_MC(*argumentos[k])
         resultados_de_cluster = actualizar_resultados_sin_clusterizar_a(
             resultados_de_cluster,
             key,
@@ -537,9 +641,46 @@ def solucion_clusterizada(tiempo_maximo, key, value, costos, modelo):
 
         df_y = df_y.combine_first(cluster_solucion[9])
         df_x = df_x.combine_first(cluster_solucion[8])
+        registrar_telemetria(
+            key, modelo, len(cluster_value), cluster_solucion[2], "cbc", cluster_solucion[7]
+        )
     return resultados_de_cluster, df_y, df_x
 
 
+def registrar_telemetria(key, modelo, municipios, tiempo, solver, estado):
+    """
+    Añade el tiempo de una solución del cflp a la telemetría
+    (resultados/tablas/solucionar_cflp/metricas/telemetria.csv), con la que
+    se estima el tiempo de los subproblemas de solucionar_cflp_jerarquico.
+
+    Parámetros:
+        key: tipo de datos
+        modelo: modelo de clusterización o tipo de solución
+        municipios: cantidad de municipios del problema
+        tiempo: tiempo de la solución en segundos
+        solver: "cbc" (pulp) o "highs"
+        estado: "Óptimo", "Detenido por tiempo" u otro estado del solver
+    """
+    fila = pd.DataFrame(
+        {
+            "tipo_de_datos": [key],
+            "modelo": [modelo],
+            "municipios": [municipios],
+            "tiempo": [tiempo],
+            "solver": [solver],
+            "estado": [estado],
+        }
+    )
+    if os.path.exists(TELEMETRIA):
+        anterior = pd.read_csv(TELEMETRIA)
+        if list(anterior.columns) != list(fila.columns):
+            # telemetría anterior sin solver ni estado: se reescribe con las
+            # columnas nuevas vacías para esas filas
+            pd.concat([anterior, fila]).to_csv(TELEMETRIA, index=False)
+            return
+    fila.to_csv(TELEMETRIA, mode="a", header=not os.path.exists(TELEMETRIA), index=False)
+
+
 def actualizar_resultados_clusterizados(
     resultados, key, modelo, resultados_de_cluster, df_y, df_x
 ):
@@ -594,3 +735,924 @@ def actualizar_resultados_clusterizados(
         df_x.to_excel(writer, sheet_name="X")
         df_y.to_excel(writer, sheet_name="Y")
     return resultados
+
+
+def solucion_cflp_estocastica(
+    datos, costos, demandas, tiempo_limite=60 * 60, n_trabajadores=None, planes=None
+):
+    """
+    Resuelve el cflp estocástico de dos etapas: los centros de distribución
+    (Y) se abren antes de conocer la demanda y los envíos (X) se deciden en
+    cada escenario de demanda, minimizando el costo fijo más el costo de
+    transporte esperado.
+
+    Se resuelve por descomposición en escenarios (L-shaped): un problema
+    maestro sobre Y y un problema de transporte por escenario, resueltos en
+    paralelo en un pool de procesos (ai_or_workflow/or/logistics/stochastic_cflp.py).
+
+    Parámetros:
+        datos: DataFrame de los municipios con las columnas "precio" y "capacidad"
+        costos: matriz de costos de transporte
+        demandas: DataFrame escenario x municipio con la demanda de cada escenario
+        tiempo_limite: tiempo máximo de la solución en segundos
+        n_trabajadores: procesos que resuelven los escenarios (todos los núcleos por defecto)
+        planes: lista de vectores Y (p. ej. la solución determinística) para iniciar
+
+    retorna:
+        costo_esperado: costo fijo más el costo de transporte esperado
+        cota_inferior: cota inferior del costo esperado óptimo
+        cantidad_de_centros_de_distribucion: cantidad de centros de distribución
+        tiempo_de_ejecucion: tiempo de ejecución de la solución
+        estatus: "Óptimo" o "Detenido por tiempo"
+        df_y: vector de 1s y 0s que indica si un centro de distribución fue asignado o no
+        df_escenarios: demanda total y costo de transporte de cada escenario
+    """
+    solucion = stochastic_cflp.solve_stochastic_cflp(
+        datos["precio"].values,
+        datos["capacidad"].values,
+        demandas[datos.index].values,
+        costos.loc[datos.index, datos.index].values,
+        time_limit=tiempo_limite,
+        n_workers=n_trabajadores,
+        initial_plans=planes,
+    )
+    estatus = {
+        "Optimal": "Óptimo",
+        "Stalled": "Estancado, el maestro repitió un plan",
+        "Time limit reached": "Detenido por tiempo",
+    }[solucion.status]
+    print(f"        {estatus}, brecha {solucion.gap:.2%}")
+    df_y = pd.DataFrame(solucion.Y, index=datos.index, columns=["Y"])
+    df_escenarios = pd.DataFrame(
+        {
+            "demanda_total": demandas[datos.index].sum(axis=1).values,
+            "costo_de_transporte": solucion.recourse,
+        },
+        index=demandas.index,
+    )
+    return (
+        solucion.objective,
+        solucion.bound,
+        df_y["Y"].sum(),
+        solucion.runtime,
+        estatus,
+        df_y,
+        df_escenarios,
+    )
+
+
+def solucionar_cflp_estocastico(
+    comida_per_capita, n_escenarios=50, tiempo_maximo=60 * 60, n_trabajadores=None
+):
+    """
+    Solución del cflp estocástico con los escenarios de demanda del pronóstico
+    poblacional (resultados/tablas/pronostico_poblacional/escenarios-*.npz.zst).
+
+    Los escenarios son remuestreos independientes de los residuos de
+    validación, por lo que los primeros n_escenarios son una muestra aleatoria
+    con probabilidades iguales. Si existe la solución sin clusterizar de
+    solucionar_cflp se usa como plan inicial.
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-estocastica.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-estocastico.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = {
+        "tipo_de_datos": [],
+        "cantidad_de_escenarios": [],
+        "costo_esperado": [],
+        "cota_inferior": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+        "estado": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema estocástico para {key}")
+        escenarios, divipolas = cargar_escenarios_de_demanda(key)
+        demandas = (
+            pd.DataFrame(escenarios[:n_escenarios], columns=divipolas.astype(int))
+            * comida_per_capita
+            * 7  # 7 días de comida
+        )
+        demandas.index.name = "escenario"
+        ruta_determinista = (
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-sin-clusterizar.xlsx"
+        )
+        planes = None
+        if os.path.exists(ruta_determinista):
+            y = pd.read_excel(ruta_determinista, sheet_name="Y", index_col=0)["Y"]
+            planes = [y.reindex(value.index).fillna(0).values]
+        solucion = solucion_cflp_estocastica(
+            value, matriz_de_costos[key], demandas, tiempo_maximo, n_trabajadores, planes
+        )
+        resultados["tipo_de_datos"].append(key)
+        resultados["cantidad_de_escenarios"].append(len(demandas))
+        resultados["costo_esperado"].append(solucion[0])
+        resultados["cota_inferior"].append(solucion[1])
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion[2])
+        resultados["tiempo_de_ejecucion"].append(solucion[3])
+        resultados["estado"].append(solucion[4])
+        df_y = solucion[5]
+        df_y["municipio"] = pd.read_csv(f"data/{key}/municipios.csv", index_col=0).loc[
+            value.index, "municipio"
+        ]
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-estocastica.xlsx"
+        ) as writer:
+            df_y.to_excel(writer, sheet_name="Y")
+            solucion[6].to_excel(writer, sheet_name="escenarios")
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-estocastico.csv", index=False
+    )
+
+
+def solucionar_cflp_multiperiodo(
+    comida_per_capita,
+    anios=range(2025, 2035),
+    ventana=3,
+    paso=1,
+    tasa_de_descuento=0.0,
+    tiempo_por_ventana=5 * 60,
+    n_trabajadores=None,
+):
+    """
+    Planeación multiperiodo de los centros de distribución con la población
+    pronosticada para cada año (pronostico_poblacional(..., horizontes=anios)).
+
+    Un centro de distribución abierto permanece abierto y su costo de
+    apertura se paga una vez, en el año en que abre. El problema completo
+    tiene una copia de los envíos por año, por lo que se resuelve con un
+    horizonte rodante: se optimizan `ventana` años, se fijan las decisiones
+    de los primeros `paso` años y la ventana avanza
+    (ai_or_workflow/or/logistics/multiperiod_cflp.py). El tiempo crece
+    linealmente con la cantidad de años.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        anios: años a planear, deben estar en los pronósticos
+        ventana: años que se optimizan juntos
+        paso: años que se fijan después de cada ventana
+        tasa_de_descuento: tasa de descuento anual de los costos
+        tiempo_por_ventana: tiempo máximo de cada ventana en segundos
+        n_trabajadores: procesos que resuelven los problemas de transporte
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-multiperiodo.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-multiperiodo.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    columnas = [f"Poblacion_{anio}" for anio in anios]
+    resultados = {
+        "tipo_de_datos": [],
+        "cantidad_de_periodos": [],
+        "costo_total": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema multiperiodo para {key}")
+        poblacion = pd.read_csv(
+            f"resultados/tablas/pronostico_poblacional/{key}.csv", index_col=0
+        )[columnas]
+        poblacion.index = poblacion.index.astype(int)
+        demandas = poblacion.loc[value.index].T.values * comida_per_capita * 7
+        solucion = multiperiod_cflp.solve_multiperiod_cflp(
+            value["precio"].values,
+            value["capacidad"].values,
+            demandas,
+            matriz_de_costos[key].loc[value.index, value.index].values,
+            window=ventana,
+            step=paso,
+            discount=tasa_de_descuento,
+            time_limit=tiempo_por_ventana,
+            n_workers=n_trabajadores,
+        )
+        anios_de_apertura = np.asarray(list(anios))[solucion.opening]
+        df_y = pd.DataFrame(
+            {
+                "Y": solucion.Y[-1],
+                "anio_de_apertura": np.where(solucion.opening >= 0, anios_de_apertura, np.nan),
+            },
+            index=value.index,
+        )
+        df_y["municipio"] = pd.read_csv(f"data/{key}/municipios.csv", index_col=0).loc[
+            value.index, "municipio"
+        ]
+        df_periodos = pd.DataFrame(
+            {
+                "demanda_total": demandas.sum(axis=1),
+                "centros_abiertos": solucion.Y.sum(axis=1),
+                "costo_de_transporte": solucion.transport,
+            },
+            index=pd.Index(list(anios), name="anio"),
+        )
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-multiperiodo.xlsx"
+        ) as writer:
+            df_y.to_excel(writer, sheet_name="Y")
+            df_periodos.to_excel(writer, sheet_name="periodos")
+        resultados["tipo_de_datos"].append(key)
+        resultados["cantidad_de_periodos"].append(len(columnas))
+        resultados["costo_total"].append(solucion.objective)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y[-1].sum())
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-multiperiodo.csv", index=False
+    )
+
+
+def solucionar_cflp_dos_escalones(comida_per_capita, origenes, tiempo_maximo=60 * 60):
+    """
+    Solución del cflp de dos escalones: origen -> centro de distribución ->
+    municipio. Los orígenes son los municipios productores (UPRA) con oferta
+    limitada y los puertos con oferta ilimitada; los costos de los dos
+    tramos salen de la misma matriz de costos entre municipios.
+
+    Se resuelve alternando el problema maestro de localización con el
+    problema de flujo de los centros abiertos
+    (ai_or_workflow/or/logistics/two_echelon_cflp.py).
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        origenes: DataFrame indexado por divipola con la columna "oferta"
+            (toneladas en los 7 días de demanda, np.inf para los puertos)
+        tiempo_maximo: tiempo máximo de la solución en segundos
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-dos-escalones.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-dos-escalones.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = {
+        "tipo_de_datos": [],
+        "costo_total": [],
+        "cota_inferior": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+        "estado": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema de dos escalones para {key}")
+        costos = matriz_de_costos[key]
+        disponibles = origenes.index.astype(int).isin(costos.index)
+        if not disponibles.all():
+            print(
+                f"    {(~disponibles).sum()} orígenes sin costos en {key}, se omiten"
+            )
+        origenes_de_datos = origenes[disponibles]
+        solucion = two_echelon_cflp.solve_two_echelon_cflp(
+            value["precio"].values,
+            value["capacidad"].values,
+            value["demanda"].values,
+            costos.loc[value.index, value.index].values,
+            costos.loc[origenes_de_datos.index.astype(int), value.index].values,
+            origenes_de_datos["oferta"].values,
+            time_limit=tiempo_maximo,
+        )
+        estatus = "Óptimo" if solucion.status == "Optimal" else solucion.status
+        print(f"        {estatus}, brecha {solucion.gap:.2%}")
+        df_y = pd.DataFrame(
+            {"Y": solucion.Y, "entrada_desde_puertos": solucion.ports}, index=value.index
+        )
+        df_y["municipio"] = pd.read_csv(f"data/{key}/municipios.csv", index_col=0).loc[
+            value.index, "municipio"
+        ]
+        limitados = np.isfinite(origenes_de_datos["oferta"].values)
+        df_z = pd.DataFrame(
+            solucion.Z, index=origenes_de_datos.index[limitados], columns=value.index
+        )
+        df_x = pd.DataFrame(solucion.X, index=value.index, columns=value.index)
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-dos-escalones.xlsx"
+        ) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+            df_z.to_excel(writer, sheet_name="Z")
+        resultados["tipo_de_datos"].append(key)
+        resultados["costo_total"].append(solucion.objective)
+        resultados["cota_inferior"].append(solucion.bound)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y.sum())
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+        resultados["estado"].append(estatus)
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-dos-escalones.csv", index=False
+    )
+
+
+def solucionar_cflp_agregado(
+    comida_per_capita, radio=None, n_puntos=None, tiempo_maximo=60 * 60
+):
+    """
+    Solución del cflp agregando los puntos de demanda cercanos: los puntos a
+    menos de "radio" kilómetros del de mayor demanda se unen en él, se
+    resuelve el cflp reducido y la solución se desagrega
+    (ai_or_workflow/or/logistics/aggregation.py). Se reporta la cota del
+    error de la agregación, cuánto puede costar la solución por encima del
+    óptimo del problema sin agregar.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        radio: radio de los grupos en kilómetros
+        n_puntos: cantidad máxima de puntos agregados, si no se da el radio
+        tiempo_maximo: tiempo máximo de la solución en segundos
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-agregado.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-agregado.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = {
+        "tipo_de_datos": [],
+        "puntos_agregados": [],
+        "costo_total": [],
+        "costo_agregado": [],
+        "cota_inferior": [],
+        "cota_del_error": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+        "estado": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema agregado para {key}")
+        costos = matriz_de_costos[key].loc[value.index, value.index].values
+        solucion = aggregation.solve_aggregated_cflp(
+            value["precio"].values,
+            value["capacidad"].values,
+            value["demanda"].values,
+            costos,
+            value["lat"].values,
+            value["lon"].values,
+            radius=radio,
+            n_points=n_puntos,
+            time_limit=tiempo_maximo,
+        )
+        print(
+            f"    {len(solucion.representatives)} puntos de {len(value)}, "
+            f"cota del error {solucion.error_bound:,.0f} ({solucion.gap:.2%})"
+        )
+        df_y = pd.DataFrame(
+            {
+                "Y": solucion.Y,
+                "representante": value.index[solucion.representatives[solucion.labels]],
+            },
+            index=value.index,
+        )
+        df_x = pd.DataFrame(solucion.X, index=value.index, columns=value.index)
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-agregado.xlsx"
+        ) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+        resultados["tipo_de_datos"].append(key)
+        resultados["puntos_agregados"].append(len(solucion.representatives))
+        resultados["costo_total"].append(solucion.objective)
+        resultados["costo_agregado"].append(solucion.aggregated_objective)
+        resultados["cota_inferior"].append(solucion.bound)
+        resultados["cota_del_error"].append(solucion.error_bound)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y.sum())
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+        resultados["estado"].append(solucion.status)
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-agregado.csv", index=False
+    )
+
+
+def solucionar_cflp_rapido(comida_per_capita, intentos=16, n_trabajadores=None):
+    """
+    Solución rápida del cflp para responder preguntas de "qué pasa si" en
+    segundos: se redondea la relajación lineal del problema y se repara con
+    el problema de transporte (ai_or_workflow/or/logistics/cflp.py). La
+    relajación da la cota inferior, así que la brecha se conoce antes de
+    resolver el problema exacto.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        intentos: cantidad de redondeos aleatorios
+        n_trabajadores: procesos que reparan los redondeos, por defecto uno
+            por núcleo
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-rapida.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-rapido.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = {
+        "tipo_de_datos": [],
+        "costo_total": [],
+        "cota_inferior": [],
+        "brecha": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema rápido para {key}")
+        solucion = cflp.solve_cflp_fast(
+            value["precio"].values,
+            value["capacidad"].values,
+            value["demanda"].values,
+            matriz_de_costos[key].loc[value.index, value.index].values,
+            trials=intentos,
+            n_workers=n_trabajadores,
+        )
+        print(f"    brecha {solucion.gap:.2%} en {solucion.runtime:.1f} s")
+        df_y = pd.DataFrame({"Y": solucion.Y}, index=value.index)
+        df_x = pd.DataFrame(solucion.X, index=value.index, columns=value.index)
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-rapida.xlsx"
+        ) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+        resultados["tipo_de_datos"].append(key)
+        resultados["costo_total"].append(solucion.objective)
+        resultados["cota_inferior"].append(solucion.bound)
+        resultados["brecha"].append(solucion.gap)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y.sum())
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-rapido.csv", index=False
+    )
+
+
+def evaluar_planes(datos, costos, planes):
+    """
+    Función que compara muchos planes de apertura a la vez, cada municipio
+    atendido por el centro de distribución abierto más barato sin límite de
+    capacidad (ai_or_workflow/or/logistics/cflp.py). El exceso sobre la
+    capacidad se reporta en lugar de repararse.
+
+    Parámetros:
+        datos: DataFrame con las columnas "precio", "capacidad" y "demanda"
+        costos: matriz de costos indexada por divipola
+        planes: DataFrame con un plan por fila y un divipola por columna
+            (1 si se abre el centro de distribución)
+
+    retorna:
+        DataFrame indexado por plan con el costo fijo, el costo de
+        asignación, el costo total, el exceso de capacidad y la cantidad de
+        centros de distribución
+    """
+    Y = planes.reindex(columns=datos.index, fill_value=0).values > 0.5
+    fijo, asignacion, exceso = cflp.evaluate_plans(
+        Y,
+        datos["precio"].values,
+        datos["capacidad"].values,
+        datos["demanda"].values,
+        costos.loc[datos.index, datos.index].values,
+    )
+    return pd.DataFrame(
+        {
+            "costo_fijo": fijo,
+            "costo_de_asignacion": asignacion,
+            "costo_total": fijo + asignacion,
+            "exceso_de_capacidad": exceso,
+            "cantidad_de_centros_de_distribucion": Y.sum(axis=1),
+        },
+        index=planes.index,
+    )
+
+
+def evaluar_soluciones_guardadas(comida_per_capita):
+    """
+    Función que evalúa con evaluar_planes los planes de apertura de las
+    soluciones guardadas en resultados/tablas/solucionar_cflp/soluciones
+    (hoja "Y" de cada archivo de excel) bajo la asignación al centro de
+    distribución abierto más cercano.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+
+    Guarda las métricas en
+    resultados/tablas/solucionar_cflp/metricas/evaluacion-de-planes.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    carpeta = "resultados/tablas/solucionar_cflp/soluciones"
+    if not os.path.isdir(carpeta):
+        print(f"No existe la carpeta {carpeta}, no hay planes para evaluar")
+        return
+    evaluaciones = []
+    for key, value in datos.items():
+        planes = {}
+        for archivo in sorted(os.listdir(carpeta)):
+            if archivo.startswith(f"{key}-") and archivo.endswith(".xlsx"):
+                y = pd.read_excel(f"{carpeta}/{archivo}", sheet_name="Y", index_col=0)
+                if "Y" in y.columns:
+                    planes[archivo[len(key) + 1 : -len(".xlsx")]] = y["Y"]
+        if not planes:
+            continue
+        print(f"Evaluando {len(planes)} planes de {key}")
+        evaluacion = evaluar_planes(
+            value, matriz_de_costos[key], pd.DataFrame(planes).T.fillna(0)
+        )
+        evaluacion.insert(0, "tipo_de_datos", key)
+        evaluaciones.append(evaluacion.rename_axis("plan").reset_index())
+    if not evaluaciones:
+        print(f"No hay soluciones guardadas con hoja Y en {carpeta}")
+        return
+    pd.concat(evaluaciones).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/evaluacion-de-planes.csv",
+        index=False,
+    )
+
+
+def solucionar_cflp_genetico(
+    comida_per_capita, tiempo_maximo=5 * 60, n_islas=4, n_trabajadores=None
+):
+    """
+    Solución del cflp con un algoritmo genético de islas sobre los vectores
+    Y (ai_or_workflow/or/logistics/genetic_cflp.py). Las soluciones
+    clusterizadas guardadas (kmeans, som, agglomerative y dbscan) son las
+    semillas de la población, así que la solución no es peor que ellas.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        tiempo_maximo: tiempo de la búsqueda en segundos
+        n_islas: cantidad de poblaciones que evolucionan por separado
+        n_trabajadores: procesos que evolucionan las islas, por defecto uno
+            por núcleo
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-genetica.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-genetico.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = {
+        "tipo_de_datos": [],
+        "costo_total": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "tiempo_de_ejecucion": [],
+        "semillas": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema con el algoritmo genético para {key}")
+        semillas = []
+        for modelo in ["kmeans", "som", "agglomerative", "dbscan"]:
+            archivo = f"resultados/tablas/solucionar_cflp/soluciones/{key}-{modelo}.xlsx"
+            if os.path.exists(archivo):
+                y = pd.read_excel(archivo, sheet_name="Y", index_col=0)["Y"]
+                semillas.append(y.reindex(value.index).fillna(0).values)
+        solucion = genetic_cflp.solve_cflp_genetic(
+            value["precio"].values,
+            value["capacidad"].values,
+            value["demanda"].values,
+            matriz_de_costos[key].loc[value.index, value.index].values,
+            time_limit=tiempo_maximo,
+            seeds=semillas,
+            n_islands=n_islas,
+            n_workers=n_trabajadores,
+        )
+        print(f"    {len(semillas)} semillas, costo {solucion.objective:,.0f}")
+        df_y = pd.DataFrame({"Y": solucion.Y}, index=value.index)
+        df_x = pd.DataFrame(solucion.X, index=value.index, columns=value.index)
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-genetica.xlsx"
+        ) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+        resultados["tipo_de_datos"].append(key)
+        resultados["costo_total"].append(solucion.objective)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y.sum())
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+        resultados["semillas"].append(len(semillas))
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-genetico.csv", index=False
+    )
+
+
+def solucionar_cflp_balanceado(
+    comida_per_capita,
+    n_clusteres=6,
+    tamano_maximo=None,
+    tiempo_maximo=60 * 60,
+    preproceso=False,
+    tiempo_de_asignacion=60,
+):
+    """
+    Solución clusterizada del cflp con clusteres balanceados: k-means donde
+    cada cluster tiene a lo sumo "tamano_maximo" municipios y al menos tanta
+    capacidad como demanda (ai_or_workflow/ai/clustering.py), así que todos
+    los subproblemas son factibles y de tamaño parecido. A diferencia de
+    dbscan no hay municipios sin cluster (-1).
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        n_clusteres: cantidad de clusteres
+        tamano_maximo: municipios por cluster, por defecto los municipios
+            entre la cantidad de clusteres
+        tiempo_maximo: tiempo máximo de la solución de cada cluster en segundos
+        preproceso: reducir los candidatos de cada cluster antes de resolverlo
+        tiempo_de_asignacion: tiempo máximo de cada paso de asignación de los
+            clusteres balanceados en segundos
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-balanceado.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-balanceado.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = crear_diccionario_de_resultados()
+    for key, value in datos.items():
+        print(f"Resolviendo el problema con clusteres balanceados para {key}")
+        value["balanceado"] = balanced_clustering(
+            value["lat"].values,
+            value["lon"].values,
+            n_clusteres,
+            max_size=tamano_maximo,
+            demand=value["demanda"].values,
+            capacity=value["capacidad"].values,
+            time_limit=tiempo_de_asignacion,
+        )
+        if (value["balanceado"] == -2).all():
+            print(
+                "    La asignación se detuvo por tiempo sin encontrar clusteres"
+                " balanceados, aumente tiempo_de_asignacion"
+            )
+            continue
+        if (value["balanceado"] < 0).all():
+            print("    No hay clusteres balanceados con suficiente capacidad")
+            continue
+        print(f"    Tamaños de los clusteres: {value['balanceado'].value_counts().values}")
+        resultados_de_cluster, df_y, df_x = solucion_clusterizada(
+            tiempo_maximo, key, value, matriz_de_costos[key], "balanceado", preproceso
+        )
+        resultados = actualizar_resultados_clusterizados(
+            resultados, key, "balanceado", resultados_de_cluster, df_y, df_x
+        )
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-balanceado.csv", index=False
+    )
+
+
+def solucionar_cflp_jerarquico(
+    comida_per_capita, tiempo_objetivo=5 * 60, tiempo_maximo=60 * 60, n_trabajadores=None
+):
+    """
+    Solución del cflp por descomposición jerárquica
+    (ai_or_workflow/or/logistics/decomposition.py): los municipios se
+    parten en dos, con suficiente capacidad en cada mitad, hasta que el
+    tiempo estimado de cada región es menor a "tiempo_objetivo". El tiempo
+    se estima con una ley de potencia en la cantidad de municipios ajustada
+    a la telemetría de las soluciones anteriores (registrar_telemetria),
+    solo las de HiGHS (el solver de las hojas) que terminaron antes del
+    tiempo máximo, porque un tiempo cortado no mide lo que tarda el
+    problema. Las hojas se resuelven en paralelo, las más largas primero, y
+    se unen de abajo hacia arriba reoptimizando los envíos de cada región.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        tiempo_objetivo: tiempo estimado máximo de cada hoja en segundos
+        tiempo_maximo: tiempo máximo de la solución de cada hoja en segundos
+        n_trabajadores: procesos que resuelven las hojas, por defecto uno
+            por núcleo
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-jerarquico.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-jerarquico.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    telemetria = pd.read_csv(TELEMETRIA) if os.path.exists(TELEMETRIA) else None
+    if telemetria is not None and "solver" in telemetria:
+        telemetria = telemetria[
+            (telemetria["solver"] == "highs") & (telemetria["estado"] == "Óptimo")
+        ]
+    else:
+        telemetria = None
+    resultados = {
+        "tipo_de_datos": [],
+        "costo_total": [],
+        "cantidad_de_centros_de_distribucion": [],
+        "hojas": [],
+        "profundidad": [],
+        "tiempo_estimado": [],
+        "tiempo_de_ejecucion": [],
+    }
+    for key, value in datos.items():
+        print(f"Resolviendo el problema por descomposición jerárquica para {key}")
+        modelo_de_tiempo = decomposition.RuntimeModel()
+        if telemetria is not None:
+            modelo_de_tiempo = decomposition.RuntimeModel.fit(
+                telemetria["municipios"].values, telemetria["tiempo"].values
+            )
+        solucion = decomposition.solve_decomposed_cflp(
+            value["precio"].values,
+            value["capacidad"].values,
+            value["demanda"].values,
+            matriz_de_costos[key].loc[value.index, value.index].values,
+            value["lat"].values,
+            value["lon"].values,
+            budget=tiempo_objetivo,
+            model=modelo_de_tiempo,
+            time_limit=tiempo_maximo,
+            n_workers=n_trabajadores,
+        )
+        hojas = solucion.root.leaves()
+        print(
+            f"    {len(hojas)} hojas de {solucion.leaf_sizes.min()} a "
+            f"{solucion.leaf_sizes.max()} municipios, costo {solucion.objective:,.0f}"
+        )
+        for municipios, tiempo, estado in zip(
+            solucion.leaf_sizes, solucion.leaf_runtimes, solucion.statuses
+        ):
+            estado = "Óptimo" if "Optimal" in estado else "Detenido por tiempo"
+            registrar_telemetria(key, "jerarquico", municipios, tiempo, "highs", estado)
+        region = np.zeros(len(value), dtype=int)
+        for k, hoja in enumerate(hojas):
+            region[hoja.indices] = k
+        df_y = pd.DataFrame({"Y": solucion.Y, "region": region}, index=value.index)
+        df_x = pd.DataFrame(solucion.X, index=value.index, columns=value.index)
+        with pd.ExcelWriter(
+            f"resultados/tablas/solucionar_cflp/soluciones/{key}-jerarquico.xlsx"
+        ) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+        resultados["tipo_de_datos"].append(key)
+        resultados["costo_total"].append(solucion.objective)
+        resultados["cantidad_de_centros_de_distribucion"].append(solucion.Y.sum())
+        resultados["hojas"].append(len(hojas))
+        resultados["profundidad"].append(solucion.root.depth)
+        resultados["tiempo_estimado"].append(solucion.makespan)
+        resultados["tiempo_de_ejecucion"].append(solucion.runtime)
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-jerarquico.csv", index=False
+    )
+
+
+def solucionar_cflp_vial(
+    comida_per_capita, valores_de_k=(6,), tiempo_maximo=60 * 60, preproceso=False
+):
+    """
+    Solución clusterizada del cflp con clusteres del agrupamiento jerárquico
+    sobre las distancias por carretera (arbol_vial). El árbol de cada tipo
+    de datos se calcula una sola vez y se corta en cada k.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        valores_de_k: cantidades de clusteres a resolver
+        tiempo_maximo: tiempo máximo de la solución de cada cluster en segundos
+        preproceso: reducir los candidatos de cada cluster antes de resolverlo
+
+    Guarda la solución de cada tipo de datos y k en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-vial-{k}.xlsx
+    y las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-vial.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    resultados = crear_diccionario_de_resultados()
+    for key, value in datos.items():
+        print(f"Resolviendo el problema con clusteres viales para {key}")
+        arbol, indice = arbol_vial(key)
+        for k, etiquetas in arbol.cut_many(list(valores_de_k)).items():
+            modelo = f"vial-{k}"
+            print(f"        Procesando modelo {modelo}")
+            value[modelo] = pd.Series(etiquetas, index=indice).loc[value.index]
+            resultados_de_cluster, df_y, df_x = solucion_clusterizada(
+                tiempo_maximo, key, value, matriz_de_costos[key], modelo, preproceso
+            )
+            resultados = actualizar_resultados_clusterizados(
+                resultados, key, modelo, resultados_de_cluster, df_y, df_x
+            )
+    pd.DataFrame(resultados).to_csv(
+        "resultados/tablas/solucionar_cflp/metricas/cflp-vial.csv", index=False
+    )
+
+
+def solucionar_cflp_regional(
+    comida_per_capita,
+    particion="departamento",
+    tamano_minimo=1,
+    tiempo_maximo=60 * 60,
+    n_trabajadores=None,
+    preproceso=False,
+):
+    """
+    Solución del cflp por regiones administrativas: los municipios se
+    parten por "departamento" o "region" (data/municipios.csv), los grupos
+    con menos de "tamano_minimo" municipios o con menos capacidad que
+    demanda se unen al grupo del municipio más cercano
+    (ai_or_workflow/ai/clustering.py) y cada grupo se resuelve por
+    separado, en paralelo. Es una línea base rápida y explicable contra la
+    cual comparar los clusteres.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        particion: "departamento" o "region"
+        tamano_minimo: cantidad mínima de municipios de un grupo
+        tiempo_maximo: tiempo máximo de la solución de cada grupo en segundos
+        n_trabajadores: procesos que resuelven los grupos, por defecto uno
+            por núcleo
+        preproceso: reducir los candidatos de cada grupo antes de resolverlo
+
+    Guarda la solución de cada tipo de datos en
+    resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-{particion}.xlsx,
+    las métricas en resultados/tablas/solucionar_cflp/metricas/cflp-{particion}.csv
+    y los resultados de cada grupo en
+    resultados/tablas/solucionar_cflp/metricas/cflp-{particion}-por-grupo.csv
+    """
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    municipios = pd.read_csv("data/municipios.csv")
+    municipios.index = municipios["dpmp"].astype(int)
+    resultados = crear_diccionario_de_resultados()
+    por_grupo = []
+    for key, value in datos.items():
+        print(f"Resolviendo el problema por {particion} para {key}")
+        nombres = municipios.loc[value.index, particion]
+        value[particion] = merge_small_groups(
+            nombres.values,
+            value["lat"].values,
+            value["lon"].values,
+            demand=value["demanda"].values,
+            capacity=value["capacidad"].values,
+            min_size=tamano_minimo,
+        )
+        print(
+            f"    {nombres.nunique()} grupos, {value[particion].nunique()} "
+            "después de unir los que no son factibles"
+        )
+        tiempo_inicial = time.time()
+        resultados_de_cluster, df_y, df_x = solucion_clusterizada(
+            tiempo_maximo,
+            key,
+            value,
+            matriz_de_costos[key],
+            particion,
+            preproceso,
+            n_trabajadores or os.cpu_count() or 1,
+        )
+        print(f"    Grupos resueltos en {time.time() - tiempo_inicial:.2f} segundos")
+        resultados = actualizar_resultados_clusterizados(
+            resultados, key, particion, resultados_de_cluster, df_y, df_x
+        )
+        for k, grupo in enumerate(value[particion].unique()):
+            miembros = value[particion] == grupo
+            por_grupo.append(
+                {
+                    "tipo_de_datos": key,
+                    particion: " + ".join(nombres[miembros].unique()),
+                    "municipios": miembros.sum(),
+                    "demanda": value.loc[miembros, "demanda"].sum(),
+                    "capacidad": value.loc[miembros, "capacidad"].sum(),
+                    "costo_total": resultados_de_cluster["costo_total"][k],
+                    "cantidad_de_centros_de_distribucion": resultados_de_cluster[
+                        "cantidad_de_centros_de_distribucion"
+                    ][k],
+                    "tiempo_de_ejecucion": resultados_de_cluster["tiempo_de_ejecucion"][k],
+                    "estado": resultados_de_cluster["estado"][k],
+                }
+            )
+    pd.DataFrame(resultados).to_csv(
+        f"resultados/tablas/solucionar_cflp/metricas/cflp-{particion}.csv", index=False
+    )
+    pd.DataFrame(por_grupo).to_csv(
+        f"resultados/tablas/solucionar_cflp/metricas/cflp-{particion}-por-grupo.csv",
+        index=False,
+    )
+
+
+def actualizar_solucion_clusterizada(
+    comida_per_capita, cambios=None, tiempo_maximo=60 * 60, preproceso=False
+):
+    """
+    Vuelve a resolver solo los cflp de los clusteres que cambiaron al
+    añadir puntos nuevos (actualizar_clusteres) y reemplaza sus filas y
+    columnas en las soluciones guardadas; los demás clusteres conservan su
+    solución.
+
+    Parámetros:
+        comida_per_capita: toneladas de comida por persona al día
+        cambios: DataFrame con las columnas tipo_de_datos, modelo y cluster,
+            por defecto resultados/tablas/clusteres/cambios.csv
+        tiempo_maximo: tiempo máximo de la solución de cada cluster en segundos
+        preproceso: reducir los candidatos de cada cluster antes de resolverlo
+
+    Actualiza resultados/tablas/solucionar_cflp/soluciones/{tipo_de_datos}-{modelo}.xlsx
+    """
+    if cambios is None:
+        cambios = pd.read_csv("resultados/tablas/clusteres/cambios.csv")
+    datos, matriz_de_costos = leer_datos_solucion_cflp(comida_per_capita)
+    for (key, modelo), clusteres in cambios.groupby(["tipo_de_datos", "modelo"]):
+        archivo = f"resultados/tablas/solucionar_cflp/soluciones/{key}-{modelo}.xlsx"
+        if not os.path.exists(archivo):
+            print(f"    No hay una solución guardada de {key}-{modelo}")
+            continue
+        value = datos[key]
+        cambiados = value[value[modelo].isin(clusteres["cluster"])]
+        print(
+            f"Resolviendo {clusteres['cluster'].nunique()} de "
+            f"{value[modelo].nunique()} clusteres de {modelo} para {key}"
+        )
+        resultados_de_cluster, df_y_nuevo, df_x_nuevo = solucion_clusterizada(
+            tiempo_maximo, key, cambiados, matriz_de_costos[key], modelo, preproceso
+        )
+        df_x = pd.read_excel(archivo, sheet_name="X", index_col=0)
+        df_y = pd.read_excel(archivo, sheet_name="Y", index_col=0)
+        df_x = df_x.reindex(index=value.index, columns=value.index)
+        df_y = df_y.reindex(value.index)
+        # los flujos viejos de los municipios de los clusteres cambiados se borran
+        miembros = cambiados.index
+        df_x.loc[miembros, :] = np.nan
+        df_x.loc[:, miembros] = np.nan
+        df_x.loc[miembros, miembros] = df_x_nuevo.loc[miembros, miembros].astype(float)
+        for columna in df_y.columns:
+            df_y.loc[miembros, columna] = df_y_nuevo.loc[miembros, columna].astype(df_y[columna].dtype)
+        with pd.ExcelWriter(archivo) as writer:
+            df_x.to_excel(writer, sheet_name="X")
+            df_y.to_excel(writer, sheet_name="Y")
+        print(f"    Costo de los clusteres resueltos: {sum(resultados_de_cluster['costo_total']):,.0f}")
@@ -8,17 +8,29 @@ from math import ceil, floor, sqrt
 import numpy as np
 import pandas as pd
 
-from sklearn.cluster import KMeans, AgglomerativeClustering, DBSCAN
-from sklearn.metrics import (
-    silhouette_score,
-    calinski_harabasz_score,
-    davies_bouldin_score,
+from sklearn.cluster import KMeans, AgglomerativeClustering
+
+from ai_or_workflow.ai.clustering import (
+    BatchSOM,
+    ClusterMetrics,
+    HaversineDBSCAN,
+    OnlineClustering,
+    RoadLinkage,
+    best_partitions,
+    clustering_grid,
 )
-from sklearn_som.som import SOM
+
+# Capacidad y precio de cada tipo de datos (capacidad_y_costo.py)
+CAPACIDAD_Y_COSTO = {
+    "datos_completos": "resultados/tablas/capacidad_y_costo/demanda_completa.csv",
+    "datos_imperfectos": "resultados/tablas/capacidad_y_costo/demanda_imperfecta.csv",
+}
 
 
 # Generar los grupos de clusteres
-def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6):
+def generar_clusteres(
+    random_seed, n_cluster_completo=6, n_cluster_imperfecto=6, tamano_de_muestra=None
+):
     """
     Función que toma los datos de municipios, latitud y longitud,
     y los clusteriza en grupos de municipios que se encuentran
@@ -30,7 +42,10 @@ def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6)
         3. Agrupamiento Jerárquico
         4. DBSCAN
 
-    Reporta las métricas de calidad de los clusteres generados.
+    Reporta las métricas de calidad de los clusteres generados. Las
+    distancias entre municipios se calculan una vez por tipo de datos y se
+    reusan en todos los modelos, y la silueta también se calcula sobre la
+    matriz de distancias por carretera (silhouette_score_vial).
     Guarda los resultados en la carpeta /resultados/tablas/clusteres/
 
     para los datos_completos y los datos_imperfectos.
@@ -40,6 +55,10 @@ def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6)
     ----------
     random_seed : int
         Semilla para la generación de números aleatorios.
+    tamano_de_muestra : int, optional
+        Si se da, la silueta se estima con una muestra estratificada por
+        cluster de ese tamaño, con su intervalo de confianza del 95%
+        (columnas silhouette_score_inferior y silhouette_score_superior).
     """
     archivos_a_generar = [
         "resultados/tablas/clusteres/metricas-datos_completos.csv",
@@ -68,6 +87,18 @@ def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6)
         print(f"Generando clusteres para {key}")
         # 2. Definir los modelos
         modelos = modelos_de_clusteres(n_cluster[key], random_seed)
+        # distancias calculadas una sola vez para todos los modelos
+        metricas_lat_lon = ClusterMetrics(
+            value[["lat", "lon"]].values,
+            full_matrix=tamano_de_muestra is None,
+            random_state=random_seed,
+        )
+        distancias = pd.read_csv(f"data/{key}/matriz-de-distancias.csv", index_col=0)
+        distancias.columns = distancias.columns.astype(int)
+        metricas_vial = ClusterMetrics(
+            distances=distancias.loc[value.index, value.index].values,
+            random_state=random_seed,
+        )
         # 3. Generar las columnas de clusteres |divipola|kmeans|som|agglomerative|dbscan|
         progreso = 0
         metricas = {
@@ -75,6 +106,9 @@ def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6)
             "cantidad_de_clusteres": [],
             "tamanos_de_clusteres": [],
             "silhouette_score": [],
+            "silhouette_score_inferior": [],
+            "silhouette_score_superior": [],
+            "silhouette_score_vial": [],
             "calinski_harabasz_score": [],
             "davies_bouldin_score": [],
             "tiempo": [],
@@ -94,14 +128,25 @@ def generar_clusteres(random_seed, n_cluster_completo=6, n_cluster_imperfecto=6)
             metricas["tamanos_de_clusteres"].append(
                 value[f"{key_modelo}"].value_counts().values
             )
-            metricas["silhouette_score"].append(
-                silhouette_score(value[["lat", "lon"]], value[f"{key_modelo}"])
+            clusteres = value[f"{key_modelo}"].values
+            if tamano_de_muestra is None:
+                silueta = metricas_lat_lon.silhouette(clusteres)
+                intervalo = (silueta, silueta)
+            else:
+                silueta, *intervalo = metricas_lat_lon.sampled_silhouette(
+                    clusteres, tamano_de_muestra
+                )
+            metricas["silhouette_score"].append(silueta)
+            metricas["silhouette_score_inferior"].append(intervalo[0])
+            metricas["silhouette_score_superior"].append(intervalo[1])
+            metricas["silhouette_score_vial"].append(
+                metricas_vial.silhouette(clusteres)
             )
             metricas["calinski_harabasz_score"].append(
-                calinski_harabasz_score(value[["lat", "lon"]], value[f"{key_modelo}"])
+                metricas_lat_lon.calinski_harabasz(clusteres)
             )
             metricas["davies_bouldin_score"].append(
-                davies_bouldin_score(value[["lat", "lon"]], value[f"{key_modelo}"])
+                metricas_lat_lon.davies_bouldin(clusteres)
             )
             metricas["tiempo"].append(tiempo_final - tiempo_inicial)
 
@@ -123,7 +168,7 @@ def modelos_de_clusteres(n_cluster, random_seed):
         1. k-means
         2. Mapa Autoorganizado
         3. Agrupamiento Jerárquico
-        4. DBSCAN
+        4. DBSCAN, con distancias haversine y eps en kilómetros
 
     Parámetros
     ----------
@@ -139,14 +184,15 @@ def modelos_de_clusteres(n_cluster, random_seed):
     """
     modelos = {
         "kmeans": KMeans(n_clusters=n_cluster, random_state=random_seed),
-        "som": SOM(
+        "som": BatchSOM(
             m=floor(sqrt(n_cluster)),
             n=ceil(sqrt(n_cluster)),
             dim=2,
             random_state=random_seed,
         ),
         "agglomerative": AgglomerativeClustering(n_clusters=n_cluster),
-        "dbscan": DBSCAN(eps=0.5, min_samples=int(n_cluster / 2)),
+        # 50 km, cerca de los 0.5 grados de la versión en coordenadas crudas
+        "dbscan": HaversineDBSCAN(eps_km=50, min_samples=int(n_cluster / 2)),
     }
     return modelos
 
@@ -154,7 +200,7 @@ def modelos_de_clusteres(n_cluster, random_seed):
 def clusterizar(
     datos: pd.DataFrame,
     key_modelo: str,
-    modelo: KMeans | SOM | AgglomerativeClustering | DBSCAN,
+    modelo: KMeans | BatchSOM | AgglomerativeClustering | HaversineDBSCAN,
 ):
     """
     Función que toma los datos de municipios, latitud y longitud,
@@ -167,8 +213,9 @@ def clusterizar(
         Datos de municipios con las columnas latitud y longitud.
     key_modelo : str
         Nombre del modelo de clusterización.
-    modelo : sklearn.cluster | sklearn_som.som
-        Modelo de clusterización.
+    modelo : sklearn.cluster | BatchSOM | HaversineDBSCAN
+        Modelo de clusterización, de ai_or_workflow.ai.clustering los dos
+        últimos. Los datos deben tener las columnas lat y lon en ese orden.
 
     Retorna
     -------
@@ -181,3 +228,274 @@ def clusterizar(
         modelo.fit(datos.values)
         clusteres = modelo.labels_ # type: ignore
     return pd.Series(clusteres, index=datos.index)
+
+
+def grilla_de_clusteres(random_seed, n_clusters=range(2, 13)):
+    """
+    Configuraciones por defecto del barrido de clusteres: k-means y
+    agrupamiento jerárquico (con enlaces ward, complete y average) para
+    cada cantidad de clusteres, mapas autoorganizados de las grillas más
+    cuadradas y DBSCAN con distancias haversine, varios eps (en kilómetros)
+    y min_samples. Todos los eps de DBSCAN comparten un mismo índice de
+    vecinos (clustering_grid).
+
+    Parámetros
+    ----------
+    random_seed : int
+        Semilla para la generación de números aleatorios.
+    n_clusters : iterable
+        Cantidades de clusteres a probar.
+
+    Retorna
+    -------
+    grilla : list
+        Lista de (modelo, parámetros).
+    """
+    grilla = []
+    for k in n_clusters:
+        grilla.append(
+            ("kmeans", {"n_clusters": k, "random_state": random_seed})
+        )
+        for enlace in ["ward", "complete", "average"]:
+            grilla.append(
+                ("agglomerative", {"n_clusters": k, "linkage": enlace})
+            )
+        grilla.append(
+            (
+                "som",
+                {
+                    "m": floor(sqrt(k)),
+                    "n": ceil(k / floor(sqrt(k))),
+                    "dim": 2,
+                    "random_state": random_seed,
+                },
+            )
+        )
+    # cerca de los 0.1, 0.25, 0.5 y 1 grados de la versión en grados
+    for eps_km in [10, 25, 50, 100]:
+        for min_samples in [3, 5, 10]:
+            grilla.append(
+                ("dbscan", {"eps_km": eps_km, "min_samples": min_samples})
+            )
+    return grilla
+
+
+def barrido_de_clusteres(
+    random_seed, grilla=None, metrica="silhouette", n_trabajadores=None
+):
+    """
+    Ajusta y evalúa todas las combinaciones de (tipo de datos, modelo,
+    hiperparámetros) en un pool de procesos que recibe las coordenadas una
+    sola vez (ai_or_workflow/ai/clustering.py), y marca la mejor partición
+    de cada tipo de datos según la métrica.
+
+    Guarda las etiquetas de todas las configuraciones como columnas int16
+    en /resultados/tablas/clusteres/barrido-{tipo_de_datos}.csv y las
+    métricas en
+    /resultados/tablas/clusteres/metricas-barrido-{tipo_de_datos}.csv
+
+    Parámetros
+    ----------
+    random_seed : int
+        Semilla para la generación de números aleatorios.
+    grilla : list, optional
+        Lista de (modelo, parámetros), por defecto grilla_de_clusteres.
+    metrica : str
+        "silhouette", "calinski_harabasz" o "davies_bouldin".
+    n_trabajadores : int, optional
+        Procesos del pool, por defecto uno por núcleo.
+    """
+    grilla = grilla or grilla_de_clusteres(random_seed)
+    columnas = ["lat", "lon"]
+    datos = {
+        key: pd.read_csv(f"data/{key}/municipios.csv", index_col=0)[columnas]
+        for key in ["datos_completos", "datos_imperfectos"]
+    }
+    print(
+        f"Barrido de {len(grilla)} configuraciones para "
+        f"{len(datos)} tipos de datos"
+    )
+    tiempo_inicial = time.time()
+    registros, etiquetas = clustering_grid(
+        {key: value.values for key, value in datos.items()},
+        grilla,
+        n_workers=n_trabajadores,
+        random_state=random_seed,
+    )
+    print(
+        f"    Barrido terminado en {time.time() - tiempo_inicial:.2f} segundos"
+    )
+    mejores = best_partitions(registros, metrica)
+    for key, value in datos.items():
+        metricas = pd.DataFrame([r for r in registros if r["dataset"] == key])
+        nombres = [
+            f"{r['model']}-"
+            + "-".join(
+                f"{p}={v}"
+                for p, v in r["params"].items()
+                if p != "random_state"
+            )
+            for r in metricas.to_dict("records")
+        ]
+        metricas.insert(0, "configuracion", nombres)
+        metricas["mejor"] = metricas["column"] == mejores[key]["column"]
+        metricas.drop(columns=["dataset", "column"]).to_csv(
+            f"resultados/tablas/clusteres/metricas-barrido-{key}.csv",
+            index=False,
+        )
+        pd.DataFrame(
+            etiquetas[key].T, index=value.index, columns=nombres, dtype=np.int16
+        ).to_csv(f"resultados/tablas/clusteres/barrido-{key}.csv")
+        mejor = nombres[mejores[key]["column"]]
+        print(f"    Mejor partición de {key} por {metrica}: {mejor}")
+
+
+def arbol_vial(key, metodo="complete", simetrizar="mean"):
+    """
+    Árbol de agrupamiento jerárquico sobre la matriz de distancias por
+    carretera (data/{tipo_de_datos}/matriz-de-distancias.csv), que recoge
+    las montañas y ríos que lat y lon ignoran. El árbol se calcula una vez y
+    se guarda en /resultados/tablas/clusteres/
+    arbol-vial-{tipo_de_datos}-{metodo}-{simetrizar}.npz, de él se corta
+    cualquier cantidad de clusteres al instante. Se vuelve a calcular si la
+    matriz es más reciente que el árbol guardado (como el caché de
+    alistamiento.py) o si sus municipios cambiaron.
+
+    Parámetros
+    ----------
+    key : str
+        Tipo de datos (datos_completos o datos_imperfectos).
+    metodo : str
+        Enlace del agrupamiento: "complete", "average", "single" o "weighted".
+        Con "average" y "single" los municipios aislados por carretera
+        quedan solos en un cluster.
+    simetrizar : str
+        Cómo se combinan las distancias de ida y vuelta: "mean", "min" o "max".
+
+    Retorna
+    -------
+    arbol : RoadLinkage
+        Árbol con los cortes en caché.
+    indice : pd.Index
+        Divipola de cada hoja del árbol.
+    """
+    carpeta = "resultados/tablas/clusteres"
+    archivo = f"{carpeta}/arbol-vial-{key}-{metodo}-{simetrizar}.npz"
+    matriz = f"data/{key}/matriz-de-distancias.csv"
+    if os.path.exists(archivo) and os.path.getmtime(
+        archivo
+    ) >= os.path.getmtime(matriz):
+        with np.load(archivo) as guardado:
+            arbol, guardado_indice = guardado["arbol"], guardado["indice"]
+        # solo la primera columna, para comparar los municipios sin leer la
+        # matriz
+        indice = pd.read_csv(matriz, usecols=[0]).iloc[:, 0].astype(int).values
+        if np.array_equal(guardado_indice, indice):
+            return RoadLinkage(method=metodo, tree=arbol), pd.Index(indice)
+        print(f"    Los municipios de {matriz} cambiaron, se recalcula")
+    elif os.path.exists(archivo):
+        print(f"    {matriz} es más reciente que el árbol, se recalcula")
+    distancias = pd.read_csv(matriz, index_col=0)
+    distancias.columns = distancias.columns.astype(int)
+    distancias.index = distancias.index.astype(int)
+    distancias = distancias.loc[distancias.index, distancias.index]
+    arbol = RoadLinkage(distancias.values, method=metodo, symmetrize=simetrizar)
+    np.savez(archivo, arbol=arbol.tree, indice=distancias.index.values)
+    return arbol, distancias.index
+
+
+def divipolas_con_datos(key):
+    """
+    Divipolas con todos los datos que lee leer_datos_solucion_cflp
+    (funciones.py): fila y columna en data/{tipo_de_datos}/matriz-de-costos.csv,
+    coordenadas, pronóstico de población y capacidad y precio. Solo se leen
+    los índices de los archivos.
+
+    Parámetros
+    ----------
+    key : str
+        Tipo de datos (datos_completos o datos_imperfectos).
+
+    Retorna
+    -------
+    pd.Index
+        Divipolas presentes en todos los archivos.
+    """
+    matriz = f"data/{key}/matriz-de-costos.csv"
+    indice = pd.Index(
+        pd.read_csv(matriz, index_col=0, nrows=0).columns.astype(int)
+    )
+    for archivo in [
+        matriz,
+        f"data/{key}/municipios.csv",
+        f"resultados/tablas/pronostico_poblacional/{key}.csv",
+        CAPACIDAD_Y_COSTO[key],
+    ]:
+        indice = indice.intersection(pd.read_csv(archivo, usecols=[0]).iloc[:, 0].astype(int))
+    return indice
+
+
+def actualizar_clusteres(nuevos, reasignar=False):
+    """
+    Añade municipios o centros nuevos a los clusteres ya generados sin
+    volver a ajustar los modelos: cada punto nuevo va al cluster del
+    centroide más cercano y, para kmeans y som, los centroides se mueven
+    como en k-means por mini lotes (ai_or_workflow/ai/clustering.py).
+    Agglomerative y dbscan conservan sus centroides.
+
+    Actualiza /resultados/tablas/clusteres/{tipo_de_datos}.csv y guarda en
+    /resultados/tablas/clusteres/cambios.csv los clusteres de cada modelo
+    que cambiaron, los únicos cuyos cflp hay que volver a resolver
+    (actualizar_solucion_clusterizada).
+
+    Parámetros
+    ----------
+    nuevos : dict
+        DataFrame con las columnas lat y lon, indexado por divipola, de cada
+        tipo de datos. Los que ya están en la tabla se ignoran. Los costos,
+        el pronóstico y la capacidad de cada punto deben estar antes en los
+        datos (divipolas_con_datos); los que no están se omiten con un
+        aviso, porque sin ellos ningún cflp de su cluster se puede resolver.
+    reasignar : bool
+        Mover también los municipios ya agrupados cuyo centroide más cercano
+        cambió (solo kmeans y som).
+
+    Retorna
+    -------
+    cambios : pd.DataFrame
+        Tipo de datos, modelo y cluster de cada cluster que cambió.
+    """
+    cambios = {"tipo_de_datos": [], "modelo": [], "cluster": []}
+    for key, puntos in nuevos.items():
+        archivo = f"resultados/tablas/clusteres/{key}.csv"
+        tabla = pd.read_csv(archivo, index_col=0)
+        puntos = puntos.loc[~puntos.index.isin(tabla.index), ["lat", "lon"]]
+        sin_datos = puntos.index.difference(divipolas_con_datos(key))
+        if len(sin_datos):
+            print(
+                f"    Se omiten {len(sin_datos)} puntos sin costos, pronóstico o "
+                f"capacidad en los datos de {key}: {list(sin_datos)}"
+            )
+            puntos = puntos.drop(sin_datos)
+        print(f"Añadiendo {len(puntos)} puntos a los clusteres de {key}")
+        if puntos.empty:
+            continue
+        filas = puntos.copy()
+        for modelo in ["kmeans", "som", "agglomerative", "dbscan"]:
+            con_centroides = modelo in ["kmeans", "som"]
+            modelo_en_linea = OnlineClustering(
+                tabla[["lat", "lon"]].values,
+                tabla[modelo].values,
+                update_centers=con_centroides,
+                reassign=reasignar and con_centroides,
+            )
+            filas[modelo] = modelo_en_linea.partial_fit(puntos.values)
+            tabla[modelo] = modelo_en_linea.labels[: len(tabla)]
+            for cluster in modelo_en_linea.pop_changed():
+                cambios["tipo_de_datos"].append(key)
+                cambios["modelo"].append(modelo)
+                cambios["cluster"].append(cluster)
+        pd.concat([tabla, filas]).to_csv(archivo)
+    cambios = pd.DataFrame(cambios)
+    cambios.to_csv("resultados/tablas/clusteres/cambios.csv", index=False)
+    return cambios
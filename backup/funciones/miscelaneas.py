@@ -18,6 +18,8 @@ def crear_estructura_de_archivos():
                 municipios.csv (cód, nombres, lat, lon, e historico de población)
                 almacenes.csv (divipol, ubicacion, area, capacidad, precio) [Capacidad en Toneladas]
             /datos_imperfectos **
+            /cache
+                opciones-de-almacenes.npz (tabla larga de opciones por columnas)
         /funciones
             funciones.py
         /resultados
@@ -91,6 +93,7 @@ def crear_estructura_de_archivos():
         os.makedirs("data", exist_ok=True)
         os.makedirs("data/datos_completos", exist_ok=True)
         os.makedirs("data/datos_imperfectos", exist_ok=True)
+        os.makedirs("data/cache", exist_ok=True)
         os.makedirs("funciones", exist_ok=True)
         os.makedirs("resultados", exist_ok=True)
         os.makedirs("resultados/tablas", exist_ok=True)
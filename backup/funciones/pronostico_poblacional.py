@@ -4,9 +4,12 @@
     # 1. Seleccionar los datos Historicos teniendo en cuenta su estructura
     #    divipola | 1985 | ... | 2023
     #    en donde los datos pueden existir o no en los años.
-    # 2. Por Municipio
+    # 2. Modelos vectorizados (regresión lineal, Holt, curvas de crecimiento y
+    #    red de panel) para todos los municipios a la vez.
+    #    Resto de modelos por Municipio
     #    2.1. Seleccionar los datos de los años que existen.
-    #    2.2. Dividir los datos en entrenamiento y prueba. (80% - 20%)
+    #    2.2. Dividir los datos en pliegues de origen móvil (ventanas
+    #         crecientes, se evalúan los años siguientes a cada origen).
     #    2.3. Entrenar los modelos.
     #    2.4. Evaluar los modelos.
     #    2.5. Guardar los resultados.
@@ -15,18 +18,22 @@
     # 5. Guardar los resultados.
 """
 
+import hashlib
+import io
 import os
 import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import joblib
 import numpy as np
 import pandas as pd
+import zstandard
 
 # sklearn
-from sklearn.model_selection import train_test_split
+from sklearn.base import clone
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
-from sklearn.linear_model import LinearRegression
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.svm import SVR
 from sklearn.ensemble import RandomForestRegressor
@@ -35,8 +42,42 @@ from sklearn.neural_network import MLPRegressor
 # warnings
 from sklearn.exceptions import ConvergenceWarning
 
+# modelos vectorizados sobre toda la matriz municipio x año
+from ai_or_workflow.ai.regression import (
+    BatchedGeometricGrowth,
+    BatchedHoltLinearTrend,
+    BatchedLinearRegression,
+    BatchedLogisticGrowth,
+    BatchedMean,
+    PanelPopulationRegressor,
+    batched_regression_metrics,
+    batched_train_test_split,
+    cross_validate_batched,
+    fold_forecast_steps,
+    residual_bootstrap,
+    rolling_origin_split,
+)
+from ai_or_workflow.parallel import limit_threads
+
 warnings.simplefilter(action="ignore", category=ConvergenceWarning)
 
+# Modelos que se entrenan para todos los municipios en una sola operación
+MODELOS_VECTORIZADOS = (
+    BatchedLinearRegression,
+    BatchedHoltLinearTrend,
+    BatchedLogisticGrowth,
+    BatchedGeometricGrowth,
+    PanelPopulationRegressor,
+)
+# Modelos vectorizados que se entrenan con la población sin escalar
+MODELOS_EN_NIVELES = (
+    BatchedMean,
+    BatchedHoltLinearTrend,
+    BatchedLogisticGrowth,
+    BatchedGeometricGrowth,
+    PanelPopulationRegressor,
+)
+
 
 def seleccionar_datos_historicos(datos: pd.DataFrame, anios: range) -> pd.DataFrame:
     """
@@ -60,7 +101,7 @@ def seleccionar_datos_historicos(datos: pd.DataFrame, anios: range) -> pd.DataFr
     return datos
 
 
-def definicion_de_modelos_de_regresion(RANDOM_SEED):
+def definicion_de_modelos_de_regresion(RANDOM_SEED, modo_panel=True):
     """
     Define los modelos de regresión que se van a utilizar en el pronóstico poblacional.
 
@@ -68,6 +109,9 @@ def definicion_de_modelos_de_regresion(RANDOM_SEED):
     -----------
     RANDOM_SEED: int
         Semilla aleatoria.
+    modo_panel: bool
+        Si es True, la red neuronal por municipio se reemplaza por una sola
+        red neuronal de panel entrenada con todos los municipios.
 
     Retorna:
     --------
@@ -82,7 +126,10 @@ def definicion_de_modelos_de_regresion(RANDOM_SEED):
     #     "Redes Neuronales": MLPRegressor(max_iter=1000, random_state=RANDOM_SEED),
     # }
     modelos = {
-        "Multiple Linear Regression": LinearRegression(),
+        "Multiple Linear Regression": BatchedLinearRegression(),
+        "Holt Linear Trend": BatchedHoltLinearTrend(),
+        "Logistic Growth": BatchedLogisticGrowth(),
+        "Geometric Growth": BatchedGeometricGrowth(),
         "Regression Tree": DecisionTreeRegressor(
             max_depth=100,
             min_samples_split=2,
@@ -110,6 +157,13 @@ def definicion_de_modelos_de_regresion(RANDOM_SEED):
             random_state=RANDOM_SEED,
         ),
     }
+    if modo_panel:
+        del modelos["Neural Network for population regression"]
+        # warm_start: cada pliegue de validación y el ajuste final continúan
+        # el entrenamiento de la red del pliegue anterior
+        modelos["Panel Neural Network"] = PanelPopulationRegressor(
+            random_state=RANDOM_SEED, warm_start=True
+        )
     return modelos
 
 
@@ -127,6 +181,161 @@ def registrar_metricas_de_regresion(
     return resultados
 
 
+def definir_pliegues_de_validacion(
+    observados, validacion, RANDOM_SEED, n_pliegues=3, horizonte_de_validacion=3
+):
+    """
+    Define los pliegues de validación de todos los municipios.
+
+    Parámetros:
+    -----------
+    observados: np.ndarray
+        Matriz booleana municipio x año de los datos existentes.
+    validacion: str
+        "origen_movil": ventanas crecientes, cada pliegue entrena con los años
+        anteriores a su origen y evalúa los horizonte_de_validacion
+        siguientes, sin usar años futuros para entrenar.
+        "aleatoria": un solo pliegue con train_test_split (80% - 20%) sobre
+        los años de cada municipio, como en la versión original.
+    RANDOM_SEED: int
+        Semilla aleatoria de la división aleatoria.
+    n_pliegues: int
+        Cantidad de orígenes de la validación de origen móvil.
+    horizonte_de_validacion: int
+        Años evaluados después de cada origen.
+
+    Retorna:
+    --------
+    entrenamiento, prueba: np.ndarray
+        Máscaras booleanas pliegue x municipio x año.
+    """
+    if validacion == "aleatoria":
+        entrenamiento, prueba = batched_train_test_split(
+            observados, test_size=0.2, random_state=RANDOM_SEED
+        )
+        return entrenamiento[None], prueba[None]
+    return rolling_origin_split(
+        observados, n_folds=n_pliegues, horizon=horizonte_de_validacion
+    )
+
+
+def registrar_metricas_vectorizadas(
+    resultados,
+    municipios,
+    predicciones,
+    scaler,
+    departamentos,
+    modelos,
+    pliegues,
+    seleccion=None,
+    pronosticos_de_prueba=None,
+    metricas_por_pliegue=None,
+):
+    """
+    Entrena y evalúa los modelos vectorizados para todos los municipios a la vez.
+
+    Todos los pliegues de todos los municipios se evalúan en una sola
+    operación por modelo (cross_validate_batched). Las métricas de cada
+    municipio se calculan sobre la unión de sus años de prueba, igual que
+    para los modelos que se entrenan municipio por municipio.
+
+    El modelo de panel y las curvas de crecimiento se entrenan sobre la
+    población sin escalar y sus predicciones se escalan con el mismo scaler
+    antes de calcular las métricas.
+
+    Parámetros:
+    -----------
+    resultados: dict
+        Diccionario de resultados de regresión.
+    municipios: pd.DataFrame
+        Datos históricos (escalados) divipola x año.
+    predicciones: pd.DataFrame
+        Datos históricos sin escalar divipola x año.
+    scaler: StandardScaler
+        Escalador ajustado sobre predicciones.
+    departamentos: pd.Series
+        Departamento de cada municipio.
+    modelos: dict
+        Modelos vectorizados.
+    pliegues: tuple
+        Máscaras (entrenamiento, prueba) pliegue x municipio x año de todos
+        los municipios, de definir_pliegues_de_validacion.
+    seleccion: pd.Index | None
+        Municipios a evaluar (predeterminado todos). El modelo de panel
+        siempre se entrena con todos los municipios.
+    pronosticos_de_prueba: dict | None
+        Si se da, guarda por modelo las predicciones de prueba sin escalar
+        (DataFrame divipola x año) para calcular los residuos.
+    metricas_por_pliegue: dict | None
+        Si se da, guarda por modelo los tensores pliegue x municipio de
+        cross_validate_batched ({"Municipio": divipolas, "R2": ..., ...}),
+        que recibe obtencion_de_metricas_de_regresion.
+
+    Retorna:
+    --------
+    dict
+        Diccionario de resultados con las métricas de los modelos vectorizados.
+    """
+    seleccion = municipios.index if seleccion is None else seleccion
+    filas = municipios.index.get_indexer(seleccion)
+    anios = municipios.columns.values
+    Y = municipios.values
+    entrenamiento, prueba = pliegues
+
+    def escalar(y_pred):
+        return (y_pred - scaler.mean_) / scaler.scale_
+
+    for name, modelo in modelos.items():
+        tiempo_inicial = time.time()
+        if isinstance(modelo, PanelPopulationRegressor):
+            puntajes, y_pred = cross_validate_batched(
+                modelo,
+                anios,
+                predicciones.values,
+                entrenamiento,
+                prueba,
+                y_true=Y,
+                transform=escalar,
+                groups=departamentos.values,
+            )
+            puntajes = {k: v[:, filas] for k, v in puntajes.items()}
+            y_pred = y_pred[filas]
+        elif isinstance(modelo, MODELOS_EN_NIVELES):
+            # curvas de crecimiento: se ajustan sobre la población y se
+            # evalúan en la misma escala que el resto de modelos
+            puntajes, y_pred = cross_validate_batched(
+                modelo,
+                anios,
+                predicciones.values[filas],
+                entrenamiento[:, filas],
+                prueba[:, filas],
+                y_true=Y[filas],
+                transform=escalar,
+            )
+        else:
+            puntajes, y_pred = cross_validate_batched(
+                modelo, anios, Y[filas], entrenamiento[:, filas], prueba[:, filas]
+            )
+        if metricas_por_pliegue is not None:
+            metricas_por_pliegue[name] = {"Municipio": seleccion, **puntajes}
+        metricas = batched_regression_metrics(
+            Y[filas], y_pred, mask=prueba[:, filas].any(axis=0)
+        )
+        if pronosticos_de_prueba is not None:
+            pronosticos_de_prueba[name] = pd.DataFrame(
+                y_pred * scaler.scale_ + scaler.mean_, index=seleccion, columns=anios
+            )
+        tiempo_por_municipio = (time.time() - tiempo_inicial) / len(filas)
+
+        resultados["Modelo"].extend([name] * len(filas))
+        resultados["Municipio"].extend(seleccion)
+        for metrica in ["R2", "MAE", "MSE", "RMSE"]:
+            resultados[metrica].extend(metricas[metrica])
+        resultados["tiempo"].extend([tiempo_por_municipio] * len(filas))
+
+    return resultados
+
+
 def registrar_metrica_predeterminada(resultados, divipola):
     resultados["Modelo"].append("Promedio")
     resultados["Municipio"].append(divipola)
@@ -148,15 +357,315 @@ def entrenamiento_regresion(X_train, X_test, y_train, modelo):
     return tiempo_inicial, y_pred, tiempo_final
 
 
-def obtencion_de_metricas_de_regresion(resultados):
+def preparar_tareas_de_regresion(municipios, modelos, entrenamiento, prueba):
+    """
+    Crea una tarea por (municipio, modelo) con los pliegues de validación del
+    municipio.
+
+    Parámetros:
+    -----------
+    municipios: pd.DataFrame
+        Datos históricos (escalados) divipola x año.
+    modelos: dict
+        Modelos de regresión que se entrenan municipio por municipio.
+    entrenamiento, prueba: np.ndarray
+        Máscaras pliegue x municipio x año de las filas de municipios.
+
+    Retorna:
+    --------
+    list
+        Tareas (divipola, nombre, pliegues), con un (X_train, X_test, y_train,
+        y_test) por pliegue, None en los pliegues sin datos de entrenamiento o
+        de prueba del municipio.
+    """
+    anios = municipios.columns.values
+    tareas = []
+    for fila, (divipola, municipio) in enumerate(municipios.iterrows()):
+        cantidad = municipio.notna().sum()
+        if cantidad < 5:
+            print(
+                f"El municipio {divipola} no tiene suficientes datos,\
+            con {cantidad} años"
+            )
+        pliegues = []
+        for en_entrenamiento, en_prueba in zip(
+            entrenamiento[:, fila], prueba[:, fila]
+        ):
+            if not en_entrenamiento.any() or not en_prueba.any():
+                pliegues.append(None)
+                continue
+            pliegues.append(
+                (
+                    anios[en_entrenamiento].reshape(-1, 1),
+                    anios[en_prueba].reshape(-1, 1),
+                    municipio.values[en_entrenamiento],
+                    municipio.values[en_prueba],
+                )
+            )
+        if all(pliegue is None for pliegue in pliegues):
+            continue
+        for name in modelos:
+            tareas.append((divipola, name, pliegues))
+    return tareas
+
+
+# Modelos disponibles en cada proceso del pool, se envían una sola vez
+_modelos_del_trabajador = {}
+
+
+def inicializar_trabajador_de_regresion(modelos, hilos_blas):
+    """
+    Inicializa un proceso del pool: limita los hilos de BLAS/OpenMP para que
+    los procesos no compitan por los núcleos y guarda los modelos a entrenar.
+    """
+    limit_threads(hilos_blas)
+    warnings.simplefilter(action="ignore", category=ConvergenceWarning)
+    _modelos_del_trabajador.update(modelos)
+
+
+def entrenar_lote_de_regresion(lote, modelos=None):
+    """
+    Entrena un lote de tareas (municipio, modelo).
+
+    Cada tarea entrena un clon del modelo con su random_state original, por lo
+    que el resultado no depende del proceso ni del orden en que se ejecute.
+    El mismo clon se reentrena en cada pliegue del municipio; las redes
+    neuronales continúan el entrenamiento del pliegue anterior (warm_start)
+    en lugar de empezar de cero, los árboles y las SVR no tienen un ajuste
+    incremental y se reentrenan. Las predicciones de prueba de todos los
+    pliegues se evalúan juntas y, además, cada pliegue por separado.
+
+    Retorna:
+    --------
+    list
+        (divipola, y_test, nombre, tiempo_inicial, y_pred, tiempo_final,
+        anios_de_prueba, metricas_por_pliegue) por tarea, con las métricas
+        de cada pliegue ({"R2": np.ndarray, ...}, NaN en los pliegues vacíos).
+    """
+    modelos = _modelos_del_trabajador if modelos is None else modelos
+    salida = []
+    for divipola, name, pliegues in lote:
+        modelo = clone(modelos[name])
+        if isinstance(modelo, MLPRegressor):
+            modelo.set_params(warm_start=True)
+        tiempo_inicial = time.time()
+        y_test, y_pred = [], []
+        validos = [pliegue for pliegue in pliegues if pliegue is not None]
+        for X_train, X_test, y_train, y_test_pliegue in validos:
+            _, y_pred_pliegue, _ = entrenamiento_regresion(
+                X_train, X_test, y_train, modelo
+            )
+            y_test.append(y_test_pliegue)
+            y_pred.append(y_pred_pliegue)
+        tiempo_final = time.time()
+        # pliegue x año de prueba, rellenado con NaN
+        largo = max(len(y) for y in y_test)
+        pliegue_real = np.full((len(pliegues), largo), np.nan)
+        pliegue_pred = np.full((len(pliegues), largo), np.nan)
+        k = 0
+        for fila, pliegue in enumerate(pliegues):
+            if pliegue is not None:
+                pliegue_real[fila, : len(y_test[k])] = y_test[k]
+                pliegue_pred[fila, : len(y_pred[k])] = y_pred[k]
+                k += 1
+        salida.append(
+            (
+                divipola,
+                np.concatenate(y_test),
+                name,
+                tiempo_inicial,
+                np.concatenate(y_pred),
+                tiempo_final,
+                np.concatenate([pliegue[1].ravel() for pliegue in validos]),
+                batched_regression_metrics(pliegue_real, pliegue_pred),
+            )
+        )
+    return salida
+
+
+def reportar_progreso(completadas, total, tiempo_inicial):
+    """
+    Imprime una línea con el avance, el tiempo transcurrido y el restante estimado.
+    """
+    transcurrido = time.time() - tiempo_inicial
+    restante = transcurrido / completadas * (total - completadas)
+    print(
+        f"    Progreso: {completadas/total*100:6.2f}% ({completadas}/{total} ajustes)"
+        f" | transcurrido: {transcurrido:7.1f} s | restante: ~{restante:7.1f} s"
+    )
+
+
+def entrenar_modelos_en_paralelo(
+    resultados,
+    tareas,
+    modelos,
+    n_trabajadores=None,
+    tamano_de_lote=32,
+    intervalo_de_reporte=10,
+    pronosticos_de_prueba=None,
+    metricas_por_pliegue=None,
+):
+    """
+    Entrena las tareas (municipio, modelo) en un pool de procesos.
+
+    Las tareas se agrupan en lotes para reducir el costo de comunicación.
+    El progreso se reporta a medida que termina cada lote, pero las
+    métricas se registran al final en el orden de los lotes, para que los
+    resultados (y el desempate de la selección del mejor modelo) no
+    dependan de la cantidad de procesos.
+
+    Parámetros:
+    -----------
+    resultados: dict
+        Diccionario de resultados de regresión.
+    tareas: list
+        Tareas creadas por preparar_tareas_de_regresion.
+    modelos: dict
+        Modelos de regresión a entrenar.
+    n_trabajadores: int | None
+        Cantidad de procesos (predeterminado os.cpu_count()). Con 1 se entrena
+        en el proceso actual.
+    tamano_de_lote: int
+        Cantidad de tareas por lote.
+    intervalo_de_reporte: float
+        Segundos mínimos entre dos reportes de progreso.
+    pronosticos_de_prueba: dict | None
+        Si se da, guarda por modelo las predicciones de prueba (escaladas)
+        como {nombre: {divipola: pd.Series año -> predicción}}.
+    metricas_por_pliegue: dict | None
+        Si se da, guarda por modelo los tensores pliegue x municipio de las
+        métricas, como registrar_metricas_vectorizadas.
+
+    Retorna:
+    --------
+    dict
+        Diccionario de resultados con las métricas de todas las tareas.
+    """
+    n_trabajadores = n_trabajadores or os.cpu_count() or 1
+    lotes = [
+        tareas[i : i + tamano_de_lote] for i in range(0, len(tareas), tamano_de_lote)
+    ]
+    tiempo_inicial = time.time()
+    ultimo_reporte = tiempo_inicial
+    completadas = 0
+
+    por_pliegue = {}
+
+    def registrar(salida):
+        for tarea in salida:
+            divipola, y_test, name, t_inicial, y_pred, t_final, anios, pliegues = tarea
+            registrar_metricas_de_regresion(
+                resultados, divipola, y_test, name, t_inicial, y_pred, t_final
+            )
+            if pronosticos_de_prueba is not None:
+                pronosticos_de_prueba.setdefault(name, {})[divipola] = pd.Series(
+                    y_pred, index=anios
+                )
+            por_pliegue.setdefault(name, []).append((divipola, pliegues))
+
+    if n_trabajadores == 1:
+        salidas = (entrenar_lote_de_regresion(lote, modelos) for lote in lotes)
+        for salida in salidas:
+            registrar(salida)
+            completadas += len(salida)
+            if time.time() - ultimo_reporte >= intervalo_de_reporte:
+                reportar_progreso(completadas, len(tareas), tiempo_inicial)
+                ultimo_reporte = time.time()
+    else:
+        hilos_blas = max(1, (os.cpu_count() or 1) // n_trabajadores)
+        with ProcessPoolExecutor(
+            max_workers=n_trabajadores,
+            initializer=inicializar_trabajador_de_regresion,
+            initargs=(modelos, hilos_blas),
+        ) as pool:
+            futuros = {
+                pool.submit(entrenar_lote_de_regresion, lote): k
+                for k, lote in enumerate(lotes)
+            }
+            salidas = [None] * len(lotes)
+            for futuro in as_completed(futuros):
+                salidas[futuros[futuro]] = futuro.result()
+                completadas += len(salidas[futuros[futuro]])
+                if time.time() - ultimo_reporte >= intervalo_de_reporte:
+                    reportar_progreso(completadas, len(tareas), tiempo_inicial)
+                    ultimo_reporte = time.time()
+        for salida in salidas:
+            registrar(salida)
+    if tareas:
+        reportar_progreso(completadas, len(tareas), tiempo_inicial)
+    if metricas_por_pliegue is not None:
+        for name, filas in por_pliegue.items():
+            metricas_por_pliegue[name] = {
+                "Municipio": pd.Index([divipola for divipola, _ in filas]),
+                **{
+                    metrica: np.column_stack(
+                        [pliegues[metrica] for _, pliegues in filas]
+                    )
+                    for metrica in ["R2", "MAE", "MSE", "RMSE"]
+                },
+            }
+    return resultados
+
+
+def obtencion_de_metricas_de_regresion(resultados, metricas_por_pliegue=None):
+    """
+    Filtra los modelos con R2 > 0.8 y escoge el de mayor R2 de cada municipio.
+
+    Parámetros:
+    -----------
+    resultados: dict | pd.DataFrame
+        Métricas sobre la unión de los años de prueba de cada (municipio,
+        modelo).
+    metricas_por_pliegue: dict | None
+        Tensores pliegue x municipio de cada modelo
+        ({"Municipio": divipolas, "R2": ..., ...}), de
+        registrar_metricas_vectorizadas y entrenar_modelos_en_paralelo. Se
+        añaden el promedio y la desviación del R2 entre pliegues, que miden
+        qué tan estable es cada modelo entre orígenes.
+
+    Retorna:
+    --------
+    resultados: pd.DataFrame
+        Resultados filtrados con el mejor modelo de cada municipio.
+    reporte_de_resultados: pd.DataFrame
+        Resumen de las métricas por modelo.
+    """
     resultados = pd.DataFrame(resultados)
-    resultados = resultados[
+    if metricas_por_pliegue:
+        estabilidad = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "Modelo": name,
+                        "Municipio": tensores["Municipio"],
+                        "R2_pliegues_media": np.nanmean(tensores["R2"], axis=0),
+                        "R2_pliegues_std": np.nanstd(tensores["R2"], axis=0),
+                    }
+                )
+                for name, tensores in metricas_por_pliegue.items()
+            ]
+        )
+        resultados = resultados.merge(
+            estabilidad, on=["Modelo", "Municipio"], how="left"
+        )
+    validos = resultados[
         resultados["R2"] > 0.8
     ]  # Seleccionar los resultados con R2 mayor a 0.9
+    # los municipios sin ningún modelo válido conservan los modelos que se
+    # pudieron evaluar (o el promedio si ninguno se pudo evaluar)
+    sin_modelo = ~resultados["Municipio"].isin(validos["Municipio"])
+    respaldo = resultados[
+        sin_modelo & (resultados["R2"].notna() | (resultados["Modelo"] == "Promedio"))
+    ]
+    resultados = pd.concat([validos, respaldo])
     resultados["mejor_modelo"] = resultados.groupby("Municipio")["R2"].transform("max")
-    resultados["mejor_modelo_nombre"] = resultados.groupby("Municipio")[
-        "Modelo"
-    ].transform(lambda x: x[x.idxmax()])
+    # nombre del modelo con mayor R2 de cada municipio
+    mejor_modelo_nombre = (
+        resultados.sort_values("R2", ascending=False, kind="stable")
+        .groupby("Municipio")["Modelo"]
+        .first()
+    )
+    resultados["mejor_modelo_nombre"] = resultados["Municipio"].map(mejor_modelo_nombre)
 
     reporte_de_resultados = resultados.groupby("Modelo").agg(
         {
@@ -168,40 +677,188 @@ def obtencion_de_metricas_de_regresion(resultados):
             "MSE": ["min", "max", "mean", "std"],
             "RMSE": ["min", "max", "mean", "std"],
             "tiempo": ["min", "max", "mean", "std"],
+            **(
+                {"R2_pliegues_media": ["mean"], "R2_pliegues_std": ["mean"]}
+                if "R2_pliegues_std" in resultados
+                else {}
+            ),
         }
     )
 
     return resultados, reporte_de_resultados
 
 
+def calcular_hash_de_historia(municipios: pd.DataFrame) -> pd.Series:
+    """
+    Calcula un hash por municipio de su historia de población.
+
+    El hash incluye los años, de manera que la publicación de un año nuevo o
+    la corrección de un valor cambian el hash del municipio.
+
+    Parámetros:
+    -----------
+    municipios: pd.DataFrame
+        Datos históricos sin escalar divipola x año.
+
+    Retorna:
+    --------
+    pd.Series
+        Hash hexadecimal por divipola.
+    """
+    anios = np.asarray(municipios.columns, dtype=np.int64).tobytes()
+    valores = np.nan_to_num(municipios.to_numpy(dtype=np.float64), nan=-1.0)
+    return pd.Series(
+        [hashlib.sha256(anios + fila.tobytes()).hexdigest() for fila in valores],
+        index=municipios.index,
+        name="hash",
+    )
+
+
+def calcular_las_mejores_predicciones(
+    predicciones, mejor_modelo, modelos, departamentos=None, horizontes=(2034,)
+):
+    """
+    Ajusta el mejor modelo de cada municipio con toda su historia y pronostica
+    la población en los años de los horizontes.
+
+    Parámetros:
+    -----------
+    predicciones: pd.DataFrame
+        Datos históricos sin escalar divipola x año (todos los municipios).
+    mejor_modelo: pd.Series
+        Nombre del mejor modelo por divipola, solo para los municipios a
+        pronosticar.
+    modelos: dict
+        Modelos de regresión.
+    departamentos: pd.Series | None
+        Departamento de cada municipio, usado por el modelo de panel.
+    horizontes: tuple
+        Años a pronosticar.
+
+    Retorna:
+    --------
+    pronosticos: pd.DataFrame
+        Columnas Poblacion_{año} por divipola de mejor_modelo.
+    parametros: dict
+        Parámetros ajustados por divipola.
+    panel: PanelPopulationRegressor | None
+        Modelo de panel ajustado, si algún municipio lo usa.
+    """
+    horizontes = list(horizontes)
+    pronosticos = pd.DataFrame(
+        np.nan,
+        index=mejor_modelo.index,
+        columns=[f"Poblacion_{anio}" for anio in horizontes],
+    )
+    parametros = {}
+    panel = None
+
+    # Promedio y modelos vectorizados: todos los municipios en una operación
+    seleccion = mejor_modelo.index[mejor_modelo == "Promedio"]
+    medias = predicciones.loc[seleccion].mean(axis=1)
+    pronosticos.loc[seleccion] = np.repeat(
+        medias.values[:, None], len(horizontes), axis=1
+    )
+    parametros.update({divipola: {"media": media} for divipola, media in medias.items()})
+
+    modelos_vectorizados = {
+        name: modelo
+        for name, modelo in modelos.items()
+        if isinstance(modelo, MODELOS_VECTORIZADOS)
+    }
+    for name, modelo in modelos_vectorizados.items():
+        seleccion = mejor_modelo.index[mejor_modelo == name]
+        if not len(seleccion):
+            continue
+        if isinstance(modelo, PanelPopulationRegressor):
+            # el modelo de panel aprende de todos los municipios, no solo de
+            # los seleccionados, por eso se ajusta con la matriz completa
+            modelo.fit(
+                predicciones.columns.values,
+                predicciones.values,
+                groups=None if departamentos is None else departamentos.values,
+            )
+            filas = predicciones.index.get_indexer(seleccion)
+            pronosticos.loc[seleccion] = modelo.predict(horizontes)[filas]
+            parametros.update({divipola: {"panel": name} for divipola in seleccion})
+            panel = modelo
+        else:
+            modelo.fit(predicciones.columns.values, predicciones.loc[seleccion].values)
+            pronosticos.loc[seleccion] = modelo.predict(horizontes)
+            for fila, divipola in enumerate(seleccion):
+                parametros[divipola] = {"modelo": modelo.take([fila])}
+
+    # Resto de modelos: un ajuste por municipio
+    por_ajustar = mejor_modelo[
+        (mejor_modelo != "Promedio") & ~mejor_modelo.isin(list(modelos_vectorizados))
+    ]
+    for divipola, name in por_ajustar.items():
+        prediccion = predicciones.loc[divipola].dropna()
+        X = prediccion.index.values.reshape(-1, 1)
+        y = prediccion.values
+        modelo = clone(modelos[name]).fit(X, y)
+        pronosticos.loc[divipola] = modelo.predict(np.reshape(horizontes, (-1, 1)))
+        parametros[divipola] = modelo
+
+    return pronosticos, parametros, panel
+
+
+def predecir_con_parametros(parametros, horizontes, panel=None, indice_panel=None):
+    """
+    Pronostica con parámetros ya ajustados, sin volver a entrenar.
+
+    Parámetros:
+    -----------
+    parametros: dict
+        Parámetros por divipola generados por calcular_las_mejores_predicciones.
+    horizontes: list
+        Años a pronosticar.
+    panel: PanelPopulationRegressor | None
+        Modelo de panel guardado.
+    indice_panel: pd.Index | None
+        Divipolas de las filas con las que se ajustó el modelo de panel.
+
+    Retorna:
+    --------
+    pd.DataFrame
+        Columnas Poblacion_{año} por divipola.
+    """
+    horizontes = np.asarray(horizontes, dtype=float)
+    pronosticos = pd.DataFrame(
+        np.nan,
+        index=list(parametros),
+        columns=[f"Poblacion_{int(anio)}" for anio in horizontes],
+    )
+    en_panel = [d for d, p in parametros.items() if isinstance(p, dict) and "panel" in p]
+    if en_panel and panel is not None:
+        filas = indice_panel.get_indexer(en_panel)
+        pronosticos.loc[en_panel] = panel.predict(horizontes)[filas]
+    for divipola, parametro in parametros.items():
+        if not isinstance(parametro, dict):
+            prediccion = parametro.predict(horizontes.reshape(-1, 1))
+        elif "media" in parametro:
+            prediccion = np.full(len(horizontes), parametro["media"])
+        elif "modelo" in parametro:
+            prediccion = parametro["modelo"].predict(horizontes)[0]
+        else:
+            continue
+        pronosticos.loc[divipola] = prediccion
+    return pronosticos
+
+
 def generar_las_mejores_predicciones_por_municipio(
-    id_data, predicciones, resultados, modelos
+    id_data, predicciones, resultados, modelos, departamentos=None, horizontes=(2034,)
 ):
     municipios_con_mejor_modelo = resultados.groupby("Municipio")[
         "mejor_modelo_nombre"
     ].first()
-    # Sacar la prediccion de la poblacion en 2034 usando el mejor modelo
-
-    prediccion_2034 = {}
-    for divipola, prediccion in predicciones.iterrows():
-        prediccion = prediccion.dropna()
-        X = prediccion.index.values.reshape(-1, 1) 
-        y = prediccion.values
-        mejor_modelo_para_municipio = municipios_con_mejor_modelo.loc[
-            municipios_con_mejor_modelo.index == divipola
-        ].values[0]
-        if mejor_modelo_para_municipio == "Promedio":
-            prediccion_2034[divipola] = y.mean()
-            continue
-        modelo = modelos[mejor_modelo_para_municipio]
-        modelo.fit(X, y)
-        prediccion_2034[divipola] = modelo.predict([[2034]])[0]
-
-    prediccion_2034 = pd.Series(prediccion_2034)
-    prediccion_2034.name = "Poblacion_2034"
-    prediccion_2034 = pd.DataFrame(prediccion_2034)
-    prediccion_2034.index.name = "Divipola"
-    prediccion_2034.to_csv(f"resultados/tablas/pronostico_poblacional/{id_data}.csv")
+    # Sacar la prediccion de la poblacion en los horizontes usando el mejor modelo
+    mejor_modelo = municipios_con_mejor_modelo.reindex(predicciones.index)
+    pronosticos, _, _ = calcular_las_mejores_predicciones(
+        predicciones, mejor_modelo, modelos, departamentos, horizontes
+    )
+    pronosticos.index.name = "Divipola"
+    pronosticos.to_csv(f"resultados/tablas/pronostico_poblacional/{id_data}.csv")
     return municipios_con_mejor_modelo
 
 
@@ -220,27 +877,457 @@ def guardar_metricas_y_reportes_de_regresion(
     )
 
 
-def pronostico_poblacional(RANDOM_SEED):
+def calcular_residuos_de_validacion(
+    predicciones, scaler, mejor_modelo, pronosticos_de_prueba
+):
+    """
+    Calcula los residuos relativos log(y / y_pred) de las predicciones de
+    prueba del mejor modelo de cada municipio.
+
+    Parámetros:
+    -----------
+    predicciones: pd.DataFrame
+        Datos históricos sin escalar divipola x año.
+    scaler: StandardScaler
+        Escalador ajustado sobre predicciones.
+    mejor_modelo: pd.Series
+        Nombre del mejor modelo por divipola.
+    pronosticos_de_prueba: dict
+        Predicciones de prueba por modelo: DataFrame sin escalar para los
+        modelos vectorizados y {divipola: pd.Series} escaladas para el resto.
+
+    Retorna:
+    --------
+    pd.DataFrame
+        Residuos divipola x año de mejor_modelo, NaN fuera de los años de
+        prueba (y para el promedio de la validación aleatoria, que no tiene
+        predicciones de prueba).
+    """
+    anios = predicciones.columns
+    residuos = pd.DataFrame(np.nan, index=mejor_modelo.index, columns=anios)
+    for name, municipios in mejor_modelo.groupby(mejor_modelo).groups.items():
+        if name not in pronosticos_de_prueba:
+            continue
+        prueba = pronosticos_de_prueba[name]
+        if isinstance(prueba, dict):
+            prueba = pd.DataFrame.from_dict(prueba, orient="index").reindex(
+                columns=anios
+            )
+            prueba = prueba * scaler.scale_ + scaler.mean_
+        prueba = prueba.reindex(index=municipios, columns=anios)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            residuos.loc[municipios] = np.log(
+                predicciones.loc[municipios].values / prueba.values
+            )
+    return residuos
+
+
+def guardar_escenarios_de_demanda(ruta, escenarios, divipolas):
+    """
+    Guarda los escenarios como un npz comprimido con zstd.
+
+    Parámetros:
+    -----------
+    ruta: str
+        Ruta del archivo .npz.zst.
+    escenarios: dict
+        Matrices float32 escenario x municipio por columna Poblacion_{año}.
+    divipolas: pd.Index
+        Divipola de cada columna de las matrices.
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, divipola=np.asarray(divipolas), **escenarios)
+    with open(ruta, "wb") as archivo:
+        archivo.write(zstandard.ZstdCompressor(level=10).compress(buffer.getvalue()))
+
+
+def cargar_escenarios_de_demanda(id_data, anio=2034):
+    """
+    Carga los escenarios de demanda de una base de datos.
+
+    Parámetros:
+    -----------
+    id_data: str
+        "datos_completos" o "datos_imperfectos".
+    anio: int
+        Horizonte de los escenarios.
+
+    Retorna:
+    --------
+    escenarios: np.ndarray
+        Matriz float32 escenario x municipio.
+    divipolas: pd.Index
+        Divipola de cada columna.
+    """
+    ruta = f"resultados/tablas/pronostico_poblacional/escenarios-{id_data}.npz.zst"
+    with open(ruta, "rb") as archivo:
+        contenido = zstandard.ZstdDecompressor().decompress(archivo.read())
+    with np.load(io.BytesIO(contenido)) as datos:
+        return datos[f"Poblacion_{anio}"], pd.Index(datos["divipola"], name="Divipola")
+
+
+def generar_escenarios_de_demanda(
+    id_data,
+    pronosticos,
+    residuos,
+    pasos,
+    ultimo_anio_observado,
+    n_escenarios=1000,
+    RANDOM_SEED=None,
+):
+    """
+    Genera escenarios de demanda por bootstrap de los residuos de prueba.
+
+    Cada escenario multiplica el pronóstico de un municipio por exp(e), con e
+    remuestreado de sus residuos relativos y escalado al número de años entre
+    el último dato observado y el horizonte (residual_bootstrap). Se calcula
+    una sola matriz escenario x municipio por horizonte y se guarda en
+        resultados/tablas/pronostico_poblacional/escenarios-{id_data}.npz.zst
+
+    Parámetros:
+    -----------
+    id_data: str
+        Identificador de la base de datos.
+    pronosticos: pd.DataFrame
+        Columnas Poblacion_{año} por divipola.
+    residuos, pasos: pd.DataFrame
+        Residuos relativos y años hacia adelante de cada predicción de
+        prueba, divipola x año.
+    ultimo_anio_observado: pd.Series
+        Último año con datos de cada municipio.
+    n_escenarios: int
+        Cantidad de escenarios.
+    RANDOM_SEED: int
+        Semilla aleatoria.
+    """
+    residuos = residuos.reindex(pronosticos.index)
+    pasos = pasos.reindex(pronosticos.index)
+    escenarios = {}
+    for columna in pronosticos.columns:
+        anio = int(columna.split("_")[-1])
+        escenarios[columna] = residual_bootstrap(
+            pronosticos[columna].values,
+            residuos.values,
+            pasos.values,
+            anio - ultimo_anio_observado.reindex(pronosticos.index).values,
+            n_scenarios=n_escenarios,
+            random_state=RANDOM_SEED,
+        )
+    guardar_escenarios_de_demanda(
+        f"resultados/tablas/pronostico_poblacional/escenarios-{id_data}.npz.zst",
+        escenarios,
+        pronosticos.index,
+    )
+
+
+def pronosticar_base_de_datos(
+    id_data,
+    datos,
+    RANDOM_SEED,
+    n_trabajadores=None,
+    tamano_de_lote=32,
+    modo_panel=True,
+    horizontes=(2034,),
+    validacion="origen_movil",
+    n_pliegues=3,
+    horizonte_de_validacion=3,
+    n_escenarios=1000,
+):
+    """
+    Selecciona el mejor modelo y pronostica la población de una base de datos.
+
+    Los modelos se comparan con los pliegues de definir_pliegues_de_validacion.
+    Con los residuos de prueba del mejor modelo de cada municipio se generan
+    n_escenarios de demanda por horizonte (generar_escenarios_de_demanda).
+
+    Si existen artefactos de una ejecución anterior, solo se vuelven a
+    entrenar los municipios cuyo hash de historia cambió (o que son nuevos);
+    los demás conservan su modelo, parámetros y pronósticos, y las tablas de
+    resultados se actualizan en su lugar. Los horizontes nuevos de los
+    municipios sin cambios se calculan con los parámetros guardados.
+
+    Los artefactos se guardan en
+        resultados/tablas/pronostico_poblacional/artefactos-{id_data}.joblib
+    con el hash, el mejor modelo, los parámetros ajustados, las métricas,
+    los residuos de prueba y los pronósticos por municipio. Si la
+    configuración de la validación cambió, se vuelven a evaluar todos los
+    municipios.
+    """
+    horizontes = list(horizontes)
+    ruta_artefactos = (
+        f"resultados/tablas/pronostico_poblacional/artefactos-{id_data}.joblib"
+    )
+    ultimo_anio = max(int(columna) for columna in datos.columns if str(columna).isdigit())
+    municipios = seleccionar_datos_historicos(datos, range(1985, ultimo_anio + 1))
+    predicciones = municipios.copy()
+    departamentos = datos.loc[municipios.index, "departamento"]
+    hashes = calcular_hash_de_historia(predicciones)
+    ultimo_anio_observado = predicciones.notna().iloc[:, ::-1].idxmax(axis=1)
+    configuracion = {
+        "validacion": validacion,
+        "n_pliegues": n_pliegues,
+        "horizonte_de_validacion": horizonte_de_validacion,
+    }
+
+    artefactos = joblib.load(ruta_artefactos) if os.path.exists(ruta_artefactos) else None
+    if artefactos is not None and (
+        artefactos.get("configuracion") != configuracion or "residuos" not in artefactos
+    ):
+        print("    La configuración de la validación cambió, se evalúan todos los municipios")
+        artefactos = None
+    if artefactos is None:
+        seleccion = municipios.index
+    else:
+        seleccion = hashes.index[hashes.ne(artefactos["hash"].reindex(hashes.index))]
+        eliminados = artefactos["hash"].index.difference(hashes.index)
+        horizontes_nuevos = [
+            anio
+            for anio in horizontes
+            if f"Poblacion_{anio}" not in artefactos["pronosticos"].columns
+        ]
+        print(
+            f"    {len(seleccion)} municipios con historia nueva o modificada, "
+            f"{len(eliminados)} eliminados"
+        )
+        if not len(seleccion) and not len(eliminados) and not horizontes_nuevos:
+            print(f"    El pronóstico de {id_data} está al día")
+            generar_escenarios_de_demanda(
+                id_data,
+                artefactos["pronosticos"],
+                artefactos["residuos"],
+                artefactos["pasos"],
+                ultimo_anio_observado,
+                n_escenarios,
+                RANDOM_SEED,
+            )
+            return
+
+    scaler = StandardScaler()
+    municipios = pd.DataFrame(
+        scaler.fit_transform(municipios),
+        columns=municipios.columns,
+        index=municipios.index,
+    )
+
+    # 2. Por Municipio
+    resultados = {
+        "Modelo": [],
+        "Municipio": [],
+        "R2": [],
+        "MAE": [],
+        "MSE": [],
+        "RMSE": [],
+        "tiempo": [],
+    }
+    modelos = definicion_de_modelos_de_regresion(RANDOM_SEED, modo_panel)
+    pronosticos_de_prueba = {}
+    metricas_por_pliegue = {}
+    pasos = pd.DataFrame(np.nan, index=seleccion, columns=municipios.columns)
+    if len(seleccion):
+        entrenamiento, prueba = definir_pliegues_de_validacion(
+            ~np.isnan(municipios.values),
+            validacion,
+            RANDOM_SEED,
+            n_pliegues,
+            horizonte_de_validacion,
+        )
+        modelos_vectorizados = {
+            name: modelo
+            for name, modelo in modelos.items()
+            if isinstance(modelo, MODELOS_VECTORIZADOS)
+        }
+        # con validación de origen móvil el promedio se evalúa como un modelo
+        # más, en lugar de recibir un R2 fijo
+        modelos_a_evaluar = dict(modelos_vectorizados)
+        if validacion != "aleatoria":
+            modelos_a_evaluar["Promedio"] = BatchedMean()
+        resultados = registrar_metricas_vectorizadas(
+            resultados,
+            municipios,
+            predicciones,
+            scaler,
+            departamentos,
+            modelos_a_evaluar,
+            (entrenamiento, prueba),
+            seleccion=seleccion,
+            pronosticos_de_prueba=pronosticos_de_prueba,
+            metricas_por_pliegue=metricas_por_pliegue,
+        )
+        modelos_por_municipio = {
+            name: modelo
+            for name, modelo in modelos.items()
+            if name not in modelos_vectorizados
+        }
+        filas = municipios.index.get_indexer(seleccion)
+        tareas = preparar_tareas_de_regresion(
+            municipios.loc[seleccion],
+            modelos_por_municipio,
+            entrenamiento[:, filas],
+            prueba[:, filas],
+        )
+        resultados = entrenar_modelos_en_paralelo(
+            resultados,
+            tareas,
+            modelos_por_municipio,
+            n_trabajadores=n_trabajadores,
+            tamano_de_lote=tamano_de_lote,
+            pronosticos_de_prueba=pronosticos_de_prueba,
+            metricas_por_pliegue=metricas_por_pliegue,
+        )
+        pasos.loc[:] = fold_forecast_steps(entrenamiento[:, filas], prueba[:, filas])
+        if validacion == "aleatoria":
+            # añadición de un modelo por defecto que es el promedio de
+            #  los datos validos con valor R2 = 0.9
+            for divipola in seleccion:
+                resultados = registrar_metrica_predeterminada(resultados, divipola)
+    resultados = pd.DataFrame(resultados)
+    if artefactos is not None:
+        anteriores = artefactos["resultados"]
+        anteriores = anteriores[
+            anteriores["Municipio"].isin(hashes.index)
+            & ~anteriores["Municipio"].isin(seleccion)
+        ]
+        resultados = pd.concat([anteriores, resultados], ignore_index=True)
+    resultados_crudos = resultados
+
+    # 3. Sacar las métricas generales por modelo.
+    #     es decir, filtrar los resultados (R2 > 0.9) y
+    resultados, reporte_de_resultados = obtencion_de_metricas_de_regresion(
+        resultados_crudos, metricas_por_pliegue
+    )
+    municipios_con_mejor_modelo = resultados.groupby("Municipio")[
+        "mejor_modelo_nombre"
+    ].first()
+
+    # 4. Escoger el mejor modelo y guardar la predicción
+    pronosticos, parametros, panel = calcular_las_mejores_predicciones(
+        predicciones,
+        municipios_con_mejor_modelo.reindex(seleccion),
+        modelos,
+        departamentos,
+        horizontes,
+    )
+    indice_panel = predicciones.index if panel is not None else None
+    residuos = calcular_residuos_de_validacion(
+        predicciones,
+        scaler,
+        municipios_con_mejor_modelo.reindex(seleccion),
+        pronosticos_de_prueba,
+    )
+    if artefactos is not None:
+        # conservar los municipios sin cambios y completar sus horizontes
+        sin_cambios = hashes.index.difference(seleccion)
+        parametros_sin_cambios = {
+            divipola: artefactos["parametros"][divipola] for divipola in sin_cambios
+        }
+        anteriores = artefactos["pronosticos"].reindex(sin_cambios)
+        faltantes = [
+            anio for anio in horizontes if f"Poblacion_{anio}" not in anteriores.columns
+        ]
+        if faltantes:
+            anteriores = anteriores.join(
+                predecir_con_parametros(
+                    parametros_sin_cambios,
+                    faltantes,
+                    artefactos["panel"] if panel is None else panel,
+                    artefactos["indice_panel"] if panel is None else indice_panel,
+                )
+            )
+        pronosticos = pd.concat([anteriores, pronosticos]).reindex(hashes.index)
+        parametros = {**parametros_sin_cambios, **parametros}
+        residuos = pd.concat(
+            [artefactos["residuos"].reindex(sin_cambios), residuos]
+        ).reindex(hashes.index)
+        pasos = pd.concat([artefactos["pasos"].reindex(sin_cambios), pasos]).reindex(
+            hashes.index
+        )
+        if panel is None:
+            panel, indice_panel = artefactos["panel"], artefactos["indice_panel"]
+
+    pronosticos = pronosticos[[f"Poblacion_{anio}" for anio in horizontes]]
+    pronosticos.index.name = "Divipola"
+    pronosticos.to_csv(f"resultados/tablas/pronostico_poblacional/{id_data}.csv")
+    guardar_metricas_y_reportes_de_regresion(
+        id_data, reporte_de_resultados, municipios_con_mejor_modelo
+    )
+    generar_escenarios_de_demanda(
+        id_data,
+        pronosticos,
+        residuos,
+        pasos,
+        ultimo_anio_observado,
+        n_escenarios,
+        RANDOM_SEED,
+    )
+    joblib.dump(
+        {
+            "hash": hashes,
+            "configuracion": configuracion,
+            "mejor_modelo": municipios_con_mejor_modelo,
+            "parametros": parametros,
+            "panel": panel,
+            "indice_panel": indice_panel,
+            "resultados": resultados_crudos,
+            "residuos": residuos,
+            "pasos": pasos,
+            "pronosticos": pronosticos,
+        },
+        ruta_artefactos,
+    )
+
+
+def pronostico_poblacional(
+    RANDOM_SEED,
+    n_trabajadores=None,
+    tamano_de_lote=32,
+    modo_panel=True,
+    horizontes=(2034,),
+    validacion="origen_movil",
+    n_pliegues=3,
+    horizonte_de_validacion=3,
+    n_escenarios=1000,
+):
     """
     # Esquema general de la experimentación
     # 1. Seleccionar los datos Historicos teniendo en cuenta su estructura
     #    divipola | 1985 | ... | 2023
     #    en donde los datos pueden existir o no en los años.
-    # 2. Por Municipio
+    # 2. Modelos vectorizados (regresión lineal, Holt, curvas de crecimiento y
+    #    red de panel) para todos los municipios a la vez.
+    #    Resto de modelos por Municipio
     #    2.1. Seleccionar los datos de los años que existen.
-    #    2.2. Dividir los datos en entrenamiento y prueba. (80% - 20%)
+    #    2.2. Dividir los datos en pliegues de origen móvil (ventanas
+    #         crecientes, se evalúan los años siguientes a cada origen).
     #    2.3. Entrenar los modelos.
     #    2.4. Evaluar los modelos.
     #    2.5. Guardar los resultados.
     # 3. Sacar las métricas generales por modelo.
     # 4. Escoger el mejor modelo.
-    # 5. Guardar los resultados.
+    # 5. Guardar los resultados y los escenarios de demanda.
+
+    Con validacion="aleatoria" se usa la división original 80% - 20% sobre
+    años mezclados (ver definir_pliegues_de_validacion).
+
+    Los modelos que se entrenan por municipio se reparten en lotes entre
+    n_trabajadores procesos (predeterminado os.cpu_count()). Con modo_panel
+    la red neuronal por municipio se reemplaza por una sola red de panel.
+
+    Si ya existen los artefactos de una ejecución anterior, el pronóstico se
+    actualiza de forma incremental: solo se reentrenan los municipios cuya
+    historia cambió y se actualizan las columnas Poblacion_{año} de los
+    horizontes en su lugar.
     """
     archivos_a_generar = [
         "resultados/tablas/pronostico_poblacional/datos_completos.csv",
         "resultados/tablas/pronostico_poblacional/datos_imperfectos.csv",
     ]
-    if all([os.path.exists(archivo) for archivo in archivos_a_generar]):
+    artefactos = [
+        "resultados/tablas/pronostico_poblacional/artefactos-datos_completos.joblib",
+        "resultados/tablas/pronostico_poblacional/artefactos-datos_imperfectos.joblib",
+    ]
+    if all([os.path.exists(archivo) for archivo in archivos_a_generar]) and not any(
+        [os.path.exists(archivo) for archivo in artefactos]
+    ):
         print("\nEl proceso de pronóstico poblacional ya fue realizado")
         return
     else:
@@ -259,76 +1346,17 @@ def pronostico_poblacional(RANDOM_SEED):
     # 1. Seleccionar los datos Historicos teniendo en cuenta su estructura
     for id_data, datos in bases_de_datos.items():
         print(f"Procesando {id_data}")
-        time.sleep(1)
-        municipios = seleccionar_datos_historicos(datos, range(1985, 2024))
-        predicciones = municipios.copy()
-
-        scaler = StandardScaler()
-        municipios = pd.DataFrame(
-            scaler.fit_transform(municipios),
-            columns=municipios.columns,
-            index=municipios.index,
-        )
-
-        # 2. Por Municipio
-        progreso = 0
-        resultados = {
-            "Modelo": [],
-            "Municipio": [],
-            "R2": [],
-            "MAE": [],
-            "MSE": [],
-            "RMSE": [],
-            "tiempo": [],
-        }
-        modelos = definicion_de_modelos_de_regresion(RANDOM_SEED)
-
-        for divipola, municipio in municipios.iterrows():
-            municipio = municipio.dropna()
-            X = municipio.index.values.reshape(-1, 1)
-            y = municipio.values
-            if len(y) < 5:
-                print(
-                    f"El municipio {divipola} no tiene suficientes datos,\
-                con {len(y)} años"
-                )
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=RANDOM_SEED
-            )
-            for name, modelo in modelos.items():
-                tiempo_inicial, y_pred, tiempo_final = entrenamiento_regresion(
-                    X_train, X_test, y_train, modelo
-                )
-                resultados = registrar_metricas_de_regresion(
-                    resultados,
-                    divipola,
-                    y_test,
-                    name,
-                    tiempo_inicial,
-                    y_pred,
-                    tiempo_final,
-                )
-                # prediccion de la poblacion en 2034 en escalas originales
-                progreso += 1
-                print(
-                    f"Progreso: {progreso/(municipios.shape[0] * len(modelos))*100:0.2f}%",
-                    end="\r",
-                )
-            # añadición de un modelo por defecto que es el promedio de
-            #  los datos validos con valor R2 = 0.9
-            resultados = registrar_metrica_predeterminada(resultados, divipola)
-
-        # 3. Sacar las métricas generales por modelo.
-        #     es decir, filtrar los resultados (R2 > 0.9) y
-        resultados, reporte_de_resultados = obtencion_de_metricas_de_regresion(
-            resultados
-        )
-        # 4. Escoger el mejor modelo y guardar la predicción
-        municipios_con_mejor_modelo = generar_las_mejores_predicciones_por_municipio(
-            id_data, predicciones, resultados, modelos
-        )
-
-        guardar_metricas_y_reportes_de_regresion(
-            id_data, reporte_de_resultados, municipios_con_mejor_modelo
+        pronosticar_base_de_datos(
+            id_data,
+            datos,
+            RANDOM_SEED,
+            n_trabajadores=n_trabajadores,
+            tamano_de_lote=tamano_de_lote,
+            modo_panel=modo_panel,
+            horizontes=horizontes,
+            validacion=validacion,
+            n_pliegues=n_pliegues,
+            horizonte_de_validacion=horizonte_de_validacion,
+            n_escenarios=n_escenarios,
         )
         print(f"Procesamiento de {id_data} terminado")
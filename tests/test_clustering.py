@@ -0,0 +1,137 @@
+"""Tests for the clustering functions against scikit-learn."""
+
+import unittest
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import silhouette_samples, silhouette_score
+
+from ai_or_workflow.ai import clustering
+
+
+def blobs(seed, n_blobs=4, size=40):
+    """Points in degrees around ``n_blobs`` centers in Colombia."""
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack(
+        [rng.uniform(-2, 10, n_blobs), rng.uniform(-76, -70, n_blobs)]
+    )
+    spread = rng.normal(0, 0.3, (n_blobs * size, 2))
+    points = centers.repeat(size, axis=0) + spread
+    noise = np.column_stack(
+        [rng.uniform(-4, 12, 10), rng.uniform(-78, -68, 10)]
+    )
+    return np.vstack([points, noise])
+
+
+def same_partition(first, second):
+    """Whether two labelings group the points alike, noise included."""
+    pairs = set(zip(first, second))
+    return len(pairs) == len(set(first)) == len(set(second)) and np.array_equal(
+        first < 0, second < 0
+    )
+
+
+class TestDensityClustering(unittest.TestCase):
+    def sklearn_labels(self, points, eps_km, min_samples):
+        return (
+            DBSCAN(
+                eps=eps_km / clustering.EARTH_RADIUS_KM,
+                min_samples=min_samples,
+                metric="haversine",
+                algorithm="ball_tree",
+            )
+            .fit(np.radians(points))
+            .labels_
+        )
+
+    def test_matches_sklearn_haversine_dbscan(self):
+        for seed in range(3):
+            points = blobs(seed)
+            lat, lon = points[:, 0], points[:, 1]
+            neighbors = clustering.HaversineNeighbors(lat, lon)
+            for eps, min_samples in [(20, 3), (40, 5), (80, 10)]:
+                labels = clustering.density_clustering(
+                    neighbors, eps, min_samples
+                )
+                expected = self.sklearn_labels(points, eps, min_samples)
+                self.assertTrue(same_partition(labels, expected), (seed, eps))
+
+    def test_sweep_matches_single_radius(self):
+        points = blobs(3)
+        eps_values = [10, 25, 50, 100]
+        neighbors = clustering.HaversineNeighbors(points[:, 0], points[:, 1])
+        sweep = clustering.dbscan_sweep(neighbors, eps_values, 5)
+        for eps_km in eps_values:
+            labels = clustering.HaversineDBSCAN(eps_km, 5).fit(points).labels_
+            np.testing.assert_array_equal(sweep[eps_km], labels)
+
+
+class TestClusterMetrics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.points = blobs(0)
+        self.labels = rng.integers(-1, 5, len(self.points))
+        # a point alone in its cluster scores zero
+        self.labels[0] = 7
+
+    def test_silhouette_matches_sklearn(self):
+        metrics = clustering.ClusterMetrics(self.points)
+        np.testing.assert_allclose(
+            metrics.silhouette_samples(self.labels),
+            silhouette_samples(self.points, self.labels),
+            rtol=0,
+            atol=1e-12,
+        )
+        self.assertAlmostEqual(
+            metrics.silhouette(self.labels),
+            silhouette_score(self.points, self.labels),
+            places=12,
+        )
+
+    def test_rows_on_demand_match_the_full_matrix(self):
+        full = clustering.ClusterMetrics(self.points)
+        rows = clustering.ClusterMetrics(self.points, full_matrix=False)
+        indices = np.arange(0, len(self.points), 7)
+        # the euclidean distances of sklearn expand |x - y|^2 as a dot
+        # product, which rounds differently for a subset of the rows
+        np.testing.assert_allclose(
+            rows.silhouette_samples(self.labels, indices),
+            full.silhouette_samples(self.labels)[indices],
+            rtol=0,
+            atol=1e-6,
+        )
+
+    def test_given_distances_are_symmetrized(self):
+        rng = np.random.default_rng(1)
+        distances = rng.random((len(self.points), len(self.points))) * 100
+        np.fill_diagonal(distances, 0)
+        metrics = clustering.ClusterMetrics(distances=distances)
+        expected = silhouette_score(
+            (distances + distances.T) / 2, self.labels, metric="precomputed"
+        )
+        self.assertAlmostEqual(
+            metrics.silhouette(self.labels), expected, places=12
+        )
+
+
+class TestClusteringGrid(unittest.TestCase):
+    def test_dbscan_sweep_keeps_the_grid_order(self):
+        points = blobs(4)
+        grid = [
+            ("dbscan", {"eps_km": 50, "min_samples": 5}),
+            ("kmeans", {"n_clusters": 3, "random_state": 0}),
+            ("dbscan", {"eps_km": 20, "min_samples": 3}),
+        ]
+        records, labels = clustering.clustering_grid(
+            {"blobs": points}, grid, n_workers=1
+        )
+        self.assertEqual([r["model"] for r in records], [m for m, _ in grid])
+        for column in (0, 2):
+            expected = clustering.HaversineDBSCAN(**grid[column][1]).fit(points)
+            np.testing.assert_array_equal(
+                labels["blobs"][column], expected.labels_
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+"""Tests for the facility location solvers against brute force."""
+
+import importlib
+import itertools
+import unittest
+
+import numpy as np
+from scipy.optimize import linprog
+
+cflp = importlib.import_module("ai_or_workflow.or.logistics.cflp")
+stochastic_cflp = importlib.import_module("ai_or_workflow.or.logistics.stochastic_cflp")
+multiperiod_cflp = importlib.import_module("ai_or_workflow.or.logistics.multiperiod_cflp")
+two_echelon_cflp = importlib.import_module("ai_or_workflow.or.logistics.two_echelon_cflp")
+aggregation = importlib.import_module("ai_or_workflow.or.logistics.aggregation")
+presolve = importlib.import_module("ai_or_workflow.or.logistics.presolve")
+
+
+def random_instance(m, n, seed):
+    """Small CFLP with points in the unit square and tight capacities."""
+    rng = np.random.default_rng(seed)
+    facilities, customers = rng.random((m, 2)), rng.random((n, 2))
+    c = 10 * np.linalg.norm(facilities[:, None] - customers[None], axis=-1)
+    b = rng.integers(1, 10, n).astype(float)
+    a = rng.integers(10, 25, m).astype(float)
+    f = rng.integers(20, 60, m).astype(float)
+    return f, a, b, c, customers
+
+
+def flow_cost(Y, a, b, c):
+    """Cheapest flows of an opening plan, as a dense LP written from scratch."""
+    m, n = c.shape
+    A_ub = np.vstack([
+        -np.tile(np.eye(n), m),
+        np.kron(np.eye(m), np.ones((1, n))),
+    ])
+    b_ub = np.concatenate([-b, a * Y])
+    result = linprog(c.ravel(), A_ub=A_ub, b_ub=b_ub, method="highs")
+    return result.fun if result.status == 0 else np.inf
+
+
+def plans(m):
+    """Every opening plan of ``m`` facilities."""
+    return [np.array(Y, dtype=float) for Y in itertools.product((0, 1), repeat=m)]
+
+
+def brute_force_cflp(f, a, b, c):
+    return min(f @ Y + flow_cost(Y, a, b, c) for Y in plans(len(f)))
+
+
+class TestCFLP(unittest.TestCase):
+    def test_solve_cflp_matches_brute_force(self):
+        for seed in range(3):
+            f, a, b, c, _ = random_instance(5, 8, seed)
+            solution = cflp.solve_cflp(f, a, b, c, mip_rel_gap=0)
+            optimum = brute_force_cflp(f, a, b, c)
+            self.assertAlmostEqual(solution.objective, optimum, places=6)
+            self.assertLessEqual(solution.bound, optimum + 1e-6)
+            self.assertTrue(np.all(solution.X.sum(axis=0) >= b - 1e-6))
+
+    def test_relaxation_is_a_lower_bound(self):
+        f, a, b, c, _ = random_instance(5, 8, 0)
+        relaxed = cflp.solve_cflp(f, a, b, c, relax=True)
+        self.assertLessEqual(relaxed.objective, brute_force_cflp(f, a, b, c) + 1e-6)
+
+
+class TestEvaluatePlans(unittest.TestCase):
+    def test_matches_nearest_open_facility(self):
+        f, a, b, c, _ = random_instance(6, 12, 8)
+        Y = np.array(plans(len(f)))
+        fixed, assignment, violation = cflp.evaluate_plans(Y, f, a, b, c, chunk_size=7)
+        self.assertEqual(assignment[0], np.inf)
+        for k, plan in enumerate(Y[1:], start=1):
+            opened = np.flatnonzero(plan)
+            nearest = opened[np.argmin(c[opened], axis=0)]
+            load = np.bincount(nearest, weights=b, minlength=len(f))
+            self.assertAlmostEqual(fixed[k], f @ plan)
+            self.assertAlmostEqual(assignment[k], b @ c[nearest, np.arange(len(b))])
+            self.assertAlmostEqual(violation[k], np.maximum(load - a, 0).sum())
+
+
+class TestStochasticCFLP(unittest.TestCase):
+    def test_matches_brute_force(self):
+        f, a, b, c, _ = random_instance(5, 6, 3)
+        rng = np.random.default_rng(3)
+        B = b * rng.uniform(0.6, 1.4, (3, len(b)))
+        p = np.array([0.2, 0.5, 0.3])
+        solution = stochastic_cflp.solve_stochastic_cflp(
+            f, a, B, c, p, gap=1e-6, n_workers=1, disp=False
+        )
+        optimum = min(
+            f @ Y + sum(p[s] * flow_cost(Y, a, B[s], c) for s in range(len(B)))
+            for Y in plans(len(f))
+        )
+        self.assertAlmostEqual(solution.objective, optimum, delta=1e-5 * optimum)
+        self.assertLessEqual(solution.bound, optimum * (1 + 1e-6))
+
+
+class TestMultiPeriodCFLP(unittest.TestCase):
+    def test_full_window_matches_brute_force(self):
+        f, a, b, c, _ = random_instance(4, 5, 4)
+        B = np.vstack([0.5 * b, 0.8 * b, 1.2 * b])
+        T, m = len(B), len(f)
+        discount = 0.1
+        weights = (1 + discount) ** -np.arange(T)
+        solution = multiperiod_cflp.solve_multiperiod_cflp(
+            f, a, B, c, window=T, discount=discount, gap=1e-6, n_workers=1, disp=False
+        )
+        # every facility opens in one of the periods or never (T)
+        optimum = np.inf
+        for opening in itertools.product(range(T + 1), repeat=m):
+            opening = np.array(opening)
+            Y = (np.arange(T)[:, None] >= opening[None]).astype(float)
+            cost = sum(weights[opening[i]] * f[i] for i in range(m) if opening[i] < T)
+            cost += sum(weights[t] * flow_cost(Y[t], a, B[t], c) for t in range(T))
+            optimum = min(optimum, cost)
+        self.assertAlmostEqual(solution.objective, optimum, delta=1e-5 * optimum)
+        self.assertTrue(np.all(np.diff(solution.Y, axis=0) >= 0))
+
+
+class TestTwoEchelonCFLP(unittest.TestCase):
+    def test_matches_brute_force(self):
+        f, a, b, c, _ = random_instance(4, 6, 5)
+        rng = np.random.default_rng(5)
+        e = 10 * rng.random((3, len(f)))
+        # two producers that cannot cover the demand alone and one port
+        supply = np.array([0.3 * b.sum(), 0.4 * b.sum(), np.inf])
+        e[2] += 5
+        solution = two_echelon_cflp.solve_two_echelon_cflp(
+            f, a, b, c, e, supply, gap=1e-6, disp=False
+        )
+
+        m, n, O = len(f), len(b), len(supply)
+        limited = np.isfinite(supply)
+
+        def inbound_and_outbound(Y):
+            # variables [X (m x n), Z (O x m)]
+            A_ub = np.vstack([
+                np.hstack([-np.tile(np.eye(n), m), np.zeros((n, O * m))]),
+                np.hstack([np.kron(np.eye(m), np.ones((1, n))), np.zeros((m, O * m))]),
+                np.hstack([np.kron(np.eye(m), np.ones((1, n))), -np.tile(np.eye(m), O)]),
+                np.hstack([np.zeros((O, m * n)), np.kron(np.eye(O), np.ones((1, m)))])[limited],
+            ])
+            b_ub = np.concatenate([-b, a * Y, np.zeros(m), supply[limited]])
+            result = linprog(
+                np.concatenate([c.ravel(), e.ravel()]), A_ub=A_ub, b_ub=b_ub, method="highs"
+            )
+            return result.fun if result.status == 0 else np.inf
+
+        optimum = min(f @ Y + inbound_and_outbound(Y) for Y in plans(m))
+        self.assertAlmostEqual(solution.objective, optimum, delta=1e-5 * optimum)
+        self.assertLessEqual(solution.bound, optimum * (1 + 1e-6))
+
+
+class TestAggregation(unittest.TestCase):
+    def test_bounds_enclose_the_optimum(self):
+        f, a, b, c, customers = random_instance(5, 10, 6)
+        optimum = brute_force_cflp(f, a, b, c)
+        # coordinates in degrees, about 100 km across
+        lat, lon = customers[:, 0], customers[:, 1]
+        for lagrangian_iterations in (0, 300):
+            solution = aggregation.solve_aggregated_cflp(
+                f, a, b, c, lat, lon, n_points=5, mip_rel_gap=0,
+                lagrangian_iterations=lagrangian_iterations,
+            )
+            self.assertLess(len(solution.representatives), len(b))
+            self.assertLessEqual(solution.bound, optimum + 1e-6)
+            self.assertGreaterEqual(solution.objective, optimum - 1e-6)
+            self.assertTrue(np.all(solution.X.sum(axis=0) >= b - 1e-6))
+            self.assertTrue(np.all(solution.X.sum(axis=1) <= a * solution.Y + 1e-6))
+
+    def test_aggregation_error_bounds_the_representative_costs(self):
+        f, a, b, c, customers = random_instance(5, 10, 7)
+        labels, representatives = aggregation.aggregate_demand(
+            customers[:, 0], customers[:, 1], b, n_points=4
+        )
+        error = aggregation.aggregation_error(c, b, labels, representatives)
+        # any flows cost at most ``error`` more when sent to the representatives
+        for Y in plans(len(f))[1:]:
+            _, X, _ = cflp.transportation(Y, a, b, c)
+            if not np.isfinite(X).all() or X.sum() == 0:
+                continue
+            moved = (c[:, representatives[labels]] * X).sum()
+            self.assertLessEqual(moved, (c * X).sum() + error + 1e-6)
+
+
+class TestPresolve(unittest.TestCase):
+    def solve_reduced(self, f, a, b, c, reduction):
+        kept = reduction.candidates
+        return cflp.solve_cflp(f[kept], a[kept], b, c[kept], mip_rel_gap=0, fixed=reduction.fixed)
+
+    def test_dominance_keeps_the_capacity_for_the_demand(self):
+        # 2 is dominated by 0 and 1, which dominate each other, but both are
+        # needed to serve the demand
+        f, a = np.array([10.0, 10.0, 12.0]), np.array([5.0, 5.0, 4.0])
+        b, c = np.array([4.0, 4.0]), np.array([[1.0, 1.0], [1.0, 1.0], [3.0, 3.0]])
+        reduction = presolve.presolve_cflp(f, a, b, c)
+        self.assertGreaterEqual(a[reduction.candidates].sum(), b.sum())
+        self.assertTrue(np.isfinite(reduction.upper_bound))
+        self.assertAlmostEqual(self.solve_reduced(f, a, b, c, reduction).objective, 28.0)
+
+    def test_infeasible_instance_is_not_reduced(self):
+        f, a = np.array([10.0, 10.0, 12.0]), np.array([5.0, 5.0, 4.0])
+        b, c = np.array([10.0, 10.0]), np.array([[1.0, 1.0], [1.0, 1.0], [3.0, 3.0]])
+        reduction = presolve.presolve_cflp(f, a, b, c)
+        np.testing.assert_array_equal(reduction.candidates, np.arange(3))
+        self.assertEqual(reduction.fixed, {})
+
+    def test_reduced_instances_stay_feasible(self):
+        for seed in range(5):
+            f, a, b, c, _ = random_instance(6, 8, seed)
+            # equal sites so that dominance has something to drop
+            f[1], a[1], c[1] = f[0], a[0], c[0]
+            reduction = presolve.presolve_cflp(f, a, b, c, tolerance=1.0)
+            self.assertGreaterEqual(a[reduction.candidates].sum(), b.sum())
+            solution = self.solve_reduced(f, a, b, c, reduction)
+            self.assertGreaterEqual(solution.objective, brute_force_cflp(f, a, b, c) - 1e-6)
+            self.assertTrue(np.isfinite(solution.objective))
+
+
+if __name__ == "__main__":
+    unittest.main()
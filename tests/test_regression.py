@@ -0,0 +1,68 @@
+"""Tests for the batched regression models against scikit-learn."""
+
+import unittest
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from ai_or_workflow.ai import regression
+
+
+def population(seed, n=30, T=15):
+    """Growing series with missing years, shape (n, T)."""
+    rng = np.random.default_rng(seed)
+    periods = np.arange(2000, 2000 + T)
+    growth = rng.uniform(0.98, 1.05, (n, 1)) ** (periods - 2000)
+    Y = rng.uniform(1e3, 1e5, (n, 1)) * growth * rng.normal(1, 0.02, (n, T))
+    Y[rng.random((n, T)) < 0.2] = np.nan
+    return periods, Y
+
+
+class TestBatchedLinearRegression(unittest.TestCase):
+    def test_matches_sklearn_row_by_row(self):
+        periods, Y = population(0)
+        mask = np.random.default_rng(1).random(Y.shape) < 0.8
+        horizon = np.arange(2010, 2020)
+        for degree in (1, 2):
+            model = regression.BatchedLinearRegression(degree).fit(
+                periods, Y, mask
+            )
+            predictions = model.predict(horizon)
+            for row in range(len(Y)):
+                used = ~np.isnan(Y[row]) & mask[row]
+                features = np.column_stack(
+                    [(periods - 2000) ** k for k in range(1, degree + 1)]
+                )
+                expected = LinearRegression().fit(features[used], Y[row, used])
+                future = np.column_stack(
+                    [(horizon - 2000) ** k for k in range(1, degree + 1)]
+                )
+                np.testing.assert_allclose(
+                    predictions[row], expected.predict(future), rtol=1e-8
+                )
+                self.assertEqual(model.n_obs_[row], used.sum())
+
+
+class TestBatchedRegressionMetrics(unittest.TestCase):
+    def test_matches_sklearn_metrics(self):
+        _, Y = population(2)
+        rng = np.random.default_rng(3)
+        prediction = Y * rng.normal(1, 0.05, Y.shape)
+        # a constant row predicted exactly scores 1.0 as in sklearn
+        Y[0], prediction[0] = 5.0, 5.0
+        metrics = regression.batched_regression_metrics(Y, prediction)
+        for row in range(len(Y)):
+            used = ~np.isnan(Y[row])
+            y, p = Y[row, used], prediction[row, used]
+            self.assertAlmostEqual(metrics["R2"][row], r2_score(y, p))
+            self.assertAlmostEqual(
+                metrics["MAE"][row], mean_absolute_error(y, p), delta=1e-6
+            )
+            np.testing.assert_allclose(
+                metrics["MSE"][row], mean_squared_error(y, p), rtol=1e-10
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()